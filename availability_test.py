@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Amenity Availability Bitmap Testing
+Checks the slot-to-bit mapping of availability.py at the edges of the
+bookable day (06:00 is bit 0, 21:30 is bit 31) and how AvailabilityCache
+builds, updates and reloads per-day masks.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).resolve().parent / 'backend'))
+
+import availability
+from availability import AvailabilityCache, SLOTS_PER_DAY, slot_bit, slots_mask
+
+BOOKING_DATE = "2030-06-01"
+
+
+class FakeReservations:
+    """slot_reservations collection answering the cache's single $in query"""
+
+    def __init__(self, reservations):
+        self.reservations = reservations
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        return self._iterate(query)
+
+    async def _iterate(self, query):
+        for reservation in self.reservations:
+            if (reservation['amenity_id'] in query['amenity_id']['$in'] and
+                    reservation['booking_date'] in query['booking_date']['$in']):
+                yield reservation
+
+
+class FakeDatabase:
+    def __init__(self, reservations):
+        self.slot_reservations = FakeReservations(reservations)
+
+
+class AvailabilityTester:
+    def _use_reservations(self, slots_by_amenity: dict) -> FakeDatabase:
+        db = FakeDatabase([
+            {"amenity_id": amenity_id, "booking_date": BOOKING_DATE, "slot": slot}
+            for amenity_id, slots in slots_by_amenity.items()
+            for slot in slots
+        ])
+        availability.get_database = lambda: db
+        return db
+
+    def test_slot_bit_edges(self):
+        """Test the first and last slots of the day and slots outside it"""
+        print("\n🧪 Testing slot_bit edges...")
+        expected = {
+            "06:00": 1,
+            "06:30": 1 << 1,
+            "12:00": 1 << 12,
+            "21:30": 1 << (SLOTS_PER_DAY - 1),
+            "22:00": 0,
+            "05:30": 0,
+            "00:00": 0,
+        }
+        success = True
+        for slot, bit in expected.items():
+            if slot_bit(slot) == bit:
+                print(f"✅ {slot} -> {bin(bit)}")
+            else:
+                print(f"❌ {slot}: expected {bin(bit)}, got {bin(slot_bit(slot))}")
+                success = False
+
+        full_day = slots_mask(f"{6 + index // 2:02d}:{30 * (index % 2):02d}" for index in range(SLOTS_PER_DAY))
+        if full_day == (1 << SLOTS_PER_DAY) - 1 and full_day < 2 ** 32:
+            print("✅ Every slot from 06:00 to 21:30 fits in 32 bits")
+        else:
+            print(f"❌ Unexpected full-day mask {bin(full_day)}")
+            success = False
+        return success
+
+    def test_get_builds_masks(self):
+        """Test get() builds masks from reservations in one query and then serves them from memory"""
+        print("\n🧪 Testing mask loading...")
+        db = self._use_reservations({"pool": ["06:00", "06:30"], "gym": ["21:30"]})
+        cache = AvailabilityCache(refresh_seconds=30)
+
+        async def run():
+            first = await cache.get(["pool", "gym", "court"], [BOOKING_DATE])
+            second = await cache.get(["pool"], [BOOKING_DATE])
+            return first, second
+
+        first, second = asyncio.run(run())
+        expected = {"pool": {BOOKING_DATE: 0b11}, "gym": {BOOKING_DATE: 1 << 31}, "court": {BOOKING_DATE: 0}}
+        if first != expected:
+            print(f"❌ Unexpected masks: {first}")
+            return False
+        print("✅ Masks built from reservations, empty days included")
+        if db.slot_reservations.queries != 1 or second["pool"][BOOKING_DATE] != 0b11:
+            print(f"❌ Expected one query and a cached second read, got {db.slot_reservations.queries} queries")
+            return False
+        print("✅ Three amenities loaded with one query; repeat read served from memory")
+        return True
+
+    def test_mark(self):
+        """Test mark() applies bookings and cancellations to cached days only"""
+        print("\n🧪 Testing mark...")
+        self._use_reservations({"pool": ["10:00"]})
+        cache = AvailabilityCache(refresh_seconds=30)
+        asyncio.run(cache.get(["pool"], [BOOKING_DATE]))
+        success = True
+
+        cache.mark("pool", BOOKING_DATE, ["06:00", "21:30"], booked=True)
+        mask = cache._days[("pool", BOOKING_DATE)][0]
+        if mask == slot_bit("06:00") | slot_bit("10:00") | slot_bit("21:30"):
+            print("✅ Booking sets the 06:00 and 21:30 bits alongside existing ones")
+        else:
+            print(f"❌ Unexpected mask after booking: {bin(mask)}")
+            success = False
+
+        cache.mark("pool", BOOKING_DATE, ["10:00", "21:30"], booked=False)
+        mask = cache._days[("pool", BOOKING_DATE)][0]
+        if mask == slot_bit("06:00"):
+            print("✅ Cancellation clears only its own bits")
+        else:
+            print(f"❌ Unexpected mask after cancellation: {bin(mask)}")
+            success = False
+
+        cache.mark("gym", BOOKING_DATE, ["12:00"], booked=True)
+        if ("gym", BOOKING_DATE) not in cache._days:
+            print("✅ Days that are not cached are left to be loaded")
+        else:
+            print("❌ mark() created an entry for an uncached day")
+            success = False
+        return success
+
+    def test_write_during_load_reloads(self):
+        """Test a load that overlaps a booking is reloaded on the next read"""
+        print("\n🧪 Testing write during load...")
+        db = self._use_reservations({"pool": ["08:00"]})
+        cache = AvailabilityCache(refresh_seconds=30)
+        find = db.slot_reservations.find
+
+        def find_while_booking(query, projection=None):
+            # Another request books while the query is running
+            cache.mark("pool", BOOKING_DATE, ["09:00"], booked=True)
+            db.slot_reservations.reservations.append(
+                {"amenity_id": "pool", "booking_date": BOOKING_DATE, "slot": "09:00"}
+            )
+            db.slot_reservations.find = find
+            return find(query, projection)
+
+        db.slot_reservations.find = find_while_booking
+
+        async def run():
+            await cache.get(["pool"], [BOOKING_DATE])
+            return await cache.get(["pool"], [BOOKING_DATE])
+
+        masks = asyncio.run(run())
+        if db.slot_reservations.queries == 2 and masks["pool"][BOOKING_DATE] == slot_bit("08:00") | slot_bit("09:00"):
+            print("✅ Day reloaded after a booking raced its load")
+            return True
+        print(f"❌ Expected a reload, got {db.slot_reservations.queries} queries and {masks}")
+        return False
+
+    def run_all_tests(self):
+        print("=" * 70)
+        print("🗓️ AVAILABILITY BITMAP TESTING")
+        print("=" * 70)
+
+        results = []
+        results.append(("Slot Bit Edges", self.test_slot_bit_edges()))
+        results.append(("Masks Built From Reservations", self.test_get_builds_masks()))
+        results.append(("Mark Bookings And Cancellations", self.test_mark()))
+        results.append(("Write During Load Reloads", self.test_write_during_load_reloads()))
+
+        print("\n" + "=" * 70)
+        print("📊 TEST RESULTS SUMMARY")
+        print("=" * 70)
+
+        passed = 0
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            print(f"{status} - {test_name}")
+            if result:
+                passed += 1
+
+        print(f"\n📈 Overall: {passed}/{len(results)} tests passed")
+        return passed == len(results)
+
+
+if __name__ == "__main__":
+    tester = AvailabilityTester()
+    success = tester.run_all_tests()
+    exit(0 if success else 1)
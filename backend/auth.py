@@ -8,9 +8,14 @@ import os
 import logging
 from typing import Optional
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
 import secrets
+import threading
+import time
 from models import User, UserCreate, STAFF_ROLES, VALID_ROLES, PRIVILEGED_ROLES
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_database
+from villa_resolver import villa_resolver
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -47,21 +52,11 @@ def is_privileged_role(role: str) -> bool:
     return role in PRIVILEGED_ROLES
 
 
-async def check_email_in_villas(email: str) -> dict:
-    """Check if an email exists in any villa's email list"""
-    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.getenv('DB_NAME', 'test_database')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
-    
-    try:
-        villa = await db.villas.find_one(
-            {"emails": {"$elemMatch": {"$regex": f"^{email}$", "$options": "i"}}},
-            {"_id": 0}
-        )
-        return villa
-    finally:
-        client.close()
+async def check_email_in_villas(email: str) -> Optional[str]:
+    """Check if an email exists in any villa's email list.
+    Returns the first matching villa number, or None."""
+    villa_numbers = await villa_resolver.villas_for_email(email)
+    return villa_numbers[0] if villa_numbers else None
 
 
 async def get_user_role_from_db(email: str) -> str:
@@ -71,18 +66,10 @@ async def get_user_role_from_db(email: str) -> str:
         return 'admin'
     
     # Check database for existing user role
-    from motor.motor_asyncio import AsyncIOMotorClient
-    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.getenv('DB_NAME', 'test_database')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
-    
-    try:
-        user = await db.users.find_one({'email': email}, {'_id': 0, 'role': 1})
-        if user and 'role' in user:
-            return user['role']
-    finally:
-        client.close()
+    db = get_database()
+    user = await db.users.find_one({'email': email}, {'_id': 0, 'role': 1})
+    if user and 'role' in user:
+        return user['role']
     
     # Default role for new users
     return 'user'
@@ -113,17 +100,12 @@ auth_router = APIRouter(prefix="/auth")
 # MongoDB session store for production (replaces in-memory sessions)
 async def get_sessions_collection():
     """Get the sessions collection from MongoDB"""
-    from motor.motor_asyncio import AsyncIOMotorClient
-    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.getenv('DB_NAME', 'test_database')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
-    return db.sessions, client
+    return get_database().sessions
 
 async def create_session(user_data: dict) -> str:
     """Create a session token and store in MongoDB"""
     token = secrets.token_urlsafe(32)
-    sessions_col, client = await get_sessions_collection()
+    sessions_col = await get_sessions_collection()
     
     session_doc = {
         'token': token,
@@ -133,29 +115,122 @@ async def create_session(user_data: dict) -> str:
     }
     
     await sessions_col.insert_one(session_doc)
-    client.close()
     return token
 
+class SessionCache:
+    """Bounded LRU cache of session lookups, keyed by a hash of the token.
+    
+    Entries live for at most ttl_seconds and never past the session's own
+    'expires' value, so logging out or expiring a session is honoured even
+    on a cache hit. Only found sessions are cached.
+    """
+    
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl_seconds or expires <= datetime.utcnow():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(user)
+    
+    def set(self, token: str, user: dict, expires: datetime):
+        if self.max_entries <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(user), expires, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+    
+    def invalidate_email(self, email: str):
+        """Drop every cached session belonging to a user"""
+        email = (email or '').lower()
+        with self._lock:
+            stale = [
+                key for key, (user, _, _) in self._entries.items()
+                if (user.get('email') or '').lower() == email
+            ]
+            for key in stale:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+session_cache = SessionCache(
+    max_entries=int(os.getenv('SESSION_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=int(os.getenv('SESSION_CACHE_TTL_SECONDS', '60'))
+)
+
 async def get_session(token: str) -> Optional[dict]:
-    """Get session data from MongoDB"""
-    sessions_col, client = await get_sessions_collection()
+    """Get session data, served from the in-process cache when possible"""
+    cached_user = session_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
+    sessions_col = await get_sessions_collection()
     
     session = await sessions_col.find_one(
         {'token': token, 'expires': {'$gt': datetime.utcnow()}},
         {'_id': 0}
     )
     
-    client.close()
-    
     if session:
+        session_cache.set(token, session['user'], session['expires'])
         return session['user']
     return None
 
 async def delete_session(token: str):
     """Delete session from MongoDB"""
-    sessions_col, client = await get_sessions_collection()
+    session_cache.invalidate(token)
+    sessions_col = await get_sessions_collection()
     await sessions_col.delete_one({'token': token})
-    client.close()
+
+def invalidate_user_sessions(email: str):
+    """Drop cached sessions for a user (e.g. after a role change) so the
+    next request re-reads the session from MongoDB"""
+    session_cache.invalidate_email(email)
 
 async def get_current_user(request: Request) -> Optional[dict]:
     """Get current logged in user from session"""
@@ -254,9 +329,7 @@ async def verify_google_token(token_request: GoogleTokenRequest, request: Reques
         logger.info(f"Google token verified for: {email}")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Check if user exists
         existing_user = await db.users.find_one({'email': email}, {'_id': 0})
@@ -273,7 +346,6 @@ async def verify_google_token(token_request: GoogleTokenRequest, request: Reques
         if not is_privileged_role(user_role):
             villa = await check_email_in_villas(email)
             if not villa:
-                mongo_client.close()
                 raise HTTPException(
                     status_code=403, 
                     detail="Your email is not associated with any villa in TROA. Please contact troa.systems@gmail.com for assistance."
@@ -334,7 +406,6 @@ async def verify_google_token(token_request: GoogleTokenRequest, request: Reques
         }
         
         session_token = await create_session(user_data)
-        mongo_client.close()
         
         logger.info(f"Session created for Google user: {email}")
         
@@ -488,9 +559,7 @@ async def google_callback(code: str, state: str, request: Request):
             logger.info(f"User authenticated: {user_info.get('email')}")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Check if user exists
         existing_user = await db.users.find_one({'email': user_info['email']}, {'_id': 0})
@@ -565,8 +634,6 @@ async def google_callback(code: str, state: str, request: Request):
         session_token = await create_session(user_data)
         logger.info(f"Session created for user: {user_info['email']}, needs_villa: {needs_villa_number}")
         
-        mongo_client.close()
-        
         # Return HTML that will send message to parent window (for popup)
         # This works for both popup and redirect flows
         frontend_url = origin
@@ -649,12 +716,9 @@ async def get_user(request: Request):
     
     # Fetch fresh user data from database to get latest picture, etc.
     try:
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         db_user = await db.users.find_one({'email': user['email']}, {'_id': 0, 'password_hash': 0})
-        mongo_client.close()
         
         if db_user:
             # Format verification_expires_at
@@ -699,8 +763,8 @@ async def logout(request: Request):
 
 
 # Email/Password Authentication Routes
-import bcrypt
 from email_service import email_service
+from password_hasher import password_hasher
 
 # Verification token expiry in days
 VERIFICATION_EXPIRY_DAYS = 14
@@ -725,18 +789,15 @@ async def register_with_email(credentials: EmailPasswordRegister, request: Reque
     """Register a new user with email and password"""
     try:
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Check if user already exists
         existing_user = await db.users.find_one({'email': credentials.email}, {'_id': 0})
         if existing_user:
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="User with this email already exists")
         
         # Hash password
-        password_hash = bcrypt.hashpw(credentials.password.encode('utf-8'), bcrypt.gensalt())
+        password_hash = await password_hasher.hash_password(credentials.password)
         
         # Determine user role - super admin gets admin role, others get user role
         user_role = 'admin' if credentials.email == SUPER_ADMIN_EMAIL else 'user'
@@ -760,7 +821,7 @@ async def register_with_email(credentials: EmailPasswordRegister, request: Reque
         )
         
         user_dict = user_obj.dict()
-        user_dict['password_hash'] = password_hash.decode('utf-8')  # Store as string
+        user_dict['password_hash'] = password_hash
         
         await db.users.insert_one(user_dict)
         logger.info(f"New user registered: {credentials.email} with role: {user_role}, villa: {credentials.villa_number}")
@@ -816,8 +877,6 @@ async def register_with_email(credentials: EmailPasswordRegister, request: Reque
         
         session_token = await create_session(user_data)
         
-        mongo_client.close()
-        
         return {
             'message': 'Registration successful. Please check your email to verify your account.',
             'token': session_token,
@@ -835,25 +894,20 @@ async def login_with_email(credentials: EmailPasswordLogin, request: Request):
     """Login with email and password"""
     try:
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Find user
         user = await db.users.find_one({'email': credentials.email}, {'_id': 0})
         if not user:
-            mongo_client.close()
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Check if user registered with email/password
         if user.get('provider') != 'email':
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="This email is registered with Google. Please use Google login.")
         
         # Verify password
         password_hash = user.get('password_hash', '')
-        if not password_hash or not bcrypt.checkpw(credentials.password.encode('utf-8'), password_hash.encode('utf-8')):
-            mongo_client.close()
+        if not await password_hasher.verify_password(credentials.password, password_hash):
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Determine user role - super admin always gets admin, others use database role
@@ -863,7 +917,6 @@ async def login_with_email(credentials: EmailPasswordLogin, request: Request):
         if not is_privileged_role(user_role):
             villa = await check_email_in_villas(credentials.email)
             if not villa:
-                mongo_client.close()
                 raise HTTPException(
                     status_code=403, 
                     detail="Your email is not associated with any villa in TROA. Please contact troa.systems@gmail.com for assistance."
@@ -877,7 +930,6 @@ async def login_with_email(credentials: EmailPasswordLogin, request: Request):
         if not email_verified and verification_expires_at:
             expiry_date = verification_expires_at if isinstance(verification_expires_at, datetime) else datetime.fromisoformat(str(verification_expires_at).replace('Z', '+00:00'))
             if datetime.utcnow() > expiry_date:
-                mongo_client.close()
                 raise HTTPException(
                     status_code=403, 
                     detail="Your email is not verified and the grace period has expired. Please verify your email to continue using TROA.",
@@ -914,8 +966,6 @@ async def login_with_email(credentials: EmailPasswordLogin, request: Request):
         session_token = await create_session(user_data)
         logger.info(f"User logged in: {credentials.email}")
         
-        mongo_client.close()
-        
         return {
             'message': 'Login successful',
             'token': session_token,
@@ -944,43 +994,36 @@ async def change_password(passwords: PasswordChange, request: Request):
             raise HTTPException(status_code=401, detail="Not authenticated")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Find user in database
         db_user = await db.users.find_one({'email': user['email']}, {'_id': 0})
         if not db_user:
-            mongo_client.close()
             raise HTTPException(status_code=404, detail="User not found")
         
         # Check if user registered with email/password
         if db_user.get('provider') != 'email':
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="Password change only available for email/password accounts")
         
         # Verify current password
         password_hash = db_user.get('password_hash', '')
-        if not password_hash or not bcrypt.checkpw(passwords.current_password.encode('utf-8'), password_hash.encode('utf-8')):
-            mongo_client.close()
+        if not await password_hasher.verify_password(passwords.current_password, password_hash):
             raise HTTPException(status_code=401, detail="Current password is incorrect")
         
         # Validate new password
         if len(passwords.new_password) < 6:
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="New password must be at least 6 characters")
         
         # Hash new password
-        new_password_hash = bcrypt.hashpw(passwords.new_password.encode('utf-8'), bcrypt.gensalt())
+        new_password_hash = await password_hasher.hash_password(passwords.new_password)
         
         # Update password
         await db.users.update_one(
             {'email': user['email']},
-            {'$set': {'password_hash': new_password_hash.decode('utf-8')}}
+            {'$set': {'password_hash': new_password_hash}}
         )
         
         logger.info(f"Password changed for user: {user['email']}")
-        mongo_client.close()
         
         return {'message': 'Password changed successfully'}
         
@@ -1005,9 +1048,7 @@ async def update_profile_picture(picture_data: ProfilePictureUpdate, request: Re
             raise HTTPException(status_code=401, detail="Not authenticated")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Update picture
         await db.users.update_one(
@@ -1016,7 +1057,6 @@ async def update_profile_picture(picture_data: ProfilePictureUpdate, request: Re
         )
         
         logger.info(f"Profile picture updated for user: {user['email']}")
-        mongo_client.close()
         
         return {
             'message': 'Profile picture updated successfully',
@@ -1048,9 +1088,7 @@ async def update_villa_number(villa_data: VillaNumberUpdate, request: Request):
             raise HTTPException(status_code=400, detail="Villa number must be numeric")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Update villa number
         await db.users.update_one(
@@ -1059,7 +1097,6 @@ async def update_villa_number(villa_data: VillaNumberUpdate, request: Request):
         )
         
         logger.info(f"Villa number updated for user: {user['email']} to {villa_data.villa_number}")
-        mongo_client.close()
         
         return {
             'status': 'success',
@@ -1080,9 +1117,7 @@ async def verify_email(verify_request: VerifyEmailRequest):
     """Verify email address using the token from verification link"""
     try:
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # First, try to find user by token only (most reliable)
         user = await db.users.find_one({'verification_token': verify_request.token}, {'_id': 0})
@@ -1093,7 +1128,6 @@ async def verify_email(verify_request: VerifyEmailRequest):
                 existing_user = await db.users.find_one({'email': verify_request.email}, {'_id': 0})
                 if existing_user:
                     if existing_user.get('email_verified', False):
-                        mongo_client.close()
                         return {
                             'status': 'success',
                             'message': 'Email is already verified',
@@ -1101,22 +1135,18 @@ async def verify_email(verify_request: VerifyEmailRequest):
                         }
                     else:
                         # User exists but token doesn't match - they may have requested a new token
-                        mongo_client.close()
                         raise HTTPException(
                             status_code=400, 
                             detail="This verification link is no longer valid. Please request a new verification email from the login page."
                         )
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="Invalid or expired verification token")
         
         # Verify email matches if provided (additional security check)
         if verify_request.email and user.get('email') != verify_request.email:
-            mongo_client.close()
             raise HTTPException(status_code=400, detail="Email mismatch in verification request")
         
         # Check if already verified
         if user.get('email_verified', False):
-            mongo_client.close()
             return {
                 'status': 'success',
                 'message': 'Email is already verified',
@@ -1136,7 +1166,6 @@ async def verify_email(verify_request: VerifyEmailRequest):
         )
         
         logger.info(f"Email verified for user: {user['email']}")
-        mongo_client.close()
         
         return {
             'status': 'success',
@@ -1161,19 +1190,15 @@ async def resend_verification(request: Request):
             raise HTTPException(status_code=401, detail="Not authenticated")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Find user in database
         db_user = await db.users.find_one({'email': user['email']}, {'_id': 0})
         if not db_user:
-            mongo_client.close()
             raise HTTPException(status_code=404, detail="User not found")
         
         # Check if already verified
         if db_user.get('email_verified', False):
-            mongo_client.close()
             return {
                 'status': 'already_verified',
                 'message': 'Your email is already verified'
@@ -1181,7 +1206,6 @@ async def resend_verification(request: Request):
         
         # Check if user is a Google OAuth user (they don't need verification)
         if db_user.get('provider') == 'google':
-            mongo_client.close()
             return {
                 'status': 'not_required',
                 'message': 'Email verification is not required for Google accounts'
@@ -1224,8 +1248,6 @@ async def resend_verification(request: Request):
             expiry_days=VERIFICATION_EXPIRY_DAYS
         )
         
-        mongo_client.close()
-        
         if email_result.get('status') == 'sent':
             logger.info(f"Verification email resent to: {user['email']}")
             return {
@@ -1255,14 +1277,11 @@ async def resend_verification_by_email(request: Request, email_data: dict):
             raise HTTPException(status_code=400, detail="Email is required")
         
         # Get database
-        mongo_url = os.environ['MONGO_URL']
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Find user in database
         db_user = await db.users.find_one({'email': email}, {'_id': 0})
         if not db_user:
-            mongo_client.close()
             # Don't reveal if user exists or not for security
             return {
                 'status': 'sent',
@@ -1271,7 +1290,6 @@ async def resend_verification_by_email(request: Request, email_data: dict):
         
         # Check if already verified
         if db_user.get('email_verified', False):
-            mongo_client.close()
             return {
                 'status': 'already_verified',
                 'message': 'Your email is already verified. Please try logging in.'
@@ -1279,7 +1297,6 @@ async def resend_verification_by_email(request: Request, email_data: dict):
         
         # Check if user is a Google OAuth user
         if db_user.get('provider') == 'google':
-            mongo_client.close()
             return {
                 'status': 'not_required',
                 'message': 'This account uses Google login. Email verification is not required.'
@@ -1322,8 +1339,6 @@ async def resend_verification_by_email(request: Request, email_data: dict):
             expiry_days=VERIFICATION_EXPIRY_DAYS
         )
         
-        mongo_client.close()
-        
         logger.info(f"Verification email resent to: {email}")
         return {
             'status': 'sent',
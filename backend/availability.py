@@ -0,0 +1,162 @@
+"""
+Per-day amenity availability bitmaps.
+
+The booking calendar used to fetch every booking of the day - guests,
+audit logs and all - just to grey out taken times. Availability is now a
+32-bit mask per amenity and day: bit i set means the half-hour slot
+starting at 06:00 + 30*i minutes is booked (bit 0 = 06:00, bit 31 =
+21:30).
+
+AvailabilityCache keeps those masks in memory, built from the
+slot_reservations collection (see slot_reservations.py). create_booking
+and cancel_booking update a cached day in place with mark(); a day is
+otherwise reloaded once it is older than AVAILABILITY_REFRESH_SECONDS
+(default 30), which is how bookings made through other worker processes
+show up. The masks are advisory - the unique slot index still decides
+whether a booking goes through - so a briefly stale mask only means a
+409 instead of a greyed-out slot. Days that are needed together (a week
+of every amenity) are loaded with a single query.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from database import get_database
+from slot_reservations import DAY_END, DAY_START, SLOT_MINUTES
+
+logger = logging.getLogger(__name__)
+
+
+def _minutes(slot: str) -> int:
+    hours, minutes = map(int, slot.split(':'))
+    return hours * 60 + minutes
+
+
+_DAY_START_MINUTES = _minutes(DAY_START)
+SLOTS_PER_DAY = (_minutes(DAY_END) - _DAY_START_MINUTES) // SLOT_MINUTES
+
+
+def slot_bit(slot: str) -> int:
+    """Bit for an "HH:MM" slot; 0 for slots outside DAY_START-DAY_END,
+    which booking_slots never hands out"""
+    index = (_minutes(slot) - _DAY_START_MINUTES) // SLOT_MINUTES
+    return 1 << index if 0 <= index < SLOTS_PER_DAY else 0
+
+
+def slots_mask(slots: Iterable[str]) -> int:
+    mask = 0
+    for slot in slots:
+        mask |= slot_bit(slot)
+    return mask
+
+
+class AvailabilityCache:
+    """LRU of booked-slot masks keyed by (amenity_id, booking_date)"""
+
+    def __init__(self, max_days: int = 10000, refresh_seconds: int = 30):
+        self.max_days = max_days
+        self.refresh_seconds = refresh_seconds
+        # {(amenity_id, date): (mask, loaded_at)}
+        self._days: "OrderedDict[Tuple[str, str], Tuple[int, float]]" = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.marks = 0
+        self.evictions = 0
+
+    def _store(self, key: Tuple[str, str], mask: int, loaded_at: float):
+        self._days[key] = (mask, loaded_at)
+        self._days.move_to_end(key)
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+            self.evictions += 1
+
+    async def _load(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """Read the masks of the given days from slot_reservations in one query"""
+        writes = self._writes
+        masks = {key: 0 for key in keys}
+        async for reservation in get_database().slot_reservations.find(
+            {
+                "amenity_id": {"$in": list({amenity_id for amenity_id, _ in keys})},
+                "booking_date": {"$in": list({date for _, date in keys})},
+            },
+            {"_id": 0, "amenity_id": 1, "booking_date": 1, "slot": 1}
+        ):
+            key = (reservation['amenity_id'], reservation['booking_date'])
+            if key in masks:
+                masks[key] |= slot_bit(reservation['slot'])
+        # A booking made or cancelled during the query may be missing from
+        # it; keep the result but have the next read load it again
+        loaded_at = time.monotonic() if self._writes == writes else 0.0
+        for key, mask in masks.items():
+            self._store(key, mask, loaded_at)
+        self.loads += 1
+        return masks
+
+    async def get(self, amenity_ids: List[str], dates: List[str]) -> Dict[str, Dict[str, int]]:
+        """{amenity_id: {date: mask}} for every amenity and date asked for"""
+        now = time.monotonic()
+        keys = [(amenity_id, date) for amenity_id in amenity_ids for date in dates]
+        masks = {}
+        stale = []
+        for key in keys:
+            entry = self._days.get(key)
+            if entry is None or now - entry[1] > self.refresh_seconds:
+                stale.append(key)
+            else:
+                masks[key] = entry[0]
+                self._days.move_to_end(key)
+        self.hits += len(keys) - len(stale)
+        self.misses += len(stale)
+        if stale:
+            masks.update(await self._load(stale))
+
+        result: Dict[str, Dict[str, int]] = {amenity_id: {} for amenity_id in amenity_ids}
+        for amenity_id, date in keys:
+            result[amenity_id][date] = masks[(amenity_id, date)]
+        return result
+
+    def mark(self, amenity_id: str, date: str, slots: Iterable[str], booked: bool):
+        """Apply a booking (booked=True) or cancellation to a cached day"""
+        self._writes += 1
+        self.marks += 1
+        entry = self._days.get((amenity_id, date))
+        if entry is None:
+            return
+        mask = slots_mask(slots)
+        updated = entry[0] | mask if booked else entry[0] & ~mask
+        self._days[(amenity_id, date)] = (updated, entry[1])
+
+    async def warm(self, amenity_ids: List[str], days: int = 7):
+        """Load the coming week of the given amenities"""
+        if not amenity_ids:
+            return
+        today = datetime.now().date()
+        dates = [(today + timedelta(days=offset)).isoformat() for offset in range(days)]
+        await self._load([(amenity_id, date) for amenity_id in amenity_ids for date in dates])
+        logger.info(f"Warmed availability for {len(amenity_ids)} amenities over {days} days")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "days": len(self._days),
+            "max_days": self.max_days,
+            "refresh_seconds": self.refresh_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "marks": self.marks,
+            "evictions": self.evictions,
+        }
+
+
+# Process-wide cache instance
+availability_cache = AvailabilityCache(
+    max_days=int(os.getenv('AVAILABILITY_CACHE_MAX_DAYS', '10000')),
+    refresh_seconds=int(os.getenv('AVAILABILITY_REFRESH_SECONDS', '30'))
+)
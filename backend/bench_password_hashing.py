@@ -0,0 +1,80 @@
+"""
+TROA password hashing benchmark.
+Measures event-loop latency while a burst of concurrent logins verify
+passwords, comparing bcrypt called inline (blocking the loop) with the
+bounded executor in password_hasher.py.
+
+Usage:
+    python bench_password_hashing.py [concurrent_logins]
+
+No database is needed. A ticker coroutine wakes up every 10ms; how late it
+wakes up is the latency every other request on the worker would see.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import bcrypt
+
+from password_hasher import PasswordHasher
+
+TICK_SECONDS = 0.01
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    """Record how late each tick fires compared to when it was scheduled"""
+    while not stop.is_set():
+        scheduled = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - scheduled - TICK_SECONDS) * 1000)
+
+
+async def inline_login(password: str, password_hash: bytes):
+    # What the handlers did before: bcrypt straight inside the coroutine
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
+
+
+async def run(label: str, login, concurrent: int, password: str, password_hash):
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(stop, lags))
+    await asyncio.sleep(TICK_SECONDS * 5)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[login(password, password_hash) for _ in range(concurrent)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"\n{label}:")
+    print(f"  {concurrent} logins completed in {elapsed:.2f}s")
+    print(f"  Loop lag   max: {max(lags or [0]):.1f}ms   p99: {p99:.1f}ms   "
+          f"median: {statistics.median(lags or [0]):.1f}ms   ticks: {len(lags)}")
+
+
+async def main(concurrent: int):
+    print("=" * 50)
+    print("TROA PASSWORD HASHING BENCHMARK")
+    print("=" * 50)
+
+    password = "correct horse battery staple"
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+    await run("Before: inline bcrypt", inline_login, concurrent, password, password_hash)
+
+    hasher = PasswordHasher()
+    await run(
+        f"After: executor ({hasher.max_workers} workers)",
+        hasher.verify_password, concurrent, password, password_hash.decode('utf-8')
+    )
+    print(f"\n  Hasher stats: {hasher.stats()}")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -3,9 +3,7 @@ Bulk upload functionality for invoices and villas
 """
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File
 from fastapi.responses import StreamingResponse
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timedelta
-import os
 import logging
 import uuid
 import io
@@ -16,7 +14,9 @@ from dotenv import load_dotenv
 
 from auth import require_admin, require_manager_or_admin, require_accountant
 from models import Invoice, Villa, INVOICE_TYPE_MAINTENANCE
-from email_service import email_service
+from notification_outbox import outbox
+from database import get_database
+from villa_resolver import villa_resolver
 
 load_dotenv()
 
@@ -24,15 +24,10 @@ logger = logging.getLogger(__name__)
 
 bulk_router = APIRouter(prefix="/bulk")
 
-# Database connection
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.getenv('DB_NAME', 'test_database')
-
 
 async def get_db():
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
-    return db, client
+    """Get the shared database (see database.py)"""
+    return get_database()
 
 
 def generate_maintenance_invoice_number() -> str:
@@ -162,7 +157,7 @@ async def bulk_upload_invoices(request: Request, file: UploadFile = File(...)):
     if not file.filename.endswith('.xlsx'):
         raise HTTPException(status_code=400, detail="Only .xlsx files are supported")
     
-    db, client = await get_db()
+    db = await get_db()
     
     try:
         # Read file
@@ -302,7 +297,8 @@ async def bulk_upload_invoices(request: Request, file: UploadFile = File(...)):
                     villa_user = await db.users.find_one({"email": email}, {"_id": 0, "name": 1})
                     user_name = villa_user.get('name', '') if villa_user else ''
                     
-                    await email_service.send_maintenance_invoice_raised(
+                    job_id = await outbox.email(
+                        'send_maintenance_invoice_raised',
                         recipient_email=email,
                         user_name=user_name,
                         invoice_number=invoice.invoice_number,
@@ -311,7 +307,9 @@ async def bulk_upload_invoices(request: Request, file: UploadFile = File(...)):
                         due_date=due_date.strftime("%d %b %Y"),
                         line_items=data['line_items']
                     )
-                    email_results.append({'email': email, 'status': 'sent', 'villa': villa_number})
+                    if not job_id:
+                        raise RuntimeError("Could not queue invoice email")
+                    email_results.append({'email': email, 'status': 'queued', 'villa': villa_number})
                 except Exception as email_error:
                     logger.error(f"Failed to send invoice email to {email}: {email_error}")
                     email_results.append({'email': email, 'status': 'failed', 'villa': villa_number, 'error': str(email_error)})
@@ -321,7 +319,7 @@ async def bulk_upload_invoices(request: Request, file: UploadFile = File(...)):
             'message': f"Successfully created {len(created_invoices)} invoice(s)",
             'invoices': created_invoices,
             'email_notifications': {
-                'sent': len([e for e in email_results if e['status'] == 'sent']),
+                'queued': len([e for e in email_results if e['status'] == 'queued']),
                 'failed': len([e for e in email_results if e['status'] == 'failed']),
                 'details': email_results
             }
@@ -332,8 +330,6 @@ async def bulk_upload_invoices(request: Request, file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Error processing bulk invoice upload: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
-    finally:
-        client.close()
 
 
 # ============ VILLA BULK UPLOAD ============
@@ -443,7 +439,7 @@ async def bulk_upload_villas(request: Request, file: UploadFile = File(...)):
     if not file.filename.endswith('.xlsx'):
         raise HTTPException(status_code=400, detail="Only .xlsx files are supported")
     
-    db, client = await get_db()
+    db = await get_db()
     
     try:
         # Read file
@@ -499,6 +495,7 @@ async def bulk_upload_villas(request: Request, file: UploadFile = File(...)):
                     {"villa_number": villa_number},
                     {"$set": update_data}
                 )
+                villa_resolver.set_villa(villa_number, merged_emails)
                 
                 updated_count += 1
                 results.append({
@@ -517,6 +514,7 @@ async def bulk_upload_villas(request: Request, file: UploadFile = File(...)):
                 )
                 
                 await db.villas.insert_one(villa.dict())
+                villa_resolver.set_villa(villa_number, new_emails)
                 
                 created_count += 1
                 results.append({
@@ -540,5 +538,3 @@ async def bulk_upload_villas(request: Request, file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Error processing bulk villa upload: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
-    finally:
-        client.close()
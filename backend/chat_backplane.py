@@ -0,0 +1,307 @@
+"""
+Chat broadcast backplane.
+
+chat_manager only knows the WebSocket connections of its own process, so
+with more than one uvicorn worker a message sent through worker A never
+reached members connected to worker B. Every group broadcast in
+community_chat now goes through the backplane, which hands each event to
+deliver_chat_event() on *every* worker; that handler fans it out to the
+worker's local sockets (and keeps its typing indicators in sync).
+
+Implementations (CHAT_BACKPLANE):
+    local   (default) single process - events are delivered directly
+    mongo   MongoDB change streams. New messages are picked up from inserts
+            into 'chat_messages'; every other event (reactions, deletions,
+            typing, read receipts, presence) is a small document in
+            'chat_events', expired by a TTL index. Requires a replica set;
+            on a standalone server it logs an error and behaves like
+            'local'.
+
+Change streams need a replica set, but a single node is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0
+    mongosh --eval 'rs.initiate()'
+
+Then check that events make a round trip through the database:
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017/?replicaSet=rs0 python chat_backplane.py
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+from database import mongo, get_database
+
+logger = logging.getLogger(__name__)
+
+# Handler called on every worker with {"group_id", "message", "exclude_user"}
+EventHandler = Callable[[dict], Awaitable[None]]
+
+NEW_MESSAGE = "new_message"
+
+# Server error when a resume token has fallen out of the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class Backplane(ABC):
+    """Delivers chat events to the WebSocket connections of every worker"""
+
+    name = "base"
+
+    def __init__(self):
+        self._handler: Optional[EventHandler] = None
+        self.published = 0
+        self.delivered = 0
+        self.handler_errors = 0
+
+    async def start(self, handler: EventHandler):
+        self._handler = handler
+
+    async def stop(self):
+        pass
+
+    async def _deliver(self, envelope: dict):
+        if self._handler is None:
+            return
+        try:
+            await self._handler(envelope)
+            self.delivered += 1
+        except Exception as e:
+            self.handler_errors += 1
+            logger.error(f"Chat backplane handler failed for {envelope.get('message', {}).get('type')}: {e}")
+
+    @abstractmethod
+    async def publish(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
+        """Broadcast an event to the group's sockets on every worker"""
+
+    @abstractmethod
+    async def publish_message(self, group_id: str, message: dict):
+        """Announce a chat message that was just inserted into chat_messages"""
+
+    def stats(self) -> dict:
+        return {
+            "backplane": self.name,
+            "published": self.published,
+            "delivered": self.delivered,
+            "handler_errors": self.handler_errors,
+        }
+
+
+def _envelope(group_id: str, message: dict, exclude_user: Optional[str] = None) -> dict:
+    return {"group_id": group_id, "message": message, "exclude_user": exclude_user}
+
+
+class LocalBackplane(Backplane):
+    """Single-process backplane: events go straight to this worker's sockets"""
+
+    name = "local"
+
+    async def publish(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
+        self.published += 1
+        await self._deliver(_envelope(group_id, message, exclude_user))
+
+    async def publish_message(self, group_id: str, message: dict):
+        await self.publish(group_id, {"type": NEW_MESSAGE, "message": message})
+
+
+class MongoChangeStreamBackplane(Backplane):
+    """Backplane built on MongoDB change streams (needs a replica set)"""
+
+    name = "mongo"
+    events_collection = "chat_events"
+    messages_collection = "chat_messages"
+    RETRY_SECONDS = 2
+    MAX_DELIVERY_ATTEMPTS = 3
+
+    def __init__(self):
+        super().__init__()
+        self.worker_id = str(uuid.uuid4())
+        self.enabled = False
+        self._tasks = []
+        self._resume_tokens: Dict[str, dict] = {}
+        # collection -> (resume token of the event that failed, attempts)
+        self._failed_deliveries: Dict[str, Tuple[dict, int]] = {}
+        self.stream_restarts = 0
+        self.last_event_lag_ms = None
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        db = get_database()
+        hello = await db.client.admin.command("hello")
+        if not hello.get("setName"):
+            logger.error(
+                "CHAT_BACKPLANE=mongo needs a replica set (change streams are unavailable on a "
+                "standalone server); chat events will only reach this worker's sockets"
+            )
+            return
+        self.enabled = True
+        self._tasks = [
+            asyncio.create_task(self._watch(
+                self.messages_collection, [{"$match": {"operationType": "insert"}}], self._on_message
+            )),
+            asyncio.create_task(self._watch(
+                self.events_collection, [{"$match": {"operationType": "insert"}}], self._on_event
+            )),
+        ]
+        logger.info(f"Chat backplane watching {self.messages_collection} and {self.events_collection}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.enabled = False
+
+    async def _watch(self, collection_name: str, pipeline: list, on_change):
+        """
+        Follow one collection's change stream, resuming after errors.
+        The resume token is only saved once an event was handled, so an
+        event whose delivery fails is delivered again after the restart;
+        after MAX_DELIVERY_ATTEMPTS failures it is skipped.
+        """
+        while True:
+            try:
+                collection = get_database()[collection_name]
+                resume_after = self._resume_tokens.get(collection_name)
+                async with collection.watch(pipeline, resume_after=resume_after) as stream:
+                    async for change in stream:
+                        token = stream.resume_token
+                        try:
+                            await on_change(change["fullDocument"])
+                        except Exception as e:
+                            failed_token, attempts = self._failed_deliveries.get(collection_name, (None, 0))
+                            attempts = attempts + 1 if failed_token == token else 1
+                            if attempts < self.MAX_DELIVERY_ATTEMPTS:
+                                self._failed_deliveries[collection_name] = (token, attempts)
+                                raise
+                            logger.error(
+                                f"Chat backplane dropped an event on {collection_name} after {attempts} attempts: {e}"
+                            )
+                        self._failed_deliveries.pop(collection_name, None)
+                        self._resume_tokens[collection_name] = token
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stream_restarts += 1
+                logger.error(f"Chat backplane stream on {collection_name} failed, restarting: {e}")
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Token no longer in the oplog; continue from now
+                    self._resume_tokens.pop(collection_name, None)
+                await asyncio.sleep(self.RETRY_SECONDS)
+
+    async def _on_message(self, document: dict):
+        document.pop("_id", None)
+        await self._deliver(_envelope(document["group_id"], {"type": NEW_MESSAGE, "message": document}))
+
+    async def _on_event(self, document: dict):
+        published_at = document.get("published_at")
+        if published_at:
+            self.last_event_lag_ms = round((time.time() - published_at) * 1000, 2)
+        await self._deliver(_envelope(document["group_id"], document["message"], document.get("exclude_user")))
+
+    async def publish(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
+        self.published += 1
+        if not self.enabled:
+            await self._deliver(_envelope(group_id, message, exclude_user))
+            return
+        await get_database()[self.events_collection].insert_one({
+            "group_id": group_id,
+            "message": message,
+            "exclude_user": exclude_user,
+            "origin": self.worker_id,
+            "published_at": time.time(),
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    async def publish_message(self, group_id: str, message: dict):
+        # The insert into chat_messages is the event; every worker (this one
+        # included) delivers it from the change stream
+        self.published += 1
+        if not self.enabled:
+            await self._deliver(_envelope(group_id, {"type": NEW_MESSAGE, "message": message}))
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "stream_restarts": self.stream_restarts,
+            "last_event_lag_ms": self.last_event_lag_ms,
+        }
+
+
+def create_backplane(kind: Optional[str] = None) -> Backplane:
+    kind = (kind or os.getenv('CHAT_BACKPLANE', 'local')).lower()
+    if kind == 'mongo':
+        return MongoChangeStreamBackplane()
+    if kind != 'local':
+        logger.warning(f"Unknown CHAT_BACKPLANE {kind!r}, using local")
+    return LocalBackplane()
+
+
+# Process-wide backplane instance
+backplane = create_backplane()
+
+
+async def main() -> int:
+    """Start two backplanes (as two workers would) and check both receive a
+    published event and an inserted message"""
+    print("=" * 50)
+    print("TROA CHAT BACKPLANE CHECK")
+    print("=" * 50)
+
+    await mongo.connect()
+    received = {"a": [], "b": []}
+
+    def collector(name):
+        async def handler(envelope):
+            received[name].append(envelope["message"]["type"])
+        return handler
+
+    workers = {"a": MongoChangeStreamBackplane(), "b": MongoChangeStreamBackplane()}
+    try:
+        for name, worker in workers.items():
+            await worker.start(collector(name))
+            if not worker.enabled:
+                print("\n❌ Not a replica set - start mongod with --replSet and run rs.initiate()")
+                return 1
+        # Let both change streams open before publishing
+        await asyncio.sleep(1)
+
+        group_id = f"backplane-check-{uuid.uuid4()}"
+        await workers["a"].publish(group_id, {"type": "typing_start", "user_email": "check@example.com"})
+        await get_database().chat_messages.insert_one({
+            "id": str(uuid.uuid4()),
+            "group_id": group_id,
+            "sender_email": "check@example.com",
+            "content": "backplane check",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        await asyncio.sleep(2)
+
+        ok = True
+        for name, types in received.items():
+            expected = {"typing_start", NEW_MESSAGE}
+            status = "✅" if expected <= set(types) else "❌"
+            ok = ok and status == "✅"
+            print(f"\nWorker {name}: {status} received {types}")
+        await get_database().chat_messages.delete_many({"group_id": group_id})
+        await get_database().chat_events.delete_many({"group_id": group_id})
+        return 0 if ok else 1
+    finally:
+        for worker in workers.values():
+            await worker.stop()
+        mongo.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -5,14 +5,20 @@ Now with WebSocket support for real-time messaging
 """
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Query
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, timezone
+from pymongo import UpdateOne
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 import os
+import asyncio
 import logging
 import base64
+import hashlib
+import io
 import mimetypes
 import json
+import time
+from bisect import bisect_left
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +29,32 @@ from push_notifications import send_notification_to_group_members
 
 # Import WebSocket manager
 from websocket_manager import chat_manager, WSMessageType
+from read_receipts import read_receipts
+from chat_backplane import backplane
+from typing_indicators import typing_tracker
+
+from database import get_database
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs_streaming import gridfs_response
+from upload_pipeline import ingest_to_gridfs, limit_request_body, MULTIPART_OVERHEAD
+from image_variants import build_variants, delete_variants, select_variant
 
 # File upload constants
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_FILES_PER_MESSAGE = int(os.getenv('CHAT_MAX_FILES_PER_MESSAGE', '10'))
+
+# Reject oversized message uploads while they are still being received
+limit_request_body(
+    r"^/api/chat/groups/[^/]+/messages/upload$",
+    MAX_FILE_SIZE * MAX_FILES_PER_MESSAGE + MULTIPART_OVERHEAD
+)
+
+# Attachment bytes live in this GridFS bucket; 'chat_attachments' keeps one
+# small document per attachment (metadata plus the GridFS file_id)
+CHAT_FILES_BUCKET = "chat_files"
+
+# Attachments never change once uploaded, but are only for group members
+ATTACHMENT_CACHE_CONTROL = f"private, max-age={7 * 24 * 60 * 60}"
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
 ALLOWED_DOC_TYPES = ['application/pdf', 'application/msword', 
                      'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
@@ -137,7 +166,8 @@ class Message(BaseModel):
     created_at: datetime
     attachments: Optional[List[dict]] = []
     status: str = "sent"  # "sending", "sent", "delivered", "read"
-    read_by: Optional[List[str]] = []  # List of emails who have read this message
+    read_count: int = 0  # Members (other than the sender) whose read watermark has reached this message
+    read_by_me: bool = False  # Whether the requesting user has read this message
     is_deleted: bool = False  # Soft delete flag
     deleted_at: Optional[str] = None  # When the message was deleted
     reactions: Optional[List[dict]] = []  # List of reactions on this message
@@ -155,10 +185,95 @@ class MarkMessagesReadRequest(BaseModel):
 
 # Helper to get DB
 async def get_db():
-    from motor.motor_asyncio import AsyncIOMotorClient
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
+    return get_database()
+
+
+def get_chat_files_bucket():
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=CHAT_FILES_BUCKET)
+
+
+async def store_attachment_file(attachment_id: str, content: bytes, content_type: str, etag: str):
+    """Write attachment bytes to GridFS, returning the file id"""
+    return await get_chat_files_bucket().upload_from_stream(
+        attachment_id,
+        io.BytesIO(content),
+        metadata={"content_type": content_type, "etag": etag}
+    )
+
+
+async def delete_attachments(db, query: dict):
+    """Delete chat_attachments documents matching query and their GridFS files"""
+    bucket = get_chat_files_bucket()
+    async for attachment in db.chat_attachments.find(query, {"_id": 0, "file_id": 1, "variants": 1}):
+        await delete_variants(bucket, attachment.get('variants'))
+        if attachment.get('file_id') is None:
+            continue
+        try:
+            await bucket.delete(attachment['file_id'])
+        except Exception as e:
+            logger.error(f"Failed to delete attachment file {attachment['file_id']}: {e}")
+    await db.chat_attachments.delete_many(query)
+
+
+# Running variant renders, referenced so they are not garbage collected
+attachment_variant_tasks = set()
+
+
+async def build_attachment_variants(attachment_id: str, file_id):
+    """Render resized variants of a chat image and record them on its attachment"""
+    try:
+        bucket = get_chat_files_bucket()
+        download_stream = await bucket.open_download_stream(file_id)
+        variants = await build_variants(bucket, attachment_id, await download_stream.read())
+        if not variants:
+            return
+        db = await get_db()
+        result = await db.chat_attachments.update_one(
+            {"id": attachment_id},
+            {"$set": {"variants": variants}}
+        )
+        if result.matched_count == 0:
+            # Message deleted while the variants were rendering
+            await delete_variants(bucket, variants)
+    except Exception as e:
+        logger.error(f"Failed to build variants for chat attachment {attachment_id}: {e}")
+
+
+def schedule_attachment_variants(attachment: dict):
+    """Build an image attachment's variants in the background; until they
+    exist the original is served for every width"""
+    task = asyncio.create_task(build_attachment_variants(attachment["id"], attachment["file_id"]))
+    attachment_variant_tasks.add(task)
+    task.add_done_callback(attachment_variant_tasks.discard)
+
+
+def _timestamp(value) -> str:
+    """created_at / last_read_at as an ISO string so they compare in order"""
+    return value.isoformat() if isinstance(value, datetime) else str(value or '')
+
+
+async def get_read_watermarks(db, group_id: str, members: List[str]) -> dict:
+    """email -> last_read_at for current members of the group (including
+    advances still waiting in the read receipt batch)"""
+    watermarks = {}
+    async for read in db.chat_user_reads.find(
+        {"group_id": group_id, "user_email": {"$in": members}},
+        {"_id": 0, "user_email": 1, "last_read_at": 1}
+    ):
+        watermarks[read['user_email']] = _timestamp(read.get('last_read_at'))
+    for email in members:
+        pending = read_receipts.pending_watermark(group_id, email)
+        if pending > watermarks.get(email, ''):
+            watermarks[email] = pending
+    return watermarks
+
+
+def count_readers(sorted_watermarks: List[str], created_at: str, sender_watermark: str) -> int:
+    """Members whose watermark is at or past created_at, not counting the sender"""
+    readers = len(sorted_watermarks) - bisect_left(sorted_watermarks, created_at)
+    if sender_watermark and sender_watermark >= created_at:
+        readers -= 1
+    return readers
 
 
 @chat_router.get("/groups", response_model=List[ChatGroup])
@@ -317,6 +432,7 @@ async def join_chat_group(group_id: str, request: Request):
             {"id": group_id},
             {"$addToSet": {"members": user['email']}}
         )
+        invalidate_group_members(group_id)
         
         logger.info(f"User {user['email']} joined group {group['name']}")
         return {"message": f"Successfully joined {group['name']}"}
@@ -349,6 +465,7 @@ async def leave_chat_group(group_id: str, request: Request):
             {"id": group_id},
             {"$pull": {"members": user['email']}}
         )
+        invalidate_group_members(group_id)
         
         logger.info(f"User {user['email']} left group {group['name']}")
         return {"message": f"Successfully left {group['name']}"}
@@ -406,6 +523,7 @@ async def add_member_to_group(group_id: str, member_data: AddMemberRequest, requ
             {"id": group_id},
             {"$addToSet": {"members": member_data.email}}
         )
+        invalidate_group_members(group_id)
         
         logger.info(f"User {member_data.email} added to group {group['name']} by {user['email']}")
         return {"message": f"Successfully added {user_to_add.get('name', member_data.email)} to the group"}
@@ -447,6 +565,7 @@ async def remove_member_from_group(group_id: str, member_data: RemoveMemberReque
             {"id": group_id},
             {"$pull": {"members": member_data.email}}
         )
+        invalidate_group_members(group_id)
         
         logger.info(f"User {member_data.email} removed from group {group['name']} by {user['email']}")
         return {"message": "Successfully removed member from the group"}
@@ -543,12 +662,13 @@ async def delete_chat_group(group_id: str, request: Request):
         
         # Delete the group
         await db.chat_groups.delete_one({"id": group_id})
+        invalidate_group_members(group_id)
         
         # Delete all messages in the group
         await db.chat_messages.delete_many({"group_id": group_id})
         
         # Delete all file attachments for this group
-        await db.chat_attachments.delete_many({"group_id": group_id})
+        await delete_attachments(db, {"group_id": group_id})
         
         logger.info(f"Chat group {group_id} deleted by {user['email']}")
         return {"message": "Group deleted successfully"}
@@ -592,13 +712,26 @@ async def get_group_messages(group_id: str, request: Request, limit: int = 10, b
         ).to_list(100)
         user_pictures = {u['email']: u.get('picture') for u in users_data}
         
-        # Add sender pictures and ensure status/read_by/is_deleted/reactions/reply_to fields
+        # Read status comes from the members' per-group watermarks. Fetching
+        # the page reads it, so the user's own watermark moves to its newest
+        # message (written in a batch after the response).
+        watermarks = await get_read_watermarks(db, group_id, group.get('members', []))
+        if messages:
+            newest = _timestamp(messages[-1]['created_at'])
+            if newest > watermarks.get(user['email'], ''):
+                watermarks[user['email']] = newest
+                read_receipts.advance(group_id, user['email'], newest)
+        sorted_watermarks = sorted(watermarks.values())
+        my_watermark = watermarks.get(user['email'], '')
+        
+        # Add sender pictures and ensure status/read counts/is_deleted/reactions/reply_to fields
         for msg in messages:
             msg['sender_picture'] = user_pictures.get(msg.get('sender_email'))
             if 'status' not in msg:
                 msg['status'] = 'delivered'  # Default for old messages
-            if 'read_by' not in msg:
-                msg['read_by'] = []
+            created_at = _timestamp(msg['created_at'])
+            msg['read_count'] = count_readers(sorted_watermarks, created_at, watermarks.get(msg['sender_email'], ''))
+            msg['read_by_me'] = msg['sender_email'] == user['email'] or my_watermark >= created_at
             if 'is_deleted' not in msg:
                 msg['is_deleted'] = False
             if 'deleted_at' not in msg:
@@ -607,13 +740,6 @@ async def get_group_messages(group_id: str, request: Request, limit: int = 10, b
                 msg['reactions'] = []
             if 'reply_to' not in msg:
                 msg['reply_to'] = None
-            # Mark as read if current user hasn't read it yet
-            if user['email'] not in msg['read_by'] and msg['sender_email'] != user['email']:
-                await db.chat_messages.update_one(
-                    {"id": msg['id']},
-                    {"$addToSet": {"read_by": user['email']}}
-                )
-                msg['read_by'].append(user['email'])
         
         return [Message(**msg) for msg in messages]
     except HTTPException:
@@ -670,7 +796,6 @@ async def send_message(group_id: str, message_data: ChatMessage, request: Reques
             "created_at": datetime.now(timezone.utc).isoformat(),
             "attachments": [],
             "status": "sent",
-            "read_by": [],
             "reactions": [],
             "reply_to": reply_to_data
         }
@@ -737,55 +862,70 @@ async def send_message_with_files(
         if not content.strip() and not files:
             raise HTTPException(status_code=400, detail="Message must have content or attachments")
         
-        # Process file attachments
-        attachments = []
+        if len(files) > MAX_FILES_PER_MESSAGE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A message can have at most {MAX_FILES_PER_MESSAGE} attachments"
+            )
+        
+        # Check every file type before storing anything
+        content_types = []
         for file in files:
-            # Check file size
-            file_content = await file.read()
-            if len(file_content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"File {file.filename} exceeds maximum size of 5MB"
-                )
-            
             # Get content type with fallback to extension-based detection
             content_type = get_content_type(file)
             logger.info(f"File upload: {file.filename}, detected content_type: {content_type}, original: {file.content_type}")
             
-            # Check file type
             if content_type not in ALLOWED_FILE_TYPES:
                 raise HTTPException(
                     status_code=400, 
                     detail=f"File type {content_type} is not allowed. Allowed types: images (jpeg, png, gif, webp) and documents (pdf, doc, docx, xls, xlsx, txt)"
                 )
-            
-            is_image = content_type in ALLOWED_IMAGE_TYPES
-            
-            attachment = {
-                "id": str(uuid4()),
-                "filename": file.filename,
-                "content_type": content_type,
-                "size": len(file_content),
-                "is_image": is_image,
-                "group_id": group_id,
-                "uploaded_by": user['email'],
-                "uploaded_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # Store file data as base64
-            attachment["data"] = base64.b64encode(file_content).decode('utf-8')
-            
-            # Store attachment in separate collection
-            await db.chat_attachments.insert_one(attachment)
-            
-            # Add to message attachments (without the full data for message storage)
-            attachments.append({
+            content_types.append(content_type)
+        
+        # Stream each file into GridFS (aborting at MAX_FILE_SIZE), then
+        # record them all; if any file fails the ones already stored are removed
+        attachment_docs = []
+        bucket = get_chat_files_bucket()
+        try:
+            for file, content_type in zip(files, content_types):
+                attachment_id = str(uuid4())
+                stored = await ingest_to_gridfs(
+                    file, bucket, attachment_id, MAX_FILE_SIZE,
+                    metadata={"content_type": content_type}
+                )
+                attachment_docs.append({
+                    "id": attachment_id,
+                    "filename": file.filename,
+                    "content_type": content_type,
+                    "size": stored.size,
+                    "is_image": content_type in ALLOWED_IMAGE_TYPES,
+                    "group_id": group_id,
+                    "uploaded_by": user['email'],
+                    "uploaded_at": datetime.now(timezone.utc).isoformat(),
+                    "etag": stored.md5,
+                    "file_id": stored.file_id
+                })
+        except BaseException:
+            for attachment in attachment_docs:
+                await bucket.delete(attachment["file_id"])
+            raise
+        if attachment_docs:
+            await db.chat_attachments.insert_many(attachment_docs)
+        for attachment in attachment_docs:
+            if attachment["is_image"]:
+                schedule_attachment_variants(attachment)
+        
+        # Message attachments carry only the details, not the storage fields
+        attachments = [
+            {
                 "id": attachment["id"],
                 "filename": attachment["filename"],
                 "content_type": attachment["content_type"],
                 "size": attachment["size"],
                 "is_image": attachment["is_image"]
-            })
+            }
+            for attachment in attachment_docs
+        ]
         
         # Get sender's picture
         sender_data = await db.users.find_one({"email": user['email']}, {"_id": 0, "picture": 1})
@@ -811,7 +951,6 @@ async def send_message_with_files(
             "created_at": datetime.now(timezone.utc).isoformat(),
             "attachments": attachments,
             "status": "sent",
-            "read_by": [],
             "reactions": [],
             "reply_to": reply_to_data
         }
@@ -844,31 +983,33 @@ async def send_message_with_files(
         raise HTTPException(status_code=500, detail="Failed to send message")
 
 
+async def get_member_attachment(attachment_id: str, request: Request) -> dict:
+    """chat_attachments document, if the current user is a member of its group"""
+    from auth import require_auth
+    user = await require_auth(request)
+    db = await get_db()
+    
+    attachment = await db.chat_attachments.find_one({"id": attachment_id}, {"_id": 0, "data": 0})
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    
+    if user['email'] not in await get_cached_group_members(attachment["group_id"]):
+        raise HTTPException(status_code=403, detail="You don't have access to this attachment")
+    return attachment
+
+
 @chat_router.get("/attachments/{attachment_id}")
 async def get_attachment(attachment_id: str, request: Request):
-    """Get a file attachment by ID"""
+    """Get a file attachment's details; the bytes are served by /content"""
     try:
-        from auth import require_auth
-        user = await require_auth(request)
-        db = await get_db()
-        
-        # Get the attachment
-        attachment = await db.chat_attachments.find_one({"id": attachment_id}, {"_id": 0})
-        if not attachment:
-            raise HTTPException(status_code=404, detail="Attachment not found")
-        
-        # Check if user is a member of the group
-        group = await db.chat_groups.find_one({"id": attachment["group_id"]}, {"_id": 0})
-        if not group or user['email'] not in group.get('members', []):
-            raise HTTPException(status_code=403, detail="You don't have access to this attachment")
-        
+        attachment = await get_member_attachment(attachment_id, request)
         return {
             "id": attachment["id"],
             "filename": attachment["filename"],
             "content_type": attachment["content_type"],
             "size": attachment["size"],
             "is_image": attachment["is_image"],
-            "data": attachment.get("data")
+            "url": f"/api/chat/attachments/{attachment_id}/content"
         }
     except HTTPException:
         raise
@@ -877,6 +1018,52 @@ async def get_attachment(attachment_id: str, request: Request):
         raise HTTPException(status_code=500, detail="Failed to fetch attachment")
 
 
+@chat_router.get("/attachments/{attachment_id}/content")
+async def get_attachment_content(attachment_id: str, request: Request, w: Optional[int] = Query(None, gt=0)):
+    """
+    Stream a file attachment from GridFS.
+    Supports ETag/If-None-Match (304) and Range requests (206), so large
+    PDFs are sent chunk by chunk and can be resumed or read in pieces.
+    For images, ?w=<pixels> serves the smallest resized variant at least
+    that wide (WebP when accepted) instead of the original.
+    """
+    try:
+        attachment = await get_member_attachment(attachment_id, request)
+        if attachment.get("file_id") is None:
+            # Not yet moved to GridFS by migrate_chat_attachments_to_gridfs
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        
+        variant = select_variant(attachment.get("variants"), w, request.headers.get("accept"))
+        if variant:
+            return await gridfs_response(
+                get_chat_files_bucket(),
+                variant["file_id"],
+                variant["size"],
+                variant["content_type"],
+                variant["etag"],
+                request,
+                ATTACHMENT_CACHE_CONTROL,
+                extra_headers={"Vary": "Accept"}
+            )
+        
+        return await gridfs_response(
+            get_chat_files_bucket(),
+            attachment["file_id"],
+            attachment["size"],
+            attachment["content_type"],
+            attachment.get("etag") or attachment["id"],
+            request,
+            ATTACHMENT_CACHE_CONTROL,
+            filename=attachment["filename"],
+            extra_headers={"Vary": "Accept"} if w else None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming attachment: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch attachment")
+
+
 @chat_router.delete("/messages/{message_id}")
 async def delete_message(message_id: str, request: Request):
     """Soft delete a message - only the sender can delete their own messages"""
@@ -912,7 +1099,7 @@ async def delete_message(message_id: str, request: Request):
         # Delete associated attachments from storage
         if message.get('attachments'):
             attachment_ids = [att['id'] for att in message['attachments']]
-            await db.chat_attachments.delete_many({"id": {"$in": attachment_ids}})
+            await delete_attachments(db, {"id": {"$in": attachment_ids}})
         
         # Broadcast deletion via WebSocket
         if group_id:
@@ -1127,40 +1314,82 @@ async def get_message_reactions(message_id: str, request: Request):
 
 # ============ TYPING INDICATOR ENDPOINTS ============
 
-# In-memory typing status (clears automatically after 5 seconds)
-# Format: {group_id: {user_email: {name, timestamp}}}
-typing_status = {}
+# Typing state lives in typing_tracker (typing_indicators.py); the
+# WebSocket start_typing/stop_typing frames are the primary path and these
+# endpoints are the polling fallback. Neither touches the database on a
+# warm cache: the session comes from the auth session cache and membership
+# from group_members_cache below.
+
+# Members of each group, for the typing fallback's membership check.
+# Entries are dropped by every handler that changes a group's members on
+# this worker; the TTL bounds staleness from changes made on other workers.
+# Format: {group_id: (expires_at, set(members))}
+group_members_cache = {}
+
+GROUP_MEMBERS_CACHE_SECONDS = int(os.getenv('GROUP_MEMBERS_CACHE_SECONDS', '60'))
+
+
+def invalidate_group_members(group_id: str):
+    group_members_cache.pop(group_id, None)
+
+
+async def get_cached_group_members(group_id: str) -> set:
+    """Member emails of a group, from the cache when fresh"""
+    now = time.monotonic()
+    cached = group_members_cache.get(group_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    db = await get_db()
+    group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
+    members = set((group or {}).get('members', []))
+    group_members_cache[group_id] = (now + GROUP_MEMBERS_CACHE_SECONDS, members)
+    return members
+
+
+async def start_typing(group_id: str, user_email: str, user_name: str):
+    """Publish typing_start unless one went out for this user within the coalesce window"""
+    if typing_tracker.start(group_id, user_email, user_name):
+        await backplane.publish(group_id, {
+            "type": WSMessageType.TYPING_START,
+            "user_email": user_email,
+            "user_name": user_name
+        }, exclude_user=user_email)
+
+
+async def stop_typing(group_id: str, user_email: str):
+    """Publish typing_stop if the user was typing"""
+    if typing_tracker.stop(group_id, user_email):
+        await backplane.publish(group_id, {
+            "type": WSMessageType.TYPING_STOP,
+            "user_email": user_email
+        }, exclude_user=user_email)
+
+
+async def expire_typing(group_id: str, user_email: str):
+    """typing_tracker sweeper callback: the user stopped sending start_typing"""
+    await backplane.publish(group_id, {
+        "type": WSMessageType.TYPING_STOP,
+        "user_email": user_email
+    }, exclude_user=user_email)
 
-TYPING_TIMEOUT_SECONDS = 5
 
 class TypingStatus(BaseModel):
     is_typing: bool
 
 @chat_router.post("/groups/{group_id}/typing")
 async def update_typing_status(group_id: str, status: TypingStatus, request: Request):
-    """Update typing status for current user in a group"""
+    """Update typing status for current user in a group (fallback for clients without a WebSocket)"""
     try:
         from auth import require_auth
         user = await require_auth(request)
-        db = await get_db()
         
-        # Verify user is member of the group
-        group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0})
-        if not group or user['email'] not in group.get('members', []):
+        if user['email'] not in await get_cached_group_members(group_id):
             raise HTTPException(status_code=403, detail="You must be a group member")
         
         if status.is_typing:
-            # Set typing status
-            if group_id not in typing_status:
-                typing_status[group_id] = {}
-            typing_status[group_id][user['email']] = {
-                'name': user['name'],
-                'timestamp': datetime.now(timezone.utc)
-            }
+            await start_typing(group_id, user['email'], user['name'])
         else:
-            # Clear typing status
-            if group_id in typing_status and user['email'] in typing_status[group_id]:
-                del typing_status[group_id][user['email']]
+            await stop_typing(group_id, user['email'])
         
         return {"status": "ok"}
     except HTTPException:
@@ -1172,38 +1401,15 @@ async def update_typing_status(group_id: str, status: TypingStatus, request: Req
 
 @chat_router.get("/groups/{group_id}/typing")
 async def get_typing_users(group_id: str, request: Request):
-    """Get list of users currently typing in a group"""
+    """Get list of users currently typing in a group (fallback for clients without a WebSocket)"""
     try:
         from auth import require_auth
         user = await require_auth(request)
-        db = await get_db()
         
-        # Verify user is member of the group
-        group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0})
-        if not group or user['email'] not in group.get('members', []):
+        if user['email'] not in await get_cached_group_members(group_id):
             raise HTTPException(status_code=403, detail="You must be a group member")
         
-        now = datetime.now(timezone.utc)
-        typing_users = []
-        
-        if group_id in typing_status:
-            # Clean up expired entries and collect active ones
-            expired = []
-            for email, data in typing_status[group_id].items():
-                # Skip current user
-                if email == user['email']:
-                    continue
-                # Check if expired
-                if (now - data['timestamp']).total_seconds() > TYPING_TIMEOUT_SECONDS:
-                    expired.append(email)
-                else:
-                    typing_users.append({'email': email, 'name': data['name']})
-            
-            # Clean up expired
-            for email in expired:
-                del typing_status[group_id][email]
-        
-        return {"typing_users": typing_users}
+        return {"typing_users": typing_tracker.typing_users(group_id, exclude_email=user['email'])}
     except HTTPException:
         raise
     except Exception as e:
@@ -1247,6 +1453,93 @@ async def mark_group_as_read(group_id: str, request: Request):
         raise HTTPException(status_code=500, detail="Failed to mark as read")
 
 
+async def compute_unread_counts(db, user_email: str) -> dict:
+    """Unread count and latest message time for every group the user belongs to.
+    
+    One aggregation (a single round trip) regardless of how many groups the
+    user is in: each group is joined with the user's read watermark and then
+    with its messages.
+    """
+    pending = read_receipts.pending_watermarks(user_email)
+    pipeline = [
+        {"$match": {"members": user_email}},
+        {"$sort": {"created_at": -1}},
+        {"$limit": 100},
+        {"$project": {"_id": 0, "id": 1}},
+        # User's last read timestamp for the group
+        {"$lookup": {
+            "from": "chat_user_reads",
+            "let": {"gid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$group_id", "$$gid"]},
+                    {"$eq": ["$user_email", user_email]}
+                ]}}},
+                {"$project": {"_id": 0, "last_read_at": 1}}
+            ],
+            "as": "reads"
+        }},
+        {"$addFields": {
+            "last_read_at": {"$max": [
+                {"$ifNull": [{"$arrayElemAt": ["$reads.last_read_at", 0]}, ""]},
+                # Advances still waiting in the read receipt batch
+                {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$id", group_id]}, "then": read_at}
+                        for group_id, read_at in pending.items()
+                    ],
+                    "default": ""
+                }} if pending else ""
+            ]}
+        }},
+        # Unread = messages after last_read, excluding user's own messages
+        {"$lookup": {
+            "from": "chat_messages",
+            "let": {"gid": "$id", "last_read": "$last_read_at"},
+            "pipeline": [
+                {"$match": {
+                    "$expr": {"$and": [
+                        {"$eq": ["$group_id", "$$gid"]},
+                        {"$gt": ["$created_at", "$$last_read"]}
+                    ]},
+                    "sender_email": {"$ne": user_email},
+                    "is_deleted": {"$ne": True}
+                }},
+                {"$count": "count"}
+            ],
+            "as": "unread"
+        }},
+        # Latest message time for sorting
+        {"$lookup": {
+            "from": "chat_messages",
+            "let": {"gid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$group_id", "$$gid"]}, "is_deleted": {"$ne": True}}},
+                {"$sort": {"created_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "created_at": 1}}
+            ],
+            "as": "latest"
+        }},
+        {"$project": {
+            "id": 1,
+            "unread": {"$ifNull": [{"$arrayElemAt": ["$unread.count", 0]}, 0]},
+            "latest": {"$ifNull": [{"$arrayElemAt": ["$latest.created_at", 0]}, None]}
+        }}
+    ]
+    
+    unread_counts = {}
+    latest_message_times = {}
+    async for row in db.chat_groups.aggregate(pipeline):
+        unread_counts[row['id']] = row['unread']
+        latest_message_times[row['id']] = row['latest']
+    
+    return {
+        "unread_counts": unread_counts,
+        "latest_message_times": latest_message_times
+    }
+
+
 @chat_router.get("/groups/unread-counts")
 async def get_unread_counts(request: Request):
     """Get unread message counts for all groups the user is a member of"""
@@ -1255,58 +1548,7 @@ async def get_unread_counts(request: Request):
         user = await require_auth(request)
         db = await get_db()
         
-        user_email = user['email']
-        
-        # Get all groups user is a member of
-        groups = await db.chat_groups.find(
-            {"members": user_email},
-            {"_id": 0, "id": 1}
-        ).to_list(100)
-        
-        group_ids = [g['id'] for g in groups]
-        
-        # Get user's last read timestamps for each group
-        user_reads = await db.chat_user_reads.find(
-            {"user_email": user_email, "group_id": {"$in": group_ids}},
-            {"_id": 0}
-        ).to_list(100)
-        
-        last_read_map = {r['group_id']: r['last_read_at'] for r in user_reads}
-        
-        # Calculate unread counts and get latest message time for each group
-        unread_counts = {}
-        latest_message_times = {}
-        
-        for group_id in group_ids:
-            last_read = last_read_map.get(group_id)
-            
-            # Get unread count (messages after last_read, excluding user's own messages)
-            query = {
-                "group_id": group_id,
-                "sender_email": {"$ne": user_email},
-                "is_deleted": {"$ne": True}
-            }
-            if last_read:
-                query["created_at"] = {"$gt": last_read}
-            
-            count = await db.chat_messages.count_documents(query)
-            unread_counts[group_id] = count
-            
-            # Get latest message time for sorting
-            latest_msg = await db.chat_messages.find_one(
-                {"group_id": group_id, "is_deleted": {"$ne": True}},
-                {"_id": 0, "created_at": 1},
-                sort=[("created_at", -1)]
-            )
-            if latest_msg:
-                latest_message_times[group_id] = latest_msg['created_at']
-            else:
-                latest_message_times[group_id] = None
-        
-        return {
-            "unread_counts": unread_counts,
-            "latest_message_times": latest_message_times
-        }
+        return await compute_unread_counts(db, user['email'])
     except HTTPException:
         raise
     except Exception as e:
@@ -1314,6 +1556,95 @@ async def get_unread_counts(request: Request):
         raise HTTPException(status_code=500, detail="Failed to get unread counts")
 
 
+async def send_unread_counts(user_email: str):
+    """Send a user's current unread counts over every WebSocket they have open"""
+    try:
+        db = await get_db()
+        counts = await compute_unread_counts(db, user_email)
+        await chat_manager.send_to_email(user_email, {
+            "type": WSMessageType.UNREAD_COUNTS,
+            **counts
+        })
+    except Exception as e:
+        logger.error(f"Failed to send unread counts to {user_email}: {e}")
+
+
+# At most this many unread count aggregations run at once on a worker
+UNREAD_COUNTS_CONCURRENCY = int(os.getenv('CHAT_UNREAD_COUNTS_CONCURRENCY', '8'))
+unread_counts_semaphore = asyncio.Semaphore(UNREAD_COUNTS_CONCURRENCY)
+
+# group_id -> running refresh; group_id -> exclude_email of a message that
+# arrived during it
+unread_count_refreshes: Dict[str, asyncio.Task] = {}
+_unread_refresh_pending: Dict[str, Optional[str]] = {}
+
+
+async def notify_unread_counts(group_id: str, exclude_email: Optional[str] = None):
+    """After a new message, refresh unread counts for members with a socket
+    on this worker that is not subscribed to the group (subscribers see the
+    message itself)"""
+    candidates = [
+        email for email in chat_manager.online_emails()
+        if email != exclude_email and not chat_manager.is_user_online(group_id, email)
+    ]
+    if not candidates:
+        return
+    
+    db = await get_db()
+    group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
+    member_set = set((group or {}).get('members', []))
+    
+    async def send(email: str):
+        async with unread_counts_semaphore:
+            await send_unread_counts(email)
+    
+    await asyncio.gather(*[send(email) for email in candidates if email in member_set])
+
+
+async def _refresh_unread_counts(group_id: str, exclude_email: Optional[str]):
+    try:
+        while True:
+            await notify_unread_counts(group_id, exclude_email)
+            if group_id not in _unread_refresh_pending:
+                break
+            exclude_email = _unread_refresh_pending.pop(group_id)
+    except Exception as e:
+        logger.error(f"Failed to refresh unread counts for group {group_id}: {e}")
+    finally:
+        unread_count_refreshes.pop(group_id, None)
+        _unread_refresh_pending.pop(group_id, None)
+
+
+def schedule_unread_counts(group_id: str, exclude_email: Optional[str] = None):
+    """Refresh a group's unread counts in the background, off the backplane's
+    delivery path. Messages arriving while a refresh of the group runs are
+    covered by a single further refresh once it finishes, so a busy group
+    costs one aggregation per member at a time and the last counts sent are
+    never older than the last message"""
+    if group_id in unread_count_refreshes:
+        _unread_refresh_pending[group_id] = exclude_email
+        return
+    unread_count_refreshes[group_id] = asyncio.create_task(_refresh_unread_counts(group_id, exclude_email))
+
+
+async def deliver_chat_event(envelope: dict):
+    """Backplane handler, run on every worker for every chat event: fan the
+    event out to this worker's sockets and keep local typing state in sync"""
+    group_id = envelope['group_id']
+    message = envelope['message']
+    msg_type = message.get('type')
+    
+    if msg_type == WSMessageType.TYPING_START:
+        typing_tracker.observe(group_id, message['user_email'], message.get('user_name'))
+    elif msg_type == WSMessageType.TYPING_STOP:
+        typing_tracker.forget(group_id, message['user_email'])
+    
+    await chat_manager.broadcast_to_group(group_id, message, exclude_user=envelope.get('exclude_user'))
+    
+    if msg_type == WSMessageType.NEW_MESSAGE:
+        schedule_unread_counts(group_id, exclude_email=message['message'].get('sender_email'))
+
+
 # ============ WEBSOCKET ENDPOINT ============
 
 async def verify_websocket_token(token: str) -> Optional[dict]:
@@ -1379,35 +1710,246 @@ async def verify_websocket_token(token: str) -> Optional[dict]:
         return None
 
 
-@chat_router.websocket("/ws/{group_id}")
-async def websocket_endpoint(
-    websocket: WebSocket, 
-    group_id: str,
-    token: str = Query(...)
-):
-    """
-    WebSocket endpoint for real-time chat
+async def authorize_chat_groups(db, group_ids: List[str], user_email: str) -> dict:
+    """group_id -> (group, None) when the user may subscribe, or
+    (None, (close_code, reason)) when not. One query for any number of groups."""
+    groups = {}
+    async for group in db.chat_groups.find(
+        {"id": {"$in": group_ids}},
+        {"_id": 0, "id": 1, "name": 1, "members": 1, "is_mc_only": 1, "group_type": 1}
+    ):
+        groups[group['id']] = group
     
-    Connect with: ws://host/api/chat/ws/{group_id}?token={session_token}
+    result = {}
+    for group_id in group_ids:
+        group = groups.get(group_id)
+        if not group:
+            result[group_id] = (None, (4004, "Group not found"))
+        elif user_email not in group.get('members', []):
+            result[group_id] = (None, (4003, "Not a member of this group"))
+        else:
+            result[group_id] = (group, None)
+    return result
+
+
+async def handle_chat_frame(connection, user: dict, group: dict, message_data: dict):
+    """Handle one client frame addressed to a group the connection is subscribed to"""
+    db = await get_db()
+    group_id = group['id']
+    user_email = user['email']
+    user_name = user['name']
+    user_picture = user.get('picture')
+    msg_type = message_data.get("type")
     
-    Message types from client:
-    - {"type": "send_message", "content": "...", "reply_to": {...}}
-    - {"type": "start_typing"}
-    - {"type": "stop_typing"}
-    - {"type": "mark_read", "message_ids": [...]}
-    - {"type": "add_reaction", "message_id": "...", "emoji": "..."}
-    - {"type": "get_online_users"}
+    # Check MC-only restrictions
+    is_mc_only = group.get('is_mc_only') or group.get('group_type') == 'mc_only'
+    is_admin_or_manager = user.get('role', 'user') in ['admin', 'manager']
     
-    Message types from server:
-    - {"type": "new_message", "message": {...}}
-    - {"type": "typing_start", "user_email": "...", "user_name": "..."}
-    - {"type": "typing_stop", "user_email": "..."}
-    - {"type": "read_receipt", "user_email": "...", "message_ids": [...]}
-    - {"type": "reaction_added", "message_id": "...", "reactions": [...]}
-    - {"type": "online_users", "users": [...]}
-    - {"type": "user_joined", "user_email": "...", "user_name": "..."}
-    - {"type": "user_left", "user_email": "..."}
-    """
+    if msg_type == WSMessageType.SEND_MESSAGE:
+        # Check if user can send messages in MC-only groups
+        if is_mc_only and not is_admin_or_manager:
+            await chat_manager.send(connection, group_id, {
+                "type": WSMessageType.ERROR,
+                "error": "Only managers can send messages in this group"
+            })
+            return
+        
+        content = message_data.get("content", "").strip()
+        reply_to = message_data.get("reply_to")
+        
+        if not content:
+            return
+        
+        # Create message
+        message = {
+            "id": str(uuid4()),
+            "group_id": group_id,
+            "sender_email": user_email,
+            "sender_name": user_name,
+            "sender_picture": user_picture,
+            "content": content,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "attachments": [],
+            "status": "sent",
+            "reactions": [],
+            "reply_to": reply_to
+        }
+        
+        await db.chat_messages.insert_one(message)
+        
+        # Sending ends the sender's typing indicator
+        await stop_typing(group_id, user_email)
+        
+        # Broadcast to all users in group (including sender for confirmation)
+        await backplane.publish_message(group_id, message)
+        
+        # Send push notification to offline members
+        try:
+            preview = content[:50] + "..." if len(content) > 50 else content
+            await send_notification_to_group_members(
+                group_id=group_id,
+                title=f"{user_name} in {group['name']}",
+                body=preview,
+                exclude_email=user_email,
+                url=f"/chat?group={group_id}"
+            )
+        except Exception as push_error:
+            logger.error(f"Failed to send push notification: {push_error}")
+    
+    elif msg_type == WSMessageType.START_TYPING:
+        # Clients repeat this while the user types; coalesced to one
+        # typing_start per user per TYPING_COALESCE_SECONDS
+        await start_typing(group_id, user_email, user_name)
+    
+    elif msg_type == WSMessageType.STOP_TYPING:
+        await stop_typing(group_id, user_email)
+    
+    elif msg_type == WSMessageType.MARK_READ:
+        message_ids = message_data.get("message_ids", [])
+        if message_ids:
+            # Advancing the user's watermark marks every message up
+            # to now as read; the write is batched with other
+            # mark_read frames off the socket's receive loop
+            read_at = datetime.now(timezone.utc).isoformat()
+            read_receipts.advance(group_id, user_email, read_at)
+            
+            # Broadcast read receipt to message senders
+            await backplane.publish(group_id, {
+                "type": WSMessageType.READ_RECEIPT,
+                "user_email": user_email,
+                "user_name": user_name,
+                "message_ids": message_ids,
+                "read_at": read_at
+            }, exclude_user=user_email)
+            
+            await send_unread_counts(user_email)
+    
+    elif msg_type == WSMessageType.ADD_REACTION:
+        message_id = message_data.get("message_id")
+        emoji = message_data.get("emoji")
+        
+        if not message_id or not emoji:
+            return
+        
+        # Get the message
+        msg = await db.chat_messages.find_one({"id": message_id}, {"_id": 0})
+        if not msg:
+            return
+        
+        reactions = msg.get('reactions', [])
+        
+        # Find existing reaction from this user
+        existing_idx = None
+        for idx, r in enumerate(reactions):
+            if r.get('user_email') == user_email:
+                existing_idx = idx
+                break
+        
+        if existing_idx is not None:
+            if reactions[existing_idx].get('emoji') == emoji:
+                # Same emoji - remove it
+                reactions.pop(existing_idx)
+            else:
+                # Different emoji - update
+                reactions[existing_idx] = {
+                    "emoji": emoji,
+                    "user_email": user_email,
+                    "user_name": user_name,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                }
+        else:
+            # Add new reaction
+            reactions.append({
+                "emoji": emoji,
+                "user_email": user_email,
+                "user_name": user_name,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+        
+        # Update database
+        await db.chat_messages.update_one(
+            {"id": message_id},
+            {"$set": {"reactions": reactions}}
+        )
+        
+        # Broadcast reaction update
+        await backplane.publish(group_id, {
+            "type": WSMessageType.REACTION_ADDED,
+            "message_id": message_id,
+            "reactions": reactions
+        })
+    
+    elif msg_type == WSMessageType.DELETE_MESSAGE:
+        message_id = message_data.get("message_id")
+        if not message_id:
+            return
+        
+        # Verify ownership
+        msg = await db.chat_messages.find_one({"id": message_id}, {"_id": 0})
+        if not msg or msg.get('sender_email') != user_email:
+            await chat_manager.send(connection, group_id, {
+                "type": WSMessageType.ERROR,
+                "error": "Cannot delete this message"
+            })
+            return
+        
+        # Soft delete
+        await db.chat_messages.update_one(
+            {"id": message_id},
+            {
+                "$set": {
+                    "is_deleted": True,
+                    "deleted_at": datetime.now(timezone.utc).isoformat(),
+                    "content": "",
+                    "attachments": []
+                }
+            }
+        )
+        
+        # Broadcast deletion
+        await backplane.publish(group_id, {
+            "type": WSMessageType.MESSAGE_DELETED,
+            "message_id": message_id
+        })
+    
+    elif msg_type == WSMessageType.GET_ONLINE_USERS:
+        online_users = chat_manager.get_online_users(group_id)
+        await chat_manager.send(connection, group_id, {
+            "type": WSMessageType.ONLINE_USERS,
+            "users": online_users
+        })
+
+
+async def subscribe_chat_groups(db, connection, user: dict, subscriptions: dict, group_ids: List[str]):
+    """Authorize and subscribe a connection to groups, replying per group"""
+    group_ids = [gid for gid in dict.fromkeys(group_ids) if gid and gid not in subscriptions]
+    if not group_ids:
+        return
+    
+    for group_id, (group, error) in (await authorize_chat_groups(db, group_ids, user['email'])).items():
+        if error:
+            await chat_manager.send(connection, group_id, {
+                "type": WSMessageType.ERROR,
+                "code": error[0],
+                "error": error[1]
+            })
+            continue
+        
+        subscriptions[group_id] = group
+        await chat_manager.subscribe(connection, group_id)
+        await chat_manager.send(connection, group_id, {"type": WSMessageType.SUBSCRIBED})
+        
+        # Send current online users to the new subscriber
+        await chat_manager.send(connection, group_id, {
+            "type": WSMessageType.ONLINE_USERS,
+            "users": chat_manager.get_online_users(group_id)
+        })
+
+
+async def run_chat_socket(websocket: WebSocket, token: str, group_id: Optional[str] = None):
+    """Serve one chat WebSocket: authenticate once, then route frames to the
+    groups the socket is subscribed to (group_id pre-subscribes a
+    single-group socket)"""
     db = await get_db()
     
     # Verify token
@@ -1417,253 +1959,136 @@ async def websocket_endpoint(
         return
     
     user_email = user['email']
-    user_name = user['name']
-    user_picture = user.get('picture')
-    user_role = user.get('role', 'user')
-    
-    # Check if group exists and user is a member
-    group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0})
-    if not group:
-        await websocket.close(code=4004, reason="Group not found")
-        return
-    
-    if user_email not in group.get('members', []):
-        await websocket.close(code=4003, reason="Not a member of this group")
-        return
-    
-    # Check MC-only restrictions
-    is_mc_only = group.get('is_mc_only') or group.get('group_type') == 'mc_only'
-    is_admin_or_manager = user_role in ['admin', 'manager']
+    subscriptions: dict = {}  # group_id -> group
     
-    # Connect to WebSocket
-    await chat_manager.connect(websocket, group_id, user_email, user_name, user_picture)
+    if group_id:
+        # Single-group sockets are rejected outright, as before
+        group, error = (await authorize_chat_groups(db, [group_id], user_email))[group_id]
+        if error:
+            await websocket.close(code=error[0], reason=error[1])
+            return
     
-    # Send current online users to the new connection
-    online_users = chat_manager.get_online_users(group_id)
-    await websocket.send_text(json.dumps({
-        "type": WSMessageType.ONLINE_USERS,
-        "users": online_users
-    }))
+    connection = await chat_manager.open(websocket, user_email, user['name'], user.get('picture'))
     
     try:
+        if group_id:
+            await subscribe_chat_groups(db, connection, user, subscriptions, [group_id])
+        
+        # Send unread counts so clients don't need to poll for them
+        await send_unread_counts(user_email)
+        
         while True:
             # Receive message from client
             data = await websocket.receive_text()
             message_data = json.loads(data)
             msg_type = message_data.get("type")
             
-            if msg_type == WSMessageType.SEND_MESSAGE:
-                # Check if user can send messages in MC-only groups
-                if is_mc_only and not is_admin_or_manager:
-                    await websocket.send_text(json.dumps({
-                        "type": WSMessageType.ERROR,
-                        "error": "Only managers can send messages in this group"
-                    }))
-                    continue
-                
-                content = message_data.get("content", "").strip()
-                reply_to = message_data.get("reply_to")
-                
-                if not content:
-                    continue
-                
-                # Create message
-                message = {
-                    "id": str(uuid4()),
-                    "group_id": group_id,
-                    "sender_email": user_email,
-                    "sender_name": user_name,
-                    "sender_picture": user_picture,
-                    "content": content,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "attachments": [],
-                    "status": "sent",
-                    "read_by": [],
-                    "reactions": [],
-                    "reply_to": reply_to
-                }
-                
-                await db.chat_messages.insert_one(message)
-                
-                # Broadcast to all users in group (including sender for confirmation)
-                await chat_manager.broadcast_to_group(group_id, {
-                    "type": WSMessageType.NEW_MESSAGE,
-                    "message": message
-                })
-                
-                # Send push notification to offline members
-                try:
-                    preview = content[:50] + "..." if len(content) > 50 else content
-                    await send_notification_to_group_members(
-                        group_id=group_id,
-                        title=f"{user_name} in {group['name']}",
-                        body=preview,
-                        exclude_email=user_email,
-                        url=f"/chat?group={group_id}"
-                    )
-                except Exception as push_error:
-                    logger.error(f"Failed to send push notification: {push_error}")
-            
-            elif msg_type == WSMessageType.START_TYPING:
-                # Broadcast typing start to others
-                await chat_manager.broadcast_to_group(group_id, {
-                    "type": WSMessageType.TYPING_START,
-                    "user_email": user_email,
-                    "user_name": user_name
-                }, exclude_user=user_email)
-            
-            elif msg_type == WSMessageType.STOP_TYPING:
-                # Broadcast typing stop to others
-                await chat_manager.broadcast_to_group(group_id, {
-                    "type": WSMessageType.TYPING_STOP,
-                    "user_email": user_email
-                }, exclude_user=user_email)
+            if msg_type == WSMessageType.SUBSCRIBE:
+                group_ids = message_data.get("group_ids") or [message_data.get("group_id")]
+                await subscribe_chat_groups(db, connection, user, subscriptions, group_ids)
+                continue
             
-            elif msg_type == WSMessageType.MARK_READ:
-                message_ids = message_data.get("message_ids", [])
-                if message_ids:
-                    # Update messages in database
-                    await db.chat_messages.update_many(
-                        {"id": {"$in": message_ids}, "sender_email": {"$ne": user_email}},
-                        {"$addToSet": {"read_by": user_email}}
-                    )
-                    
-                    # Also update user's last read timestamp
-                    await db.chat_user_reads.update_one(
-                        {"user_email": user_email, "group_id": group_id},
-                        {
-                            "$set": {
-                                "user_email": user_email,
-                                "group_id": group_id,
-                                "last_read_at": datetime.now(timezone.utc).isoformat()
-                            }
-                        },
-                        upsert=True
-                    )
-                    
-                    # Broadcast read receipt to message senders
-                    await chat_manager.broadcast_to_group(group_id, {
-                        "type": WSMessageType.READ_RECEIPT,
-                        "user_email": user_email,
-                        "user_name": user_name,
-                        "message_ids": message_ids
-                    }, exclude_user=user_email)
+            if msg_type == WSMessageType.UNSUBSCRIBE:
+                group_ids = message_data.get("group_ids") or [message_data.get("group_id")]
+                for unsubscribe_id in group_ids:
+                    if subscriptions.pop(unsubscribe_id, None) is not None:
+                        await chat_manager.unsubscribe(connection, unsubscribe_id)
+                        await chat_manager.send(connection, unsubscribe_id, {"type": WSMessageType.UNSUBSCRIBED})
+                continue
             
-            elif msg_type == WSMessageType.ADD_REACTION:
-                message_id = message_data.get("message_id")
-                emoji = message_data.get("emoji")
-                
-                if not message_id or not emoji:
-                    continue
-                
-                # Get the message
-                msg = await db.chat_messages.find_one({"id": message_id}, {"_id": 0})
-                if not msg:
-                    continue
-                
-                reactions = msg.get('reactions', [])
-                
-                # Find existing reaction from this user
-                existing_idx = None
-                for idx, r in enumerate(reactions):
-                    if r.get('user_email') == user_email:
-                        existing_idx = idx
-                        break
-                
-                if existing_idx is not None:
-                    if reactions[existing_idx].get('emoji') == emoji:
-                        # Same emoji - remove it
-                        reactions.pop(existing_idx)
-                    else:
-                        # Different emoji - update
-                        reactions[existing_idx] = {
-                            "emoji": emoji,
-                            "user_email": user_email,
-                            "user_name": user_name,
-                            "created_at": datetime.now(timezone.utc).isoformat()
-                        }
-                else:
-                    # Add new reaction
-                    reactions.append({
-                        "emoji": emoji,
-                        "user_email": user_email,
-                        "user_name": user_name,
-                        "created_at": datetime.now(timezone.utc).isoformat()
-                    })
-                
-                # Update database
-                await db.chat_messages.update_one(
-                    {"id": message_id},
-                    {"$set": {"reactions": reactions}}
-                )
-                
-                # Broadcast reaction update
-                await chat_manager.broadcast_to_group(group_id, {
-                    "type": WSMessageType.REACTION_ADDED,
-                    "message_id": message_id,
-                    "reactions": reactions
-                })
+            if msg_type == WSMessageType.GET_UNREAD_COUNTS:
+                await send_unread_counts(user_email)
+                continue
             
-            elif msg_type == WSMessageType.DELETE_MESSAGE:
-                message_id = message_data.get("message_id")
-                if not message_id:
-                    continue
-                
-                # Verify ownership
-                msg = await db.chat_messages.find_one({"id": message_id}, {"_id": 0})
-                if not msg or msg.get('sender_email') != user_email:
-                    await websocket.send_text(json.dumps({
-                        "type": WSMessageType.ERROR,
-                        "error": "Cannot delete this message"
-                    }))
-                    continue
-                
-                # Soft delete
-                await db.chat_messages.update_one(
-                    {"id": message_id},
-                    {
-                        "$set": {
-                            "is_deleted": True,
-                            "deleted_at": datetime.now(timezone.utc).isoformat(),
-                            "content": "",
-                            "attachments": []
-                        }
-                    }
-                )
-                
-                # Broadcast deletion
-                await chat_manager.broadcast_to_group(group_id, {
-                    "type": WSMessageType.MESSAGE_DELETED,
-                    "message_id": message_id
+            # Everything else is addressed to one subscribed group
+            target_group_id = message_data.get("group_id") or group_id
+            group = subscriptions.get(target_group_id)
+            if group is None:
+                await chat_manager.send(connection, target_group_id, {
+                    "type": WSMessageType.ERROR,
+                    "error": "Not subscribed to this group"
                 })
+                continue
             
-            elif msg_type == WSMessageType.GET_ONLINE_USERS:
-                online_users = chat_manager.get_online_users(group_id)
-                await websocket.send_text(json.dumps({
-                    "type": WSMessageType.ONLINE_USERS,
-                    "users": online_users
-                }))
+            await handle_chat_frame(connection, user, group, message_data)
     
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected: {user_email} from group {group_id}")
+        logger.info(f"WebSocket disconnected: {user_email}")
     except Exception as e:
-        logger.error(f"WebSocket error for {user_email} in group {group_id}: {e}")
+        logger.error(f"WebSocket error for {user_email}: {e}")
     finally:
-        await chat_manager.disconnect(group_id, user_email)
+        await chat_manager.close(connection)
+
+
+@chat_router.websocket("/ws")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str = Query(...)
+):
+    """
+    Multiplexed WebSocket endpoint for real-time chat - one socket per user
+    for any number of groups
+    
+    Connect with: ws://host/api/chat/ws?token={session_token}
+    
+    Subscription frames from client:
+    - {"type": "subscribe", "group_id": "..."} or {"type": "subscribe", "group_ids": [...]}
+    - {"type": "unsubscribe", "group_id": "..."} or {"type": "unsubscribe", "group_ids": [...]}
+    
+    Every other frame carries the group it is addressed to:
+    - {"type": "send_message", "group_id": "...", "content": "...", "reply_to": {...}}
+    - {"type": "start_typing", "group_id": "..."}
+    - {"type": "stop_typing", "group_id": "..."}
+    - {"type": "mark_read", "group_id": "...", "message_ids": [...]}
+    - {"type": "add_reaction", "group_id": "...", "message_id": "...", "emoji": "..."}
+    - {"type": "delete_message", "group_id": "...", "message_id": "..."}
+    - {"type": "get_online_users", "group_id": "..."}
+    - {"type": "get_unread_counts"}
+    
+    Message types from server (group frames include "group_id"):
+    - {"type": "subscribed", "group_id": "..."}
+    - {"type": "unsubscribed", "group_id": "..."}
+    - {"type": "new_message", "message": {...}}
+    - {"type": "typing_start", "user_email": "...", "user_name": "..."}
+    - {"type": "typing_stop", "user_email": "..."}
+    - {"type": "read_receipt", "user_email": "...", "message_ids": [...], "read_at": "..."}
+    - {"type": "reaction_added", "message_id": "...", "reactions": [...]}
+    - {"type": "message_deleted", "message_id": "..."}
+    - {"type": "online_users", "users": [...]}
+    - {"type": "user_joined", "user_email": "...", "user_name": "..."}
+    - {"type": "user_left", "user_email": "..."}
+    - {"type": "unread_counts", "unread_counts": {...}, "latest_message_times": {...}}
+    - {"type": "error", "error": "...", "code": 4003}  (code 4003/4004 on a refused subscribe)
+    """
+    await run_chat_socket(websocket, token)
+
+
+@chat_router.websocket("/ws/{group_id}")
+async def group_websocket_endpoint(
+    websocket: WebSocket, 
+    group_id: str,
+    token: str = Query(...)
+):
+    """
+    Single-group WebSocket endpoint (kept for clients that predate /ws)
+    
+    Connect with: ws://host/api/chat/ws/{group_id}?token={session_token}
+    
+    Same frames as /ws, with "group_id" defaulting to the group in the URL.
+    Closes with 4004 (group not found) or 4003 (not a member).
+    """
+    await run_chat_socket(websocket, token, group_id=group_id)
 
 
 # Helper function to broadcast message via WebSocket (for HTTP endpoints)
 async def broadcast_new_message(group_id: str, message: dict):
     """Broadcast a new message to all WebSocket connections in a group"""
-    await chat_manager.broadcast_to_group(group_id, {
-        "type": WSMessageType.NEW_MESSAGE,
-        "message": message
-    })
+    await backplane.publish_message(group_id, message)
 
 
 async def broadcast_message_deleted(group_id: str, message_id: str):
     """Broadcast message deletion to all WebSocket connections in a group"""
-    await chat_manager.broadcast_to_group(group_id, {
+    await backplane.publish(group_id, {
         "type": WSMessageType.MESSAGE_DELETED,
         "message_id": message_id
     })
@@ -1671,13 +2096,132 @@ async def broadcast_message_deleted(group_id: str, message_id: str):
 
 async def broadcast_reaction_update(group_id: str, message_id: str, reactions: list):
     """Broadcast reaction update to all WebSocket connections in a group"""
-    await chat_manager.broadcast_to_group(group_id, {
+    await backplane.publish(group_id, {
         "type": WSMessageType.REACTION_ADDED,
         "message_id": message_id,
         "reactions": reactions
     })
 
 
+# Messages whose read_by arrays are folded into watermarks per round trip
+READ_BY_MIGRATION_BATCH = 1000
+
+
+async def migrate_read_by_to_watermarks() -> int:
+    """
+    Fold the legacy per-message 'read_by' arrays into chat_user_reads
+    watermarks, then drop 'read_by' from chat_messages.
+    Messages are handled READ_BY_MIGRATION_BATCH at a time: each reader's
+    watermark for a group is raised ($max) to the newest message of the
+    batch they had marked read, and only once that write succeeded is
+    'read_by' unset on those messages. A crash or failed write in between
+    leaves the arrays in place for the next startup, and since $max is
+    idempotent, workers running this at the same time or a rerun over a
+    half-finished batch are harmless. Once no message carries 'read_by'
+    this is a single empty query.
+    Returns the number of messages cleaned up.
+    """
+    db = await get_db()
+    migrated = 0
+    upserted = 0
+    while True:
+        batch = await db.chat_messages.find(
+            {"read_by": {"$exists": True}},
+            {"_id": 1, "group_id": 1, "created_at": 1, "read_by": 1}
+        ).limit(READ_BY_MIGRATION_BATCH).to_list(None)
+        if not batch:
+            break
+        
+        watermarks = {}
+        for message in batch:
+            created_at = _timestamp(message.get('created_at'))
+            for user_email in message.get('read_by') or []:
+                key = (message['group_id'], user_email)
+                watermarks[key] = max(watermarks.get(key, ''), created_at)
+        if watermarks:
+            await db.chat_user_reads.bulk_write([
+                UpdateOne(
+                    {"user_email": user_email, "group_id": group_id},
+                    {"$max": {"last_read_at": last_read_at}},
+                    upsert=True
+                )
+                for (group_id, user_email), last_read_at in watermarks.items()
+            ], ordered=False)
+            upserted += len(watermarks)
+        
+        result = await db.chat_messages.update_many(
+            {"_id": {"$in": [message['_id'] for message in batch]}},
+            {"$unset": {"read_by": ""}}
+        )
+        migrated += result.modified_count
+    
+    if migrated:
+        logger.info(f"Migrated read_by on {migrated} chat messages into {upserted} read watermarks")
+    return migrated
+
+
+# A claim on a legacy attachment older than this is taken to be from a
+# worker that died mid-migration and may be taken over
+ATTACHMENT_MIGRATION_CLAIM_SECONDS = 600
+
+
+async def migrate_chat_attachments_to_gridfs() -> int:
+    """
+    Move legacy base64 'data' out of chat_attachments documents into the
+    chat_files GridFS bucket, one attachment at a time so only a single
+    file is in memory.
+    Every worker runs this at startup, so an attachment is first claimed
+    by setting 'migrating_at' with find_one_and_update; only the worker
+    holding the claim uploads it, and no attachment ends up with two
+    GridFS files. An attachment that fails stays claimed and is retried
+    by a later startup once the claim is ATTACHMENT_MIGRATION_CLAIM_SECONDS
+    old. Idempotent - documents are only picked up while they still
+    carry 'data'.
+    Returns the number of attachments this worker migrated.
+    """
+    db = await get_db()
+    migrated = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        attachment = await db.chat_attachments.find_one_and_update(
+            {
+                "data": {"$exists": True},
+                "$or": [
+                    {"migrating_at": {"$exists": False}},
+                    {"migrating_at": {"$lt": now - timedelta(seconds=ATTACHMENT_MIGRATION_CLAIM_SECONDS)}}
+                ]
+            },
+            {"$set": {"migrating_at": now}},
+            projection={"_id": 0}
+        )
+        if attachment is None:
+            break
+        file_id = None
+        try:
+            content = base64.b64decode(attachment["data"])
+            etag = hashlib.md5(content).hexdigest()
+            file_id = await store_attachment_file(
+                attachment["id"], content, attachment.get("content_type", "application/octet-stream"), etag
+            )
+            await db.chat_attachments.update_one(
+                {"id": attachment["id"]},
+                {"$set": {"file_id": file_id, "etag": etag, "size": len(content)},
+                 "$unset": {"data": "", "migrating_at": ""}}
+            )
+            migrated += 1
+        except Exception as e:
+            logger.error(f"Failed to migrate chat attachment {attachment.get('id')} to GridFS: {e}")
+            if file_id is not None:
+                # The document still holds 'data'; the retry uploads it again
+                try:
+                    await get_chat_files_bucket().delete(file_id)
+                except Exception as delete_error:
+                    logger.error(f"Failed to delete orphaned attachment file {file_id}: {delete_error}")
+    if migrated:
+        logger.info(f"Migrated {migrated} chat attachments to GridFS")
+    return migrated
+
+
 # Initialize MC Group on startup
 async def init_mc_group():
     """Create MC Group if it doesn't exist"""
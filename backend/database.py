@@ -0,0 +1,196 @@
+"""
+Shared MongoDB connection for the TROA backend.
+
+A single AsyncIOMotorClient (and therefore a single connection pool) is
+created per process and shared by every router. server.py opens it on
+startup and closes it on shutdown; modules get the database through
+get_database() instead of constructing their own clients.
+
+Pool behaviour is configured through environment variables:
+    MONGO_MAX_POOL_SIZE                 (default 100)
+    MONGO_MIN_POOL_SIZE                 (default 5)
+    MONGO_MAX_IDLE_TIME_MS              (default 300000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         (default 10000)
+    MONGO_CONNECT_TIMEOUT_MS            (default 10000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   (default 5000)
+    MONGO_SOCKET_TIMEOUT_MS             (optional, no limit when unset)
+"""
+import os
+import logging
+import threading
+from typing import Optional
+from pathlib import Path
+from dotenv import load_dotenv
+from pymongo import monitoring
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    """Read an integer setting from the environment"""
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so pool usage can be reported.
+
+    pymongo calls these hooks from its own threads, so counters are
+    guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.checked_in = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def _incr(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        self._incr('checked_in')
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_in_use": self.checked_out - self.checked_in,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pools_cleared": self.pools_cleared,
+            }
+
+
+class MongoProvider:
+    """Owns the process-wide Motor client.
+
+    The client is created lazily on first use so module-level references
+    (and standalone scripts) keep working; connect() is called from the
+    FastAPI startup hook to fail fast if MongoDB is unreachable.
+    """
+
+    def __init__(self):
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._lock = threading.Lock()
+        self.pool_listener = PoolStatsListener()
+
+    def _client_options(self) -> dict:
+        options = {
+            "maxPoolSize": _env_int('MONGO_MAX_POOL_SIZE', 100),
+            "minPoolSize": _env_int('MONGO_MIN_POOL_SIZE', 5),
+            "maxIdleTimeMS": _env_int('MONGO_MAX_IDLE_TIME_MS', 300000),
+            "waitQueueTimeoutMS": _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000),
+            "connectTimeoutMS": _env_int('MONGO_CONNECT_TIMEOUT_MS', 10000),
+            "serverSelectionTimeoutMS": _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        }
+        socket_timeout = _env_int('MONGO_SOCKET_TIMEOUT_MS', None)
+        if socket_timeout is not None:
+            options["socketTimeoutMS"] = socket_timeout
+        return options
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
+                    self.pool_listener.reset()
+                    self._client = AsyncIOMotorClient(
+                        mongo_url,
+                        event_listeners=[self.pool_listener],
+                        **self._client_options()
+                    )
+        return self._client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.client[os.getenv('DB_NAME', 'test_database')]
+
+    @property
+    def is_connected(self) -> bool:
+        return self._client is not None
+
+    async def connect(self):
+        """Create the client (if needed) and verify the server is reachable"""
+        await self.client.admin.command('ping')
+        logger.info(f"MongoDB connected (pool options: {self._client_options()})")
+
+    def close(self):
+        """Close the client and release every pooled connection"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                logger.info("MongoDB client closed")
+
+    def pool_stats(self) -> dict:
+        """Connection pool counters plus the configured limits"""
+        options = self._client_options()
+        stats = self.pool_listener.snapshot()
+        stats.update({
+            "connected": self.is_connected,
+            "max_pool_size": options["maxPoolSize"],
+            "min_pool_size": options["minPoolSize"],
+            "wait_queue_timeout_ms": options["waitQueueTimeoutMS"],
+        })
+        return stats
+
+
+# Process-wide provider instance
+mongo = MongoProvider()
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Get the shared application database"""
+    return mongo.db
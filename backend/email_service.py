@@ -910,29 +910,21 @@ For any queries, contact {self.reply_to_email}"""
 # Helper function to get admin and manager emails
 async def get_admin_manager_emails() -> List[str]:
     """Get list of admin and manager emails from database"""
-    from motor.motor_asyncio import AsyncIOMotorClient
+    from database import get_database
     
-    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.getenv('DB_NAME', 'test_database')
+    db = get_database()
+    users = await db.users.find(
+        {'role': {'$in': ['admin', 'manager']}},
+        {'_id': 0, 'email': 1}
+    ).to_list(100)
     
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
+    emails = [user['email'] for user in users if user.get('email')]
     
-    try:
-        users = await db.users.find(
-            {'role': {'$in': ['admin', 'manager']}},
-            {'_id': 0, 'email': 1}
-        ).to_list(100)
-        
-        emails = [user['email'] for user in users if user.get('email')]
-        
-        # Always include super admin
-        if SUPER_ADMIN_EMAIL not in emails:
-            emails.append(SUPER_ADMIN_EMAIL)
-        
-        return emails
-    finally:
-        client.close()
+    # Always include super admin
+    if SUPER_ADMIN_EMAIL not in emails:
+        emails.append(SUPER_ADMIN_EMAIL)
+    
+    return emails
 
 
 # Singleton instance
@@ -1,13 +1,12 @@
 from fastapi import APIRouter, HTTPException, Request
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 import os
 import logging
 from dotenv import load_dotenv
 from models import Event, EventCreate, EventRegistration, EventRegistrationCreate
 from auth import require_admin, require_auth, require_manager_or_admin
-from email_service import email_service, get_admin_manager_emails
-from push_notifications import send_notification_to_user, send_notification_to_admins
+from database import get_database
+from notification_outbox import outbox, ADMIN_MANAGER_EMAILS
 
 load_dotenv()
 
@@ -15,15 +14,10 @@ logger = logging.getLogger(__name__)
 
 events_router = APIRouter(prefix="/events")
 
-# Database connection
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.getenv('DB_NAME', 'test_database')
-
 
 async def get_db():
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
-    return db, client
+    """Get the shared database (see database.py)"""
+    return get_database()
 
 
 # ============ EVENT ENDPOINTS ============
@@ -31,30 +25,24 @@ async def get_db():
 @events_router.get("")
 async def get_events(include_past: bool = False):
     """Get all events (optionally include past events)"""
-    db, client = await get_db()
-    try:
-        query = {}
-        if not include_past:
-            today = datetime.now().strftime('%Y-%m-%d')
-            query = {"event_date": {"$gte": today}, "is_active": True}
-        
-        events = await db.events.find(query, {"_id": 0}).sort("event_date", 1).to_list(100)
-        return events
-    finally:
-        client.close()
+    db = await get_db()
+    query = {}
+    if not include_past:
+        today = datetime.now().strftime('%Y-%m-%d')
+        query = {"event_date": {"$gte": today}, "is_active": True}
+    
+    events = await db.events.find(query, {"_id": 0}).sort("event_date", 1).to_list(100)
+    return events
 
 
 @events_router.get("/{event_id}")
 async def get_event(event_id: str):
     """Get a single event by ID"""
-    db, client = await get_db()
-    try:
-        event = await db.events.find_one({"id": event_id}, {"_id": 0})
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        return event
-    finally:
-        client.close()
+    db = await get_db()
+    event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event
 
 
 @events_router.post("")
@@ -77,29 +65,26 @@ async def create_event(event_data: EventCreate, request: Request):
         if event_data.adult_price is None or event_data.child_price is None:
             raise HTTPException(status_code=400, detail="Adult and child prices are required for adult/child pricing")
     
-    db, client = await get_db()
-    try:
-        event = Event(
-            name=event_data.name,
-            description=event_data.description,
-            image=event_data.image,
-            event_date=event_data.event_date,
-            event_time=event_data.event_time,
-            amount=event_data.amount,
-            payment_type=event_data.payment_type,
-            per_person_type=per_person_type,
-            adult_price=event_data.adult_price,
-            child_price=event_data.child_price,
-            preferences=event_data.preferences or [],
-            max_registrations=event_data.max_registrations,
-            created_by=user['email']
-        )
-        
-        await db.events.insert_one(event.dict())
-        logger.info(f"Event created: {event.name} by {user['email']}")
-        return event.dict()
-    finally:
-        client.close()
+    db = await get_db()
+    event = Event(
+        name=event_data.name,
+        description=event_data.description,
+        image=event_data.image,
+        event_date=event_data.event_date,
+        event_time=event_data.event_time,
+        amount=event_data.amount,
+        payment_type=event_data.payment_type,
+        per_person_type=per_person_type,
+        adult_price=event_data.adult_price,
+        child_price=event_data.child_price,
+        preferences=event_data.preferences or [],
+        max_registrations=event_data.max_registrations,
+        created_by=user['email']
+    )
+    
+    await db.events.insert_one(event.dict())
+    logger.info(f"Event created: {event.name} by {user['email']}")
+    return event.dict()
 
 
 @events_router.patch("/{event_id}")
@@ -107,26 +92,23 @@ async def update_event(event_id: str, event_data: dict, request: Request):
     """Update an event (admin or manager)"""
     await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        # Check if event exists
-        existing = await db.events.find_one({"id": event_id})
-        if not existing:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Don't allow changing date to past
-        if "event_date" in event_data:
-            today = datetime.now().strftime('%Y-%m-%d')
-            if event_data["event_date"] < today:
-                raise HTTPException(status_code=400, detail="Cannot set event date to the past")
-        
-        event_data["updated_at"] = datetime.utcnow()
-        await db.events.update_one({"id": event_id}, {"$set": event_data})
-        
-        updated = await db.events.find_one({"id": event_id}, {"_id": 0})
-        return updated
-    finally:
-        client.close()
+    db = await get_db()
+    # Check if event exists
+    existing = await db.events.find_one({"id": event_id})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Don't allow changing date to past
+    if "event_date" in event_data:
+        today = datetime.now().strftime('%Y-%m-%d')
+        if event_data["event_date"] < today:
+            raise HTTPException(status_code=400, detail="Cannot set event date to the past")
+    
+    event_data["updated_at"] = datetime.utcnow()
+    await db.events.update_one({"id": event_id}, {"$set": event_data})
+    
+    updated = await db.events.find_one({"id": event_id}, {"_id": 0})
+    return updated
 
 
 @events_router.delete("/{event_id}")
@@ -134,18 +116,15 @@ async def delete_event(event_id: str, request: Request):
     """Delete an event (admin or manager)"""
     await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        result = await db.events.delete_one({"id": event_id})
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Also delete all registrations for this event
-        await db.event_registrations.delete_many({"event_id": event_id})
-        
-        return {"message": "Event deleted successfully"}
-    finally:
-        client.close()
+    db = await get_db()
+    result = await db.events.delete_one({"id": event_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Also delete all registrations for this event
+    await db.event_registrations.delete_many({"event_id": event_id})
+    
+    return {"message": "Event deleted successfully"}
 
 
 # ============ REGISTRATION ENDPOINTS ============
@@ -155,131 +134,119 @@ async def register_for_event(event_id: str, registration_data: EventRegistration
     """Register for an event (authenticated users)"""
     user = await require_auth(request)
     
-    db, client = await get_db()
-    try:
-        # Get event details
-        event = await db.events.find_one({"id": event_id}, {"_id": 0})
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Check if event is in the past
-        today = datetime.now().strftime('%Y-%m-%d')
-        if event["event_date"] < today:
-            raise HTTPException(status_code=400, detail="Cannot register for past events")
-        
-        # Check if user already registered
-        existing = await db.event_registrations.find_one({
-            "event_id": event_id,
-            "user_email": user["email"],
-            "status": "registered"
-        })
-        if existing:
-            raise HTTPException(status_code=400, detail="You are already registered for this event")
-        
-        # Calculate total amount based on payment type and per_person_type
-        registrants = registration_data.registrants
-        num_registrants = len(registrants)
-        if num_registrants == 0:
-            raise HTTPException(status_code=400, detail="At least one registrant is required")
-        
-        if event["payment_type"] == "per_villa":
-            total_amount = event["amount"]
-        elif event.get("per_person_type") == "adult_child":
-            # Calculate based on adult/child counts
-            adult_count = sum(1 for r in registrants if r.get("registrant_type", "adult") == "adult")
-            child_count = sum(1 for r in registrants if r.get("registrant_type") == "child")
-            adult_price = event.get("adult_price", 0) or 0
-            child_price = event.get("child_price", 0) or 0
-            total_amount = (adult_count * adult_price) + (child_count * child_price)
-        else:
-            # Uniform per_person pricing
-            total_amount = event["amount"] * num_registrants
-        
-        # Validate payment method
-        payment_method = registration_data.payment_method
-        if payment_method not in ["online", "offline"]:
-            payment_method = "online"
-        
-        # Determine payment status based on method
-        if payment_method == "offline":
-            payment_status = "pending_approval"  # Offline payments need admin approval
-        else:
-            payment_status = "pending"  # Online payments start as pending until Razorpay confirms
-        
-        # Create registration
-        registration = EventRegistration(
-            event_id=event_id,
-            event_name=event["name"],
-            user_email=user["email"],
-            user_name=user["name"],
-            registrants=registrants,
-            total_amount=total_amount,
-            payment_method=payment_method,
-            payment_status=payment_status,
-            admin_approved=False
-        )
-        
-        await db.event_registrations.insert_one(registration.dict())
-        logger.info(f"Event registration created: {user['email']} for {event['name']} (payment: {payment_method})")
-        
-        # Send email to user
-        try:
-            await email_service.send_event_registration(
-                recipient_email=user['email'],
-                user_name=user['name'],
-                event_name=event['name'],
-                event_date=event['event_date'],
-                event_time=event.get('event_time', 'TBD'),
-                registrants=registrants,
-                total_amount=total_amount,
-                payment_status=payment_status,
-                registration_id=registration.id
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send event registration email: {email_error}")
-        
-        # Send notification to admins/managers
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_event_notification_to_admins(
-                action='registered',
-                user_name=user['name'],
-                user_email=user['email'],
-                event_name=event['name'],
-                event_date=event['event_date'],
-                registrants_count=len(registrants),
-                total_amount=total_amount,
-                payment_method=payment_method,
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send admin event notification: {email_error}")
-        
-        # Send push notification to user
-        try:
-            status_text = "pending approval" if payment_method == "offline" else "pending payment"
-            await send_notification_to_user(
-                user_email=user['email'],
-                title=f"Event Registration - {status_text.title()}",
-                body=f"Your registration for {event['name']} on {event['event_date']} is {status_text}.",
-                url="/my-events"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send event registration push notification: {push_error}")
-        
-        # Send push notification to admins
-        try:
-            await send_notification_to_admins(
-                title="New Event Registration",
-                body=f"{user['name']} registered for {event['name']} ({len(registrants)} people)",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send admin push notification: {push_error}")
-        
-        return registration.dict()
-    finally:
-        client.close()
+    db = await get_db()
+    # Get event details
+    event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Check if event is in the past
+    today = datetime.now().strftime('%Y-%m-%d')
+    if event["event_date"] < today:
+        raise HTTPException(status_code=400, detail="Cannot register for past events")
+    
+    # Check if user already registered
+    existing = await db.event_registrations.find_one({
+        "event_id": event_id,
+        "user_email": user["email"],
+        "status": "registered"
+    })
+    if existing:
+        raise HTTPException(status_code=400, detail="You are already registered for this event")
+    
+    # Calculate total amount based on payment type and per_person_type
+    registrants = registration_data.registrants
+    num_registrants = len(registrants)
+    if num_registrants == 0:
+        raise HTTPException(status_code=400, detail="At least one registrant is required")
+    
+    if event["payment_type"] == "per_villa":
+        total_amount = event["amount"]
+    elif event.get("per_person_type") == "adult_child":
+        # Calculate based on adult/child counts
+        adult_count = sum(1 for r in registrants if r.get("registrant_type", "adult") == "adult")
+        child_count = sum(1 for r in registrants if r.get("registrant_type") == "child")
+        adult_price = event.get("adult_price", 0) or 0
+        child_price = event.get("child_price", 0) or 0
+        total_amount = (adult_count * adult_price) + (child_count * child_price)
+    else:
+        # Uniform per_person pricing
+        total_amount = event["amount"] * num_registrants
+    
+    # Validate payment method
+    payment_method = registration_data.payment_method
+    if payment_method not in ["online", "offline"]:
+        payment_method = "online"
+    
+    # Determine payment status based on method
+    if payment_method == "offline":
+        payment_status = "pending_approval"  # Offline payments need admin approval
+    else:
+        payment_status = "pending"  # Online payments start as pending until Razorpay confirms
+    
+    # Create registration
+    registration = EventRegistration(
+        event_id=event_id,
+        event_name=event["name"],
+        user_email=user["email"],
+        user_name=user["name"],
+        registrants=registrants,
+        total_amount=total_amount,
+        payment_method=payment_method,
+        payment_status=payment_status,
+        admin_approved=False
+    )
+    
+    await db.event_registrations.insert_one(registration.dict())
+    logger.info(f"Event registration created: {user['email']} for {event['name']} (payment: {payment_method})")
+    
+    # Send email to user
+    await outbox.email(
+        'send_event_registration',
+        recipient_email=user['email'],
+        user_name=user['name'],
+        event_name=event['name'],
+        event_date=event['event_date'],
+        event_time=event.get('event_time', 'TBD'),
+        registrants=registrants,
+        total_amount=total_amount,
+        payment_status=payment_status,
+        registration_id=registration.id
+    )
+    
+    # Send notification to admins/managers
+    await outbox.email(
+        'send_event_notification_to_admins',
+        action='registered',
+        user_name=user['name'],
+        user_email=user['email'],
+        event_name=event['name'],
+        event_date=event['event_date'],
+        registrants_count=len(registrants),
+        total_amount=total_amount,
+        payment_method=payment_method,
+        admin_emails=ADMIN_MANAGER_EMAILS
+    )
+    
+    # Send push notification to user
+    status_text = "pending approval" if payment_method == "offline" else "pending payment"
+    await outbox.push(
+        'send_notification_to_user',
+        user_email=user['email'],
+        title=f"Event Registration - {status_text.title()}",
+        body=f"Your registration for {event['name']} on {event['event_date']} is {status_text}.",
+        url="/my-events"
+    )
+    
+    # Send push notification to admins
+    await outbox.push(
+        'send_notification_to_admins',
+        title="New Event Registration",
+        body=f"{user['name']} registered for {event['name']} ({len(registrants)} people)",
+        url="/admin"
+    )
+    
+    return registration.dict()
 
 
 @events_router.post("/registrations/{registration_id}/complete-payment")
@@ -290,7 +257,7 @@ async def complete_registration_payment(registration_id: str, payment_id: str, r
     user = await require_auth(request)
     logger.info(f"User authenticated: {user['email']}")
     
-    db, client = await get_db()
+    db = await get_db()
     try:
         registration = await db.event_registrations.find_one({
             "id": registration_id,
@@ -320,8 +287,8 @@ async def complete_registration_payment(registration_id: str, payment_id: str, r
             # Get event details
             event = await db.events.find_one({"id": registration.get("event_id")}, {"_id": 0})
             if event:
-                admin_emails = await get_admin_manager_emails()
-                await email_service.send_event_notification_to_admins(
+                await outbox.email(
+                    'send_event_notification_to_admins',
                     action='payment_completed',
                     user_name=user['name'],
                     user_email=user['email'],
@@ -330,21 +297,19 @@ async def complete_registration_payment(registration_id: str, payment_id: str, r
                     registrants_count=len(registration.get('registrants', [])),
                     total_amount=registration.get('total_amount', 0),
                     payment_method='online',
-                    admin_emails=admin_emails
+                    admin_emails=ADMIN_MANAGER_EMAILS
                 )
         except Exception as email_error:
             logger.error(f"Failed to send payment completion email: {email_error}")
         
         # Send push notification to user
-        try:
-            await send_notification_to_user(
-                user_email=user['email'],
-                title="Payment Successful! 🎉",
-                body=f"Your payment for {registration.get('event_name', 'Event')} is confirmed!",
-                url="/my-events"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send payment completion push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_user',
+            user_email=user['email'],
+            title="Payment Successful! 🎉",
+            body=f"Your payment for {registration.get('event_name', 'Event')} is confirmed!",
+            url="/my-events"
+        )
         
         return {"message": "Payment completed successfully", "registration_id": registration_id}
     except HTTPException:
@@ -352,8 +317,6 @@ async def complete_registration_payment(registration_id: str, payment_id: str, r
     except Exception as e:
         logger.error(f"Error completing payment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        client.close()
 
 
 
@@ -370,7 +333,7 @@ async def mark_registration_as_paid(registration_id: str, request: Request):
     
     logger.info(f"Mark as paid request - Registration: {registration_id} by {admin['email']}")
     
-    db, client = await get_db()
+    db = await get_db()
     try:
         registration = await db.event_registrations.find_one(
             {"id": registration_id},
@@ -422,8 +385,6 @@ async def mark_registration_as_paid(registration_id: str, request: Request):
     except Exception as e:
         logger.error(f"Error marking registration as paid: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        client.close()
 
 
 @events_router.get("/my/registrations")
@@ -431,22 +392,19 @@ async def get_my_registrations(request: Request):
     """Get all event registrations for the current user"""
     user = await require_auth(request)
     
-    db, client = await get_db()
-    try:
-        registrations = await db.event_registrations.find(
-            {"user_email": user["email"]},
-            {"_id": 0}
-        ).sort("created_at", -1).to_list(100)
-        
-        # Enrich with event details
-        for reg in registrations:
-            event = await db.events.find_one({"id": reg["event_id"]}, {"_id": 0})
-            if event:
-                reg["event"] = event
-        
-        return registrations
-    finally:
-        client.close()
+    db = await get_db()
+    registrations = await db.event_registrations.find(
+        {"user_email": user["email"]},
+        {"_id": 0}
+    ).sort("created_at", -1).to_list(100)
+    
+    # Enrich with event details
+    for reg in registrations:
+        event = await db.events.find_one({"id": reg["event_id"]}, {"_id": 0})
+        if event:
+            reg["event"] = event
+    
+    return registrations
 
 
 @events_router.post("/registrations/{registration_id}/withdraw")
@@ -454,72 +412,62 @@ async def withdraw_from_event(registration_id: str, request: Request):
     """Withdraw from an event"""
     user = await require_auth(request)
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "user_email": user["email"],
-            "status": "registered"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="Registration not found or already withdrawn")
-        
-        # Get event details for email
-        event = await db.events.find_one({"id": registration["event_id"]}, {"_id": 0})
-        
-        await db.event_registrations.update_one(
-            {"id": registration_id},
-            {"$set": {
-                "status": "withdrawn",
-                "updated_at": datetime.utcnow()
-            }}
-        )
-        
-        # Send withdrawal email to user
-        try:
-            await email_service.send_event_withdrawal(
-                recipient_email=user['email'],
-                user_name=user['name'],
-                event_name=registration.get('event_name', 'Event'),
-                event_date=event.get('event_date', 'TBD') if event else 'TBD'
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send withdrawal email: {email_error}")
-        
-        # Send notification to admins/managers
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_event_notification_to_admins(
-                action='withdrawn',
-                user_name=user['name'],
-                user_email=user['email'],
-                event_name=registration.get('event_name', 'Event'),
-                event_date=event.get('event_date', 'TBD') if event else 'TBD',
-                registrants_count=len(registration.get('registrants', [])),
-                total_amount=registration.get('total_amount', 0),
-                payment_method=registration.get('payment_method', 'unknown'),
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send admin withdrawal notification: {email_error}")
-        
-        # Send push notification to admins
-        try:
-            await send_notification_to_admins(
-                title="Event Withdrawal",
-                body=f"{user['name']} withdrew from {registration.get('event_name', 'Event')}",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send withdrawal push notification: {push_error}")
-        
-        return {
-            "message": "Successfully withdrawn from event",
-            "refund_instructions": "For refund requests, please email: troa.systems@gmail.com, troa.treasurer@gmail.com, troa.secretary@gmail.com, and president.troa@gmail.com"
-        }
-    finally:
-        client.close()
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "user_email": user["email"],
+        "status": "registered"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found or already withdrawn")
+    
+    # Get event details for email
+    event = await db.events.find_one({"id": registration["event_id"]}, {"_id": 0})
+    
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {"$set": {
+            "status": "withdrawn",
+            "updated_at": datetime.utcnow()
+        }}
+    )
+    
+    # Send withdrawal email to user
+    await outbox.email(
+        'send_event_withdrawal',
+        recipient_email=user['email'],
+        user_name=user['name'],
+        event_name=registration.get('event_name', 'Event'),
+        event_date=event.get('event_date', 'TBD') if event else 'TBD'
+    )
+    
+    # Send notification to admins/managers
+    await outbox.email(
+        'send_event_notification_to_admins',
+        action='withdrawn',
+        user_name=user['name'],
+        user_email=user['email'],
+        event_name=registration.get('event_name', 'Event'),
+        event_date=event.get('event_date', 'TBD') if event else 'TBD',
+        registrants_count=len(registration.get('registrants', [])),
+        total_amount=registration.get('total_amount', 0),
+        payment_method=registration.get('payment_method', 'unknown'),
+        admin_emails=ADMIN_MANAGER_EMAILS
+    )
+    
+    # Send push notification to admins
+    await outbox.push(
+        'send_notification_to_admins',
+        title="Event Withdrawal",
+        body=f"{user['name']} withdrew from {registration.get('event_name', 'Event')}",
+        url="/admin"
+    )
+    
+    return {
+        "message": "Successfully withdrawn from event",
+        "refund_instructions": "For refund requests, please email: troa.systems@gmail.com, troa.treasurer@gmail.com, troa.secretary@gmail.com, and president.troa@gmail.com"
+    }
 
 
 @events_router.get("/{event_id}/registrations")
@@ -527,16 +475,13 @@ async def get_event_registrations(event_id: str, request: Request):
     """Get all registrations for an event (admin/manager only)"""
     await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        registrations = await db.event_registrations.find(
-            {"event_id": event_id},
-            {"_id": 0}
-        ).to_list(500)
-        
-        return registrations
-    finally:
-        client.close()
+    db = await get_db()
+    registrations = await db.event_registrations.find(
+        {"event_id": event_id},
+        {"_id": 0}
+    ).to_list(500)
+    
+    return registrations
 
 
 # ============ ADMIN APPROVAL ENDPOINTS ============
@@ -546,37 +491,34 @@ async def get_pending_approvals(request: Request):
     """Get all registrations pending admin approval (for offline payments and modifications)"""
     await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        # Get pending initial registrations AND pending modifications
-        pending = await db.event_registrations.find(
-            {
-                "$or": [
-                    # Initial offline registrations pending approval
-                    {
-                        "payment_method": "offline",
-                        "payment_status": "pending_approval",
-                        "status": "registered"
-                    },
-                    # Modifications pending approval
-                    {
-                        "modification_status": "pending_modification_approval",
-                        "status": "registered"
-                    }
-                ]
-            },
-            {"_id": 0}
-        ).sort("created_at", 1).to_list(100)
-        
-        # Enrich with event details
-        for reg in pending:
-            event = await db.events.find_one({"id": reg["event_id"]}, {"_id": 0})
-            if event:
-                reg["event"] = event
-        
-        return pending
-    finally:
-        client.close()
+    db = await get_db()
+    # Get pending initial registrations AND pending modifications
+    pending = await db.event_registrations.find(
+        {
+            "$or": [
+                # Initial offline registrations pending approval
+                {
+                    "payment_method": "offline",
+                    "payment_status": "pending_approval",
+                    "status": "registered"
+                },
+                # Modifications pending approval
+                {
+                    "modification_status": "pending_modification_approval",
+                    "status": "registered"
+                }
+            ]
+        },
+        {"_id": 0}
+    ).sort("created_at", 1).to_list(100)
+    
+    # Enrich with event details
+    for reg in pending:
+        event = await db.events.find_one({"id": reg["event_id"]}, {"_id": 0})
+        if event:
+            reg["event"] = event
+    
+    return pending
 
 
 @events_router.post("/registrations/{registration_id}/approve")
@@ -584,49 +526,46 @@ async def approve_offline_payment(registration_id: str, request: Request, approv
     """Approve an offline payment registration (admin/manager only)"""
     admin = await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "payment_method": "offline",
-            "payment_status": "pending_approval"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="Registration not found or not pending approval")
-        
-        # Create audit log entry
-        audit_entry = {
-            "action": "initial_registration_approved",
-            "timestamp": datetime.utcnow().isoformat(),
-            "by_name": admin.get('name', admin['email']),
-            "by_email": admin['email'],
-            "details": f"Initial registration approved. Total: ₹{registration.get('total_amount', 0)}",
-            "registrants_count": len(registration.get('registrants', []))
-        }
-        
-        await db.event_registrations.update_one(
-            {"id": registration_id},
-            {
-                "$set": {
-                    "payment_status": "completed",
-                    "admin_approved": True,
-                    "approved_by_name": admin.get('name', admin['email']),
-                    "approved_by_email": admin['email'],
-                    "approval_note": approval_note or f"Approved by {admin.get('name', admin['email'])}",
-                    "updated_at": datetime.utcnow()
-                },
-                "$push": {
-                    "audit_log": audit_entry
-                }
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "payment_method": "offline",
+        "payment_status": "pending_approval"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found or not pending approval")
+    
+    # Create audit log entry
+    audit_entry = {
+        "action": "initial_registration_approved",
+        "timestamp": datetime.utcnow().isoformat(),
+        "by_name": admin.get('name', admin['email']),
+        "by_email": admin['email'],
+        "details": f"Initial registration approved. Total: ₹{registration.get('total_amount', 0)}",
+        "registrants_count": len(registration.get('registrants', []))
+    }
+    
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {
+            "$set": {
+                "payment_status": "completed",
+                "admin_approved": True,
+                "approved_by_name": admin.get('name', admin['email']),
+                "approved_by_email": admin['email'],
+                "approval_note": approval_note or f"Approved by {admin.get('name', admin['email'])}",
+                "updated_at": datetime.utcnow()
+            },
+            "$push": {
+                "audit_log": audit_entry
             }
-        )
-        
-        logger.info(f"Offline payment approved: {registration_id} by {admin['email']}")
-        
-        return {"message": "Registration approved successfully"}
-    finally:
-        client.close()
+        }
+    )
+    
+    logger.info(f"Offline payment approved: {registration_id} by {admin['email']}")
+    
+    return {"message": "Registration approved successfully"}
 
 
 @events_router.post("/registrations/{registration_id}/reject")
@@ -634,48 +573,45 @@ async def reject_offline_payment(registration_id: str, request: Request, rejecti
     """Reject an offline payment registration (admin/manager only)"""
     admin = await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "payment_method": "offline",
-            "payment_status": "pending_approval"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="Registration not found or not pending approval")
-        
-        # Create audit log entry
-        audit_entry = {
-            "action": "initial_registration_rejected",
-            "timestamp": datetime.utcnow().isoformat(),
-            "by_name": admin.get('name', admin['email']),
-            "by_email": admin['email'],
-            "details": rejection_reason or "No reason provided",
-            "registrants_count": len(registration.get('registrants', []))
-        }
-        
-        await db.event_registrations.update_one(
-            {"id": registration_id},
-            {
-                "$set": {
-                    "status": "withdrawn",
-                    "rejected_by_name": admin.get('name', admin['email']),
-                    "rejected_by_email": admin['email'],
-                    "approval_note": rejection_reason or f"Rejected by {admin.get('name', admin['email'])}",
-                    "updated_at": datetime.utcnow()
-                },
-                "$push": {
-                    "audit_log": audit_entry
-                }
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "payment_method": "offline",
+        "payment_status": "pending_approval"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found or not pending approval")
+    
+    # Create audit log entry
+    audit_entry = {
+        "action": "initial_registration_rejected",
+        "timestamp": datetime.utcnow().isoformat(),
+        "by_name": admin.get('name', admin['email']),
+        "by_email": admin['email'],
+        "details": rejection_reason or "No reason provided",
+        "registrants_count": len(registration.get('registrants', []))
+    }
+    
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {
+            "$set": {
+                "status": "withdrawn",
+                "rejected_by_name": admin.get('name', admin['email']),
+                "rejected_by_email": admin['email'],
+                "approval_note": rejection_reason or f"Rejected by {admin.get('name', admin['email'])}",
+                "updated_at": datetime.utcnow()
+            },
+            "$push": {
+                "audit_log": audit_entry
             }
-        )
-        
-        logger.info(f"Offline payment rejected: {registration_id} by {admin['email']}")
-        
-        return {"message": "Registration rejected"}
-    finally:
-        client.close()
+        }
+    )
+    
+    logger.info(f"Offline payment rejected: {registration_id} by {admin['email']}")
+    
+    return {"message": "Registration rejected"}
 
 
 # ============ PAYMENT ORDER ENDPOINT (for Razorpay) ============
@@ -696,48 +632,45 @@ async def create_event_payment_order(event_id: str, registration_id: str, reques
     
     razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
     
-    db, client = await get_db()
-    try:
-        # Get registration details
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "user_email": user["email"],
-            "event_id": event_id
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="Registration not found")
-        
-        if registration["payment_status"] == "completed":
-            raise HTTPException(status_code=400, detail="Payment already completed")
-        
-        # Create Razorpay order
-        amount_in_paise = int(registration["total_amount"] * 100)
-        
-        order_data = {
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'receipt': f'event_{uuid_lib.uuid4().hex[:10]}',
-            'notes': {
-                'registration_id': registration_id,
-                'event_id': event_id,
-                'user_email': user["email"],
-                'event_name': registration["event_name"]
-            }
-        }
-        
-        order = razorpay_client.order.create(data=order_data)
-        
-        return {
-            'order_id': order['id'],
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'key_id': RAZORPAY_KEY_ID,
-            'registration_id': registration_id
+    db = await get_db()
+    # Get registration details
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "user_email": user["email"],
+        "event_id": event_id
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found")
+    
+    if registration["payment_status"] == "completed":
+        raise HTTPException(status_code=400, detail="Payment already completed")
+    
+    # Create Razorpay order
+    amount_in_paise = int(registration["total_amount"] * 100)
+    
+    order_data = {
+        'amount': amount_in_paise,
+        'currency': 'INR',
+        'receipt': f'event_{uuid_lib.uuid4().hex[:10]}',
+        'notes': {
+            'registration_id': registration_id,
+            'event_id': event_id,
+            'user_email': user["email"],
+            'event_name': registration["event_name"]
         }
-        
-    finally:
-        client.close()
+    }
+    
+    order = razorpay_client.order.create(data=order_data)
+    
+    return {
+        'order_id': order['id'],
+        'amount': amount_in_paise,
+        'currency': 'INR',
+        'key_id': RAZORPAY_KEY_ID,
+        'registration_id': registration_id
+    }
+    
 
 
 # ============ USER REGISTRATION STATUS & MODIFICATION ============
@@ -747,19 +680,16 @@ async def get_my_registration_status(request: Request):
     """Get user's registration status for all events (to show 'already registered' on events page)"""
     user = await require_auth(request)
     
-    db, client = await get_db()
-    try:
-        # Get all active registrations for the user
-        registrations = await db.event_registrations.find(
-            {"user_email": user["email"], "status": "registered"},
-            {"_id": 0, "event_id": 1, "id": 1}
-        ).to_list(100)
-        
-        # Return a dict mapping event_id to registration_id
-        status = {reg["event_id"]: reg["id"] for reg in registrations}
-        return status
-    finally:
-        client.close()
+    db = await get_db()
+    # Get all active registrations for the user
+    registrations = await db.event_registrations.find(
+        {"user_email": user["email"], "status": "registered"},
+        {"_id": 0, "event_id": 1, "id": 1}
+    ).to_list(100)
+    
+    # Return a dict mapping event_id to registration_id
+    status = {reg["event_id"]: reg["id"] for reg in registrations}
+    return status
 
 
 @events_router.patch("/registrations/{registration_id}/modify")
@@ -767,223 +697,137 @@ async def modify_registration(registration_id: str, request: Request):
     """Modify an existing registration (add/remove registrants)"""
     user = await require_auth(request)
     
-    db, client = await get_db()
-    try:
-        # Get current registration
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "user_email": user["email"],
-            "status": "registered"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="Registration not found")
-        
-        # Get event details
-        event = await db.events.find_one({"id": registration["event_id"]}, {"_id": 0})
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Check if event is in the past
-        today = datetime.now().strftime('%Y-%m-%d')
-        if event["event_date"] < today:
-            raise HTTPException(status_code=400, detail="Cannot modify registrations for past events")
-        
-        # Parse request body
-        body = await request.json()
-        new_registrants = body.get("registrants", [])
-        payment_method = body.get("payment_method", "online")
-        
-        if len(new_registrants) == 0:
-            raise HTTPException(status_code=400, detail="At least one registrant is required")
-        
-        # Calculate new total and difference based on pricing type
-        old_registrants = registration.get("registrants", [])
-        old_total = registration.get("total_amount", 0)
-        old_count = len(old_registrants)
-        new_count = len(new_registrants)
-        
-        if event["payment_type"] == "per_villa":
-            # Per villa - no additional payment needed
-            new_total = event["amount"]
-            difference = 0
-        elif event.get("per_person_type") == "adult_child":
-            # Adult/child pricing
-            adult_price = event.get("adult_price", 0) or 0
-            child_price = event.get("child_price", 0) or 0
-            
-            new_adult_count = sum(1 for r in new_registrants if r.get("registrant_type", "adult") == "adult")
-            new_child_count = sum(1 for r in new_registrants if r.get("registrant_type") == "child")
-            new_total = (new_adult_count * adult_price) + (new_child_count * child_price)
-            difference = new_total - old_total
+    db = await get_db()
+    # Get current registration
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "user_email": user["email"],
+        "status": "registered"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found")
+    
+    # Get event details
+    event = await db.events.find_one({"id": registration["event_id"]}, {"_id": 0})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Check if event is in the past
+    today = datetime.now().strftime('%Y-%m-%d')
+    if event["event_date"] < today:
+        raise HTTPException(status_code=400, detail="Cannot modify registrations for past events")
+    
+    # Parse request body
+    body = await request.json()
+    new_registrants = body.get("registrants", [])
+    payment_method = body.get("payment_method", "online")
+    
+    if len(new_registrants) == 0:
+        raise HTTPException(status_code=400, detail="At least one registrant is required")
+    
+    # Calculate new total and difference based on pricing type
+    old_registrants = registration.get("registrants", [])
+    old_total = registration.get("total_amount", 0)
+    old_count = len(old_registrants)
+    new_count = len(new_registrants)
+    
+    if event["payment_type"] == "per_villa":
+        # Per villa - no additional payment needed
+        new_total = event["amount"]
+        difference = 0
+    elif event.get("per_person_type") == "adult_child":
+        # Adult/child pricing
+        adult_price = event.get("adult_price", 0) or 0
+        child_price = event.get("child_price", 0) or 0
+        
+        new_adult_count = sum(1 for r in new_registrants if r.get("registrant_type", "adult") == "adult")
+        new_child_count = sum(1 for r in new_registrants if r.get("registrant_type") == "child")
+        new_total = (new_adult_count * adult_price) + (new_child_count * child_price)
+        difference = new_total - old_total
+    else:
+        # Uniform per_person pricing
+        new_total = event["amount"] * new_count
+        difference = new_total - old_total
+    
+    # If adding people (positive difference), handle payment
+    if difference > 0:
+        # Determine payment status for the modification
+        if payment_method == "offline":
+            modification_status = "pending_modification_approval"
         else:
-            # Uniform per_person pricing
-            new_total = event["amount"] * new_count
-            difference = new_total - old_total
+            modification_status = "pending_modification_payment"
         
-        # If adding people (positive difference), handle payment
-        if difference > 0:
-            # Determine payment status for the modification
-            if payment_method == "offline":
-                modification_status = "pending_modification_approval"
-            else:
-                modification_status = "pending_modification_payment"
-            
-            # Store pending modification with audit log entry
-            audit_entry = {
-                "action": "modification_requested",
-                "timestamp": datetime.utcnow().isoformat(),
-                "by_name": user.get('name', user['email']),
-                "by_email": user['email'],
-                "details": f"Requested modification. Old: {old_count}, New: {new_count}. Additional amount: ₹{difference}",
-                "old_count": old_count,
-                "new_count": new_count,
-                "additional_amount": difference,
-                "payment_method": payment_method
-            }
-            
-            await db.event_registrations.update_one(
-                {"id": registration_id},
-                {
-                    "$set": {
-                        "pending_registrants": new_registrants,
-                        "pending_total": new_total,
-                        "additional_amount": difference,
-                        "modification_payment_method": payment_method,
-                        "modification_status": modification_status,
-                        "updated_at": datetime.utcnow()
-                    },
-                    "$push": {
-                        "audit_log": audit_entry
-                    }
-                }
-            )
-            
-            # Send modification notification to admins
-            try:
-                admin_emails = await get_admin_manager_emails()
-                await email_service.send_event_notification_to_admins(
-                    action='modified',
-                    user_name=user['name'],
-                    user_email=user['email'],
-                    event_name=registration.get('event_name', event.get('name', 'Event')),
-                    event_date=event.get('event_date', 'TBD'),
-                    registrants_count=new_count,
-                    total_amount=new_total,
-                    payment_method=payment_method,
-                    admin_emails=admin_emails
-                )
-            except Exception as email_error:
-                logger.error(f"Failed to send modification notification: {email_error}")
-            
-            return {
-                "message": "Modification pending payment",
-                "additional_amount": difference,
-                "payment_method": payment_method,
-                "registration_id": registration_id,
-                "requires_payment": True
-            }
-        else:
-            # Removing people or same count - update directly with audit log
-            audit_entry = {
-                "action": "modification_completed",
-                "timestamp": datetime.utcnow().isoformat(),
-                "by_name": user.get('name', user['email']),
-                "by_email": user['email'],
-                "details": f"Reduced registrants from {old_count} to {new_count}. Refund amount: Rs{abs(difference)}" if difference < 0 else "Updated registrant details (no count change)",
-                "old_count": old_count,
-                "new_count": new_count,
-                "refund_amount": abs(difference) if difference < 0 else 0
-            }
-            
-            await db.event_registrations.update_one(
-                {"id": registration_id},
-                {
-                    "$set": {
-                        "registrants": new_registrants,
-                        "total_amount": new_total,
-                        "updated_at": datetime.utcnow()
-                    },
-                    "$unset": {
-                        "pending_registrants": "",
-                        "pending_total": "",
-                        "additional_amount": "",
-                        "modification_payment_method": "",
-                        "modification_status": ""
-                    },
-                    "$push": {
-                        "audit_log": audit_entry
-                    }
+        # Store pending modification with audit log entry
+        audit_entry = {
+            "action": "modification_requested",
+            "timestamp": datetime.utcnow().isoformat(),
+            "by_name": user.get('name', user['email']),
+            "by_email": user['email'],
+            "details": f"Requested modification. Old: {old_count}, New: {new_count}. Additional amount: ₹{difference}",
+            "old_count": old_count,
+            "new_count": new_count,
+            "additional_amount": difference,
+            "payment_method": payment_method
+        }
+        
+        await db.event_registrations.update_one(
+            {"id": registration_id},
+            {
+                "$set": {
+                    "pending_registrants": new_registrants,
+                    "pending_total": new_total,
+                    "additional_amount": difference,
+                    "modification_payment_method": payment_method,
+                    "modification_status": modification_status,
+                    "updated_at": datetime.utcnow()
+                },
+                "$push": {
+                    "audit_log": audit_entry
                 }
-            )
-            
-            # Send modification notification to admins
-            try:
-                admin_emails = await get_admin_manager_emails()
-                await email_service.send_event_notification_to_admins(
-                    action='modified',
-                    user_name=user['name'],
-                    user_email=user['email'],
-                    event_name=registration.get('event_name', event.get('name', 'Event')),
-                    event_date=event.get('event_date', 'TBD'),
-                    registrants_count=new_count,
-                    total_amount=new_total,
-                    payment_method=registration.get('payment_method', 'unknown'),
-                    admin_emails=admin_emails
-                )
-            except Exception as email_error:
-                logger.error(f"Failed to send modification notification: {email_error}")
-            
-            return {
-                "message": "Registration updated successfully",
-                "requires_payment": False
             }
-    finally:
-        client.close()
-
-
-@events_router.post("/registrations/{registration_id}/complete-modification-payment")
-async def complete_modification_payment(registration_id: str, payment_id: str, request: Request):
-    """Complete payment for registration modification (online Razorpay)"""
-    user = await require_auth(request)
-    
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "user_email": user["email"],
-            "modification_status": "pending_modification_payment"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="No pending modification found")
+        )
         
-        # Create audit log entry
-        old_count = len(registration.get("registrants", []))
-        new_count = len(registration.get("pending_registrants", []))
-        additional_amount = registration.get("additional_amount", 0)
+        # Send modification notification to admins
+        await outbox.email(
+            'send_event_notification_to_admins',
+            action='modified',
+            user_name=user['name'],
+            user_email=user['email'],
+            event_name=registration.get('event_name', event.get('name', 'Event')),
+            event_date=event.get('event_date', 'TBD'),
+            registrants_count=new_count,
+            total_amount=new_total,
+            payment_method=payment_method,
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
         
+        return {
+            "message": "Modification pending payment",
+            "additional_amount": difference,
+            "payment_method": payment_method,
+            "registration_id": registration_id,
+            "requires_payment": True
+        }
+    else:
+        # Removing people or same count - update directly with audit log
         audit_entry = {
-            "action": "modification_payment_completed",
+            "action": "modification_completed",
             "timestamp": datetime.utcnow().isoformat(),
             "by_name": user.get('name', user['email']),
             "by_email": user['email'],
-            "details": f"Online payment completed. Added {new_count - old_count} person(s). Payment: ₹{additional_amount}",
+            "details": f"Reduced registrants from {old_count} to {new_count}. Refund amount: Rs{abs(difference)}" if difference < 0 else "Updated registrant details (no count change)",
             "old_count": old_count,
             "new_count": new_count,
-            "payment_amount": additional_amount,
-            "payment_id": payment_id,
-            "payment_method": "online"
+            "refund_amount": abs(difference) if difference < 0 else 0
         }
         
-        # Apply the pending modification
         await db.event_registrations.update_one(
             {"id": registration_id},
             {
                 "$set": {
-                    "registrants": registration["pending_registrants"],
-                    "total_amount": registration["pending_total"],
-                    "modification_payment_id": payment_id,
+                    "registrants": new_registrants,
+                    "total_amount": new_total,
                     "updated_at": datetime.utcnow()
                 },
                 "$unset": {
@@ -999,9 +843,83 @@ async def complete_modification_payment(registration_id: str, payment_id: str, r
             }
         )
         
-        return {"message": "Modification payment completed successfully"}
-    finally:
-        client.close()
+        # Send modification notification to admins
+        await outbox.email(
+            'send_event_notification_to_admins',
+            action='modified',
+            user_name=user['name'],
+            user_email=user['email'],
+            event_name=registration.get('event_name', event.get('name', 'Event')),
+            event_date=event.get('event_date', 'TBD'),
+            registrants_count=new_count,
+            total_amount=new_total,
+            payment_method=registration.get('payment_method', 'unknown'),
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
+        
+        return {
+            "message": "Registration updated successfully",
+            "requires_payment": False
+        }
+
+
+@events_router.post("/registrations/{registration_id}/complete-modification-payment")
+async def complete_modification_payment(registration_id: str, payment_id: str, request: Request):
+    """Complete payment for registration modification (online Razorpay)"""
+    user = await require_auth(request)
+    
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "user_email": user["email"],
+        "modification_status": "pending_modification_payment"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="No pending modification found")
+    
+    # Create audit log entry
+    old_count = len(registration.get("registrants", []))
+    new_count = len(registration.get("pending_registrants", []))
+    additional_amount = registration.get("additional_amount", 0)
+    
+    audit_entry = {
+        "action": "modification_payment_completed",
+        "timestamp": datetime.utcnow().isoformat(),
+        "by_name": user.get('name', user['email']),
+        "by_email": user['email'],
+        "details": f"Online payment completed. Added {new_count - old_count} person(s). Payment: ₹{additional_amount}",
+        "old_count": old_count,
+        "new_count": new_count,
+        "payment_amount": additional_amount,
+        "payment_id": payment_id,
+        "payment_method": "online"
+    }
+    
+    # Apply the pending modification
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {
+            "$set": {
+                "registrants": registration["pending_registrants"],
+                "total_amount": registration["pending_total"],
+                "modification_payment_id": payment_id,
+                "updated_at": datetime.utcnow()
+            },
+            "$unset": {
+                "pending_registrants": "",
+                "pending_total": "",
+                "additional_amount": "",
+                "modification_payment_method": "",
+                "modification_status": ""
+            },
+            "$push": {
+                "audit_log": audit_entry
+            }
+        }
+    )
+    
+    return {"message": "Modification payment completed successfully"}
 
 
 @events_router.post("/registrations/{registration_id}/create-modification-order")
@@ -1020,41 +938,38 @@ async def create_modification_payment_order(registration_id: str, request: Reque
     
     razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "user_email": user["email"],
-            "modification_status": "pending_modification_payment"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="No pending modification found")
-        
-        amount_in_paise = int(registration["additional_amount"] * 100)
-        
-        order_data = {
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'receipt': f'mod_{uuid_lib.uuid4().hex[:10]}',
-            'notes': {
-                'registration_id': registration_id,
-                'type': 'modification',
-                'user_email': user["email"]
-            }
-        }
-        
-        order = razorpay_client.order.create(data=order_data)
-        
-        return {
-            'order_id': order['id'],
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'key_id': RAZORPAY_KEY_ID,
-            'registration_id': registration_id
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "user_email": user["email"],
+        "modification_status": "pending_modification_payment"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="No pending modification found")
+    
+    amount_in_paise = int(registration["additional_amount"] * 100)
+    
+    order_data = {
+        'amount': amount_in_paise,
+        'currency': 'INR',
+        'receipt': f'mod_{uuid_lib.uuid4().hex[:10]}',
+        'notes': {
+            'registration_id': registration_id,
+            'type': 'modification',
+            'user_email': user["email"]
         }
-    finally:
-        client.close()
+    }
+    
+    order = razorpay_client.order.create(data=order_data)
+    
+    return {
+        'order_id': order['id'],
+        'amount': amount_in_paise,
+        'currency': 'INR',
+        'key_id': RAZORPAY_KEY_ID,
+        'registration_id': registration_id
+    }
 
 
 @events_router.post("/registrations/{registration_id}/approve-modification")
@@ -1062,62 +977,59 @@ async def approve_modification(registration_id: str, request: Request):
     """Approve offline payment for registration modification (admin/manager only)"""
     admin = await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "modification_status": "pending_modification_approval"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="No pending modification found")
-        
-        # Create audit log entry
-        old_count = len(registration.get("registrants", []))
-        new_count = len(registration.get("pending_registrants", []))
-        additional_amount = registration.get("additional_amount", 0)
-        
-        audit_entry = {
-            "action": "modification_approved",
-            "timestamp": datetime.utcnow().isoformat(),
-            "by_name": admin.get('name', admin['email']),
-            "by_email": admin['email'],
-            "details": f"Offline payment approved. Added {new_count - old_count} person(s). Amount: ₹{additional_amount}",
-            "old_count": old_count,
-            "new_count": new_count,
-            "payment_amount": additional_amount,
-            "payment_method": "offline"
-        }
-        
-        # Apply the pending modification
-        await db.event_registrations.update_one(
-            {"id": registration_id},
-            {
-                "$set": {
-                    "registrants": registration["pending_registrants"],
-                    "total_amount": registration["pending_total"],
-                    "approved_by_name": admin.get('name', admin['email']),
-                    "approved_by_email": admin['email'],
-                    "approval_note": f"Modification approved by {admin.get('name', admin['email'])}",
-                    "updated_at": datetime.utcnow()
-                },
-                "$unset": {
-                    "pending_registrants": "",
-                    "pending_total": "",
-                    "additional_amount": "",
-                    "modification_payment_method": "",
-                    "modification_status": ""
-                },
-                "$push": {
-                    "audit_log": audit_entry
-                }
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "modification_status": "pending_modification_approval"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="No pending modification found")
+    
+    # Create audit log entry
+    old_count = len(registration.get("registrants", []))
+    new_count = len(registration.get("pending_registrants", []))
+    additional_amount = registration.get("additional_amount", 0)
+    
+    audit_entry = {
+        "action": "modification_approved",
+        "timestamp": datetime.utcnow().isoformat(),
+        "by_name": admin.get('name', admin['email']),
+        "by_email": admin['email'],
+        "details": f"Offline payment approved. Added {new_count - old_count} person(s). Amount: ₹{additional_amount}",
+        "old_count": old_count,
+        "new_count": new_count,
+        "payment_amount": additional_amount,
+        "payment_method": "offline"
+    }
+    
+    # Apply the pending modification
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {
+            "$set": {
+                "registrants": registration["pending_registrants"],
+                "total_amount": registration["pending_total"],
+                "approved_by_name": admin.get('name', admin['email']),
+                "approved_by_email": admin['email'],
+                "approval_note": f"Modification approved by {admin.get('name', admin['email'])}",
+                "updated_at": datetime.utcnow()
+            },
+            "$unset": {
+                "pending_registrants": "",
+                "pending_total": "",
+                "additional_amount": "",
+                "modification_payment_method": "",
+                "modification_status": ""
+            },
+            "$push": {
+                "audit_log": audit_entry
             }
-        )
-        
-        logger.info(f"Modification approved: {registration_id} by {admin['email']}")
-        return {"message": "Modification approved successfully"}
-    finally:
-        client.close()
+        }
+    )
+    
+    logger.info(f"Modification approved: {registration_id} by {admin['email']}")
+    return {"message": "Modification approved successfully"}
 
 
 @events_router.post("/registrations/{registration_id}/reject-modification")
@@ -1125,54 +1037,51 @@ async def reject_modification(registration_id: str, request: Request, rejection_
     """Reject offline payment for registration modification (admin/manager only)"""
     admin = await require_manager_or_admin(request)
     
-    db, client = await get_db()
-    try:
-        registration = await db.event_registrations.find_one({
-            "id": registration_id,
-            "modification_status": "pending_modification_approval"
-        })
-        
-        if not registration:
-            raise HTTPException(status_code=404, detail="No pending modification found")
-        
-        # Create audit log entry
-        old_count = len(registration.get("registrants", []))
-        new_count = len(registration.get("pending_registrants", []))
-        additional_amount = registration.get("additional_amount", 0)
-        
-        audit_entry = {
-            "action": "modification_rejected",
-            "timestamp": datetime.utcnow().isoformat(),
-            "by_name": admin.get('name', admin['email']),
-            "by_email": admin['email'],
-            "details": rejection_reason or f"Modification rejected. Attempted to add {new_count - old_count} person(s). Amount: ₹{additional_amount}",
-            "old_count": old_count,
-            "new_count": new_count,
-            "rejected_amount": additional_amount
-        }
-        
-        # Clear the pending modification without applying it
-        await db.event_registrations.update_one(
-            {"id": registration_id},
-            {
-                "$set": {
-                    "updated_at": datetime.utcnow()
-                },
-                "$unset": {
-                    "pending_registrants": "",
-                    "pending_total": "",
-                    "additional_amount": "",
-                    "modification_payment_method": "",
-                    "modification_status": ""
-                },
-                "$push": {
-                    "audit_log": audit_entry
-                }
+    db = await get_db()
+    registration = await db.event_registrations.find_one({
+        "id": registration_id,
+        "modification_status": "pending_modification_approval"
+    })
+    
+    if not registration:
+        raise HTTPException(status_code=404, detail="No pending modification found")
+    
+    # Create audit log entry
+    old_count = len(registration.get("registrants", []))
+    new_count = len(registration.get("pending_registrants", []))
+    additional_amount = registration.get("additional_amount", 0)
+    
+    audit_entry = {
+        "action": "modification_rejected",
+        "timestamp": datetime.utcnow().isoformat(),
+        "by_name": admin.get('name', admin['email']),
+        "by_email": admin['email'],
+        "details": rejection_reason or f"Modification rejected. Attempted to add {new_count - old_count} person(s). Amount: ₹{additional_amount}",
+        "old_count": old_count,
+        "new_count": new_count,
+        "rejected_amount": additional_amount
+    }
+    
+    # Clear the pending modification without applying it
+    await db.event_registrations.update_one(
+        {"id": registration_id},
+        {
+            "$set": {
+                "updated_at": datetime.utcnow()
+            },
+            "$unset": {
+                "pending_registrants": "",
+                "pending_total": "",
+                "additional_amount": "",
+                "modification_payment_method": "",
+                "modification_status": ""
+            },
+            "$push": {
+                "audit_log": audit_entry
             }
-        )
-        
-        logger.info(f"Modification rejected: {registration_id} by {admin['email']}")
-        return {"message": "Modification rejected successfully"}
-    finally:
-        client.close()
+        }
+    )
+    
+    logger.info(f"Modification rejected: {registration_id} by {admin['email']}")
+    return {"message": "Modification rejected successfully"}
 
@@ -0,0 +1,209 @@
+"""
+Streaming responses for files stored in GridFS.
+
+Files are sent in GRIDFS_STREAM_CHUNK_SIZE pieces (default one GridFS chunk,
+255KB) read straight from the bucket, so serving a large file holds a single
+chunk in memory instead of the whole file. Conditional and range requests
+are supported:
+
+- If-None-Match matching the ETag returns 304 without touching the bucket
+- Range: bytes=start-end / start- / -suffix returns 206 with just those
+  bytes (a single range; multi-range requests get the whole file)
+- If-Range with a stale ETag ignores Range and sends the whole file
+- an unsatisfiable range returns 416
+
+Small, frequently requested files can be kept in a HotObjectCache: a
+byte-bounded LRU keyed by (filename, ETag). A hit is served from memory
+without reading any GridFS chunks, and since the key includes the ETag a
+changed file can never be served stale from it.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+STREAM_CHUNK_SIZE = int(os.getenv('GRIDFS_STREAM_CHUNK_SIZE', str(255 * 1024)))
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match / If-Range header value names this ETag"""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single byte range, or None to send the whole file"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_text, _, end_text = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else length - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(length - suffix, 0), length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, min(end, length - 1)
+
+
+class HotObjectCache:
+    """Byte-bounded LRU of small files, keyed by (filename, etag)"""
+
+    def __init__(self, max_bytes: int, max_object_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, length: int) -> bool:
+        return 0 < length <= self.max_object_bytes and self.max_bytes > 0
+
+    def get(self, filename: str, etag: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get((filename, etag))
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((filename, etag))
+            self.hits += 1
+            return data
+
+    def put(self, filename: str, etag: str, data: bytes):
+        if not self.cacheable(len(data)):
+            return
+        with self._lock:
+            if (filename, etag) in self._entries:
+                return
+            self._entries[(filename, etag)] = data
+            self.resident_bytes += len(data)
+            while self.resident_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.resident_bytes -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, filename: str):
+        """Drop every cached version of a file"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == filename]:
+                self.resident_bytes -= len(self._entries.pop(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "max_object_bytes": self.max_object_bytes,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+async def iter_gridfs(bucket, file_id, start: int, end: int):
+    """Yield bytes start..end (inclusive) of a GridFS file, one chunk at a time"""
+    grid_out = await bucket.open_download_stream(file_id)
+    try:
+        if start:
+            grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        grid_out.close()
+
+
+def content_disposition(filename: str, disposition: str = "inline") -> str:
+    """Content-Disposition value that survives non-ASCII filenames"""
+    fallback = filename.encode('ascii', 'ignore').decode().replace('"', '') or 'file'
+    return f'{disposition}; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+
+async def gridfs_response(bucket, file_id, length: int, content_type: str, etag: str,
+                          request: Request, cache_control: str, filename: Optional[str] = None,
+                          extra_headers: Optional[dict] = None,
+                          cache: Optional[HotObjectCache] = None, cache_key: Optional[str] = None) -> Response:
+    """
+    304, 206 or 200 response for a GridFS file: streamed from the bucket,
+    or from memory when a cache is given and the file is small enough to
+    be kept in it (cache_key names the file there).
+    """
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename)
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if length and (not if_range or etag_matches(if_range, etag)):
+        byte_range = parse_range(request.headers.get("range"), length)
+
+    content = None
+    if cache is not None and cache.cacheable(length):
+        content = cache.get(cache_key, etag)
+        if content is None:
+            content = b"".join([chunk async for chunk in iter_gridfs(bucket, file_id, 0, length - 1)])
+            cache.put(cache_key, etag, content)
+
+    if byte_range is None:
+        if content is not None:
+            return Response(content=content, media_type=content_type, headers=headers)
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            iter_gridfs(bucket, file_id, 0, length - 1),
+            media_type=content_type,
+            headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    if content is not None:
+        return Response(content=content[start:end + 1], status_code=206, media_type=content_type, headers=headers)
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_gridfs(bucket, file_id, start, end),
+        status_code=206,
+        media_type=content_type,
+        headers=headers
+    )
@@ -2,19 +2,29 @@
 GridFS-based image storage for production environments.
 Images are stored in MongoDB GridFS for persistence across pod restarts.
 Browser caching is enabled via Cache-Control and ETag headers.
+Resized variants are generated in the background after each upload (see
+image_variants.py); images uploaded before that, or whose variants failed,
+can be given variants by running this module:
+
+Usage:
+    python gridfs_upload.py
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request
-from fastapi.responses import Response
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Query
+from starlette.concurrency import run_in_threadpool
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from PIL import Image
-import hashlib
 import uuid
-import io
+import asyncio
 import os
 import logging
 from datetime import datetime, timezone
 from auth import require_admin, require_manager_or_admin
+from database import mongo, get_database
+from gridfs_streaming import HotObjectCache, gridfs_response
+from upload_pipeline import ingest_to_gridfs, limit_request_body, MULTIPART_OVERHEAD
+from image_variants import build_variants, delete_variants, select_variant, image_pool
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -35,15 +45,23 @@ CONTENT_TYPES = {
 # Cache duration: 30 days in seconds
 CACHE_MAX_AGE = 30 * 24 * 60 * 60
 
+# Largest image accepted by upload_image
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+limit_request_body(r"^/api/upload/image$", MAX_IMAGE_SIZE + MULTIPART_OVERHEAD)
+
+# Small images (thumbnails, banner variants) served from memory per worker
+image_cache = HotObjectCache(
+    max_bytes=int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    max_object_bytes=int(os.getenv('IMAGE_CACHE_MAX_OBJECT_BYTES', str(512 * 1024)))
+)
+
 
 async def get_gridfs_bucket():
-    """Get GridFS bucket from MongoDB"""
-    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.environ.get('DB_NAME', 'troa_db')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
+    """Get GridFS bucket from the shared MongoDB client"""
+    db = get_database()
     bucket = AsyncIOMotorGridFSBucket(db, bucket_name="images")
-    return bucket, client, db
+    return bucket, db
 
 
 def is_allowed_file(filename: str) -> bool:
@@ -57,6 +75,50 @@ def get_file_extension(filename: str) -> str:
     return os.path.splitext(filename)[1].lower()
 
 
+def verify_image(file) -> bool:
+    """Check an uploaded file is a readable image, reading it from its spool file"""
+    try:
+        with Image.open(file) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+    finally:
+        file.seek(0)
+
+
+# Running variant renders, referenced so they are not garbage collected
+image_variant_tasks = set()
+
+
+async def build_image_variants(file_id, filename: str):
+    """Render resized variants of a stored image and record them in its metadata"""
+    try:
+        bucket, db = await get_gridfs_bucket()
+        download_stream = await bucket.open_download_stream(file_id)
+        variants = await build_variants(bucket, filename, await download_stream.read())
+        if not variants:
+            return
+        result = await db["images.files"].update_one(
+            {"_id": file_id},
+            {"$set": {"metadata.variants": variants}}
+        )
+        if result.matched_count == 0:
+            # Image deleted while the variants were rendering
+            await delete_variants(bucket, variants)
+    except Exception as e:
+        logger.error(f"Failed to build variants for image {filename}: {e}")
+
+
+def schedule_image_variants(file_id, filename: str):
+    """Build an uploaded image's variants in the background (in the image
+    process pool); until they exist the original is served for every width
+    and backfill_image_variants picks up any that failed"""
+    task = asyncio.create_task(build_image_variants(file_id, filename))
+    image_variant_tasks.add(task)
+    task.add_done_callback(image_variant_tasks.discard)
+
+
 @gridfs_router.post("/image")
 async def upload_image(request: Request, file: UploadFile = File(...)):
     """Upload an image file to GridFS - managers and admins"""
@@ -74,38 +136,39 @@ async def upload_image(request: Request, file: UploadFile = File(...)):
                 detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # Read file content
-        content = await file.read()
+        if file.size is not None and file.size > MAX_IMAGE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image exceeds maximum size of {MAX_IMAGE_SIZE // (1024 * 1024)}MB"
+            )
         
-        # Validate it's a valid image
-        try:
-            img = Image.open(io.BytesIO(content))
-            img.verify()
-        except Exception:
+        # Validate it's a valid image (Pillow reads the spooled upload,
+        # not a copy of it in memory)
+        if not await run_in_threadpool(verify_image, file.file):
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        # Generate unique filename and ETag
+        # Generate unique filename
         file_ext = get_file_extension(file.filename)
         unique_filename = f"{uuid.uuid4()}{file_ext}"
-        etag = hashlib.md5(content).hexdigest()
         
         # Get GridFS bucket
-        bucket, client, db = await get_gridfs_bucket()
+        bucket, db = await get_gridfs_bucket()
         
-        # Store file in GridFS with metadata
-        file_id = await bucket.upload_from_stream(
-            unique_filename,
-            io.BytesIO(content),
+        # Stream file into GridFS; the ETag (MD5) and size are added to the
+        # metadata as it is written
+        stored = await ingest_to_gridfs(
+            file, bucket, unique_filename, MAX_IMAGE_SIZE,
             metadata={
                 "content_type": CONTENT_TYPES.get(file_ext, "application/octet-stream"),
                 "original_filename": file.filename,
-                "etag": etag,
-                "uploaded_at": datetime.now(timezone.utc).isoformat(),
-                "size": len(content)
+                "uploaded_at": datetime.now(timezone.utc).isoformat()
             }
         )
+        file_id = stored.file_id
         
-        client.close()
+        # Resized WebP/JPEG variants for ?w= requests are rendered after the
+        # response, from the stored file
+        schedule_image_variants(file_id, unique_filename)
         
         image_url = f"{backend_url}/api/upload/image/{unique_filename}"
         
@@ -125,59 +188,60 @@ async def upload_image(request: Request, file: UploadFile = File(...)):
 
 
 @gridfs_router.get("/image/{filename}")
-async def get_image(filename: str, request: Request):
+async def get_image(filename: str, request: Request, w: Optional[int] = Query(None, gt=0)):
     """
     Serve image from GridFS with browser caching support.
     
+    With ?w=<pixels> the smallest stored variant at least that wide is
+    served instead (WebP when the browser accepts it), falling back to
+    the original.
+    
     Caching Strategy:
     - Cache-Control: max-age=2592000 (30 days)
     - ETag: MD5 hash of file content
     - Returns 304 Not Modified if client has cached version
+    - Range requests get 206 with just the requested bytes
+    - Images up to IMAGE_CACHE_MAX_OBJECT_BYTES are kept in image_cache
+      (keyed by filename and ETag); larger ones are streamed from GridFS
+      chunk by chunk
     """
     try:
-        bucket, client, db = await get_gridfs_bucket()
+        bucket, db = await get_gridfs_bucket()
         
         # Find the file by filename in the files collection
         file_doc = await db["images.files"].find_one({"filename": filename})
         
         if not file_doc:
-            client.close()
             raise HTTPException(status_code=404, detail="Image not found")
         
         file_id = file_doc["_id"]
         metadata = file_doc.get("metadata", {})
+        length = file_doc.get("length", 0)
         
         # Get ETag from metadata
         etag = metadata.get("etag", str(file_id))
         content_type = metadata.get("content_type", "application/octet-stream")
         
-        # Check if client has cached version (If-None-Match header)
-        client_etag = request.headers.get("if-none-match")
-        if client_etag and client_etag.strip('"') == etag:
-            client.close()
-            return Response(
-                status_code=304,
-                headers={
-                    "ETag": f'"{etag}"',
-                    "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"
-                }
-            )
-        
-        # Download file content
-        download_stream = await bucket.open_download_stream(file_id)
-        content = await download_stream.read()
-        
-        client.close()
-        
-        # Return image with caching headers
-        return Response(
-            content=content,
-            media_type=content_type,
-            headers={
-                "Cache-Control": f"public, max-age={CACHE_MAX_AGE}",
-                "ETag": f'"{etag}"',
-                "Content-Length": str(len(content))
-            }
+        variant = select_variant(metadata.get("variants"), w, request.headers.get("accept"))
+        if variant:
+            filename = variant["filename"]
+            file_id = variant["file_id"]
+            length = variant["size"]
+            etag = variant["etag"]
+            content_type = variant["content_type"]
+        
+        return await gridfs_response(
+            bucket,
+            file_id,
+            length,
+            content_type,
+            etag,
+            request,
+            f"public, max-age={CACHE_MAX_AGE}",
+            # The variant served depends on Accept when a width is requested
+            extra_headers={"Vary": "Accept"} if w else None,
+            cache=image_cache,
+            cache_key=filename
         )
         
     except HTTPException:
@@ -193,21 +257,22 @@ async def delete_image(filename: str, request: Request):
     try:
         await require_admin(request)
         
-        bucket, client, db = await get_gridfs_bucket()
+        bucket, db = await get_gridfs_bucket()
         
         # Find the file by filename
         file_doc = await db["images.files"].find_one({"filename": filename})
         
         if not file_doc:
-            client.close()
             raise HTTPException(status_code=404, detail="Image not found")
         
         file_id = file_doc["_id"]
         
-        # Delete the file
+        # Delete the file and its resized variants
+        variants = file_doc.get("metadata", {}).get("variants") or []
+        await delete_variants(bucket, variants)
         await bucket.delete(file_id)
-        
-        client.close()
+        for name in [filename] + [variant["filename"] for variant in variants]:
+            image_cache.discard(name)
         
         logger.info(f"Image deleted from GridFS: {filename}")
         
@@ -226,7 +291,7 @@ async def get_storage_stats(request: Request):
     try:
         await require_admin(request)
         
-        bucket, client, db = await get_gridfs_bucket()
+        bucket, db = await get_gridfs_bucket()
         
         # Count files and total size using collection
         files = await db["images.files"].find({}).to_list(length=1000)
@@ -234,12 +299,11 @@ async def get_storage_stats(request: Request):
         total_files = len(files)
         total_size = sum(f.get("length", 0) for f in files)
         
-        client.close()
-        
         return {
             "total_files": total_files,
             "total_size_bytes": total_size,
-            "total_size_mb": round(total_size / (1024 * 1024), 2)
+            "total_size_mb": round(total_size / (1024 * 1024), 2),
+            "hot_cache": image_cache.stats()
         }
         
     except HTTPException:
@@ -247,3 +311,38 @@ async def get_storage_stats(request: Request):
     except Exception as e:
         logger.error(f"Error getting storage stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get storage stats")
+
+
+async def backfill_image_variants() -> int:
+    """Build variants for every original image that has none yet"""
+    bucket, db = await get_gridfs_bucket()
+    processed = 0
+    cursor = db["images.files"].find({
+        "metadata.variant_of": {"$exists": False},
+        "metadata.variants": {"$exists": False}
+    }, {"_id": 1, "filename": 1})
+    async for file_doc in cursor:
+        download_stream = await bucket.open_download_stream(file_doc["_id"])
+        variants = await build_variants(bucket, file_doc["filename"], await download_stream.read())
+        # An empty list marks images too small (or animated) for variants
+        await db["images.files"].update_one(
+            {"_id": file_doc["_id"]},
+            {"$set": {"metadata.variants": variants}}
+        )
+        processed += 1
+        print(f"{file_doc['filename']}: {len(variants)} variants")
+    return processed
+
+
+async def main():
+    await mongo.connect()
+    try:
+        processed = await backfill_image_variants()
+        print(f"\nProcessed {processed} images")
+    finally:
+        mongo.close()
+        image_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Resized variants of uploaded images.
+
+Every image uploaded through gridfs_upload.upload_image, and every chat image
+attachment, gets a ladder of smaller copies at IMAGE_VARIANT_WIDTHS (default
+160, 320, 640 and 1280 px wide), each as WebP and as a fallback for
+browsers without WebP support (JPEG, or PNG for images with transparency).
+Only widths below the original's are generated, and animated images are
+left alone.
+
+Resizing runs in image_pool (IMAGE_WORKERS processes, default 2) so Pillow
+never blocks the event loop. Variants are stored in the same GridFS bucket
+as the original, and their descriptors (width, content type, file id, ETag)
+are kept on the original's record; select_variant() then picks the
+smallest one at least as wide as the client asked for (?w=...).
+"""
+import io
+import os
+import hashlib
+import logging
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+
+from process_pool import ProcessPool
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = tuple(
+    int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '160,320,640,1280').split(',')
+)
+WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '80'))
+JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '82'))
+
+FORMATS = {
+    "WEBP": ("webp", "image/webp"),
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+}
+
+# EXIF orientations that swap width and height
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Process-wide pool for resizing
+image_pool = ProcessPool(
+    "images",
+    max_workers=int(os.getenv('IMAGE_WORKERS', '2')),
+    max_queue=int(os.getenv('IMAGE_MAX_QUEUE', '50'))
+)
+
+
+def render_variants(data: bytes, widths: tuple = VARIANT_WIDTHS) -> List[dict]:
+    """
+    Resize an image to each width narrower than it, encoded as WebP and as
+    JPEG/PNG. Runs in a worker process. Returns
+    [{width, height, format, content_type, extension, data}].
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False):
+            return []
+        orientation = img.getexif().get(0x0112, 1)
+        full_width = img.height if orientation in ROTATED_ORIENTATIONS else img.width
+        targets = sorted((width for width in widths if width < full_width), reverse=True)
+        if not targets:
+            return []
+
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale; ask for no less
+        # than the largest variant in either dimension
+        img.draft("RGB", (targets[0], targets[0]))
+        source = ImageOps.exif_transpose(img)
+
+    has_alpha = source.mode in ("RGBA", "LA", "PA") or (
+        source.mode == "P" and "transparency" in source.info
+    )
+    source = source.convert("RGBA" if has_alpha else "RGB")
+    fallback = "PNG" if has_alpha else "JPEG"
+
+    variants = []
+    for width in targets:
+        height = max(1, round(source.height * width / source.width))
+        # Each step resizes the previous (larger) variant
+        source = source.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for image_format in ("WEBP", fallback):
+            buffer = io.BytesIO()
+            if image_format == "PNG":
+                source.save(buffer, image_format, optimize=True)
+            else:
+                quality = WEBP_QUALITY if image_format == "WEBP" else JPEG_QUALITY
+                source.save(buffer, image_format, quality=quality, optimize=True)
+            extension, content_type = FORMATS[image_format]
+            variants.append({
+                "width": width,
+                "height": height,
+                "format": image_format.lower(),
+                "content_type": content_type,
+                "extension": extension,
+                "data": buffer.getvalue(),
+            })
+    return variants
+
+
+async def build_variants(bucket, filename: str, data: bytes) -> List[dict]:
+    """
+    Render the variant ladder for an image and store it in bucket next to
+    the original. Returns descriptors to keep with the original; [] if the
+    image has no smaller variants or rendering failed (the original is then
+    served for every width).
+    """
+    try:
+        rendered = await image_pool.run(render_variants, data)
+    except Exception as e:
+        logger.error(f"Failed to render variants for {filename}: {e}")
+        return []
+
+    stem = os.path.splitext(filename)[0]
+    variants = []
+    try:
+        for variant in rendered:
+            variant_filename = f"{stem}.w{variant['width']}.{variant['extension']}"
+            etag = hashlib.md5(variant["data"]).hexdigest()
+            file_id = await bucket.upload_from_stream(
+                variant_filename,
+                io.BytesIO(variant["data"]),
+                metadata={
+                    "variant_of": filename,
+                    "content_type": variant["content_type"],
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "etag": etag,
+                    "size": len(variant["data"]),
+                }
+            )
+            variants.append({
+                "filename": variant_filename,
+                "file_id": file_id,
+                "width": variant["width"],
+                "format": variant["format"],
+                "content_type": variant["content_type"],
+                "etag": etag,
+                "size": len(variant["data"]),
+            })
+    except Exception as e:
+        logger.error(f"Failed to store variants for {filename}: {e}")
+        await delete_variants(bucket, variants)
+        return []
+    return variants
+
+
+async def delete_variants(bucket, variants: List[dict]):
+    for variant in variants or []:
+        try:
+            await bucket.delete(variant["file_id"])
+        except Exception as e:
+            logger.error(f"Failed to delete image variant {variant.get('filename')}: {e}")
+
+
+def select_variant(variants: List[dict], width: Optional[int], accept: Optional[str]) -> Optional[dict]:
+    """
+    The smallest variant at least `width` wide, in WebP if the client
+    accepts it. None means serve the original (no width asked for, or none
+    of the variants is wide enough).
+    """
+    if not width or not variants:
+        return None
+    wants_webp = "image/webp" in (accept or "")
+    candidates = [
+        variant for variant in variants
+        if (variant["format"] == "webp") == wants_webp and variant["width"] >= width
+    ]
+    return min(candidates, key=lambda variant: variant["width"], default=None)
@@ -0,0 +1,238 @@
+"""
+TROA MongoDB index registry.
+
+Every index the backend relies on is declared in INDEXES below and applied
+idempotently from server.startup_event via ensure_indexes(). Creating an
+index that already exists with the same name and keys is a no-op, so this is
+safe to run on every start.
+
+The module can also be run directly to inspect a database:
+
+Usage:
+    python indexes.py            # report missing, undeclared and unused indexes
+    python indexes.py --apply    # create missing indexes, then report
+"""
+
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from database import mongo, get_database
+
+logger = logging.getLogger(__name__)
+
+
+# collection name -> indexes the application queries depend on
+INDEXES: Dict[str, List[IndexModel]] = {
+    "sessions": [
+        IndexModel([("token", ASCENDING)], name="token_unique", unique=True),
+        # Sessions store a datetime in 'expires'; let MongoDB purge them
+        IndexModel([("expires", ASCENDING)], name="expires_ttl", expireAfterSeconds=0),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "villas": [
+        IndexModel([("villa_number", ASCENDING)], name="villa_number"),
+        IndexModel([("emails", ASCENDING)], name="emails"),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        # Conflict checks and day views: amenity + date + status
+        IndexModel(
+            [("amenity_id", ASCENDING), ("booking_date", ASCENDING), ("status", ASCENDING)],
+            name="amenity_date_status"
+        ),
+        IndexModel([("booked_by_email", ASCENDING)], name="booked_by_email"),
+    ],
+    "slot_reservations": [
+        # One booking per amenity, date and 30-minute slot (see slot_reservations.py)
+        IndexModel(
+            [("amenity_id", ASCENDING), ("booking_date", ASCENDING), ("slot", ASCENDING)],
+            name="amenity_date_slot", unique=True
+        ),
+        IndexModel([("booking_id", ASCENDING)], name="booking_id"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_ttl", expireAfterSeconds=0),
+    ],
+    "invoices": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel(
+            [("user_email", ASCENDING), ("payment_status", ASCENDING), ("created_at", DESCENDING)],
+            name="user_email_status_created"
+        ),
+        IndexModel(
+            [("villa_number", ASCENDING), ("payment_status", ASCENDING), ("created_at", DESCENDING)],
+            name="villa_number_status_created"
+        ),
+        IndexModel([("payment_status", ASCENDING)], name="payment_status"),
+        # Month-end export: clubhouse invoices by billing month, maintenance by creation date
+        IndexModel(
+            [("invoice_type", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+            name="type_year_month"
+        ),
+        IndexModel([("invoice_type", ASCENDING), ("created_at", ASCENDING)], name="type_created"),
+    ],
+    "invoice_exports": [
+        # Looked up by _id (the export id), which also keeps ids unique
+        # Progress records are only needed around the download
+        IndexModel([("started_at", ASCENDING)], name="started_ttl", expireAfterSeconds=24 * 3600),
+    ],
+    "chat_groups": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("members", ASCENDING)], name="members"),
+    ],
+    "chat_messages": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("group_id", ASCENDING), ("created_at", DESCENDING)], name="group_created"),
+    ],
+    "chat_events": [
+        # Backplane events are only needed while they are being delivered
+        IndexModel([("created_at", ASCENDING)], name="created_ttl", expireAfterSeconds=300),
+    ],
+    "chat_attachments": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("group_id", ASCENDING)], name="group_id"),
+    ],
+    "invoice_pdfs.files": [
+        IndexModel([("metadata.invoice_id", ASCENDING), ("metadata.version", ASCENDING)], name="invoice_version"),
+    ],
+    "chat_user_reads": [
+        IndexModel([("user_email", ASCENDING), ("group_id", ASCENDING)], name="user_group", unique=True),
+    ],
+    "events": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("event_date", ASCENDING)], name="event_date"),
+    ],
+    "event_registrations": [
+        IndexModel(
+            [("event_id", ASCENDING), ("user_email", ASCENDING), ("status", ASCENDING)],
+            name="event_user_status"
+        ),
+        IndexModel([("user_email", ASCENDING)], name="user_email"),
+    ],
+    "push_subscriptions": [
+        IndexModel([("user_email", ASCENDING)], name="user_email"),
+    ],
+    "notification_outbox": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        # Worker claim query: provider + status, oldest due first
+        IndexModel(
+            [("provider", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+            name="provider_status_due"
+        ),
+        # Delivered jobs are kept for a week; dead letters have no completed_at and are kept
+        IndexModel([("completed_at", ASCENDING)], name="completed_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+
+def _key_of(index_document: dict) -> tuple:
+    """Normalise an index key spec so declared and existing indexes compare equal"""
+    return tuple((field, int(direction)) for field, direction in index_document.items())
+
+
+async def ensure_indexes(db=None) -> dict:
+    """Create every declared index. Failures are logged per collection so a
+    single conflicting index (e.g. duplicate data under a unique index) does
+    not prevent the others from being built.
+    """
+    db = db if db is not None else get_database()
+    created = 0
+    failed = []
+    for collection_name, models in INDEXES.items():
+        try:
+            names = await db[collection_name].create_indexes(models)
+            created += len(names)
+        except OperationFailure:
+            # Fall back to one-by-one so the remaining indexes still get built
+            for model in models:
+                try:
+                    await db[collection_name].create_indexes([model])
+                    created += 1
+                except OperationFailure as index_error:
+                    index_name = model.document.get('name')
+                    failed.append(f"{collection_name}.{index_name}")
+                    logger.error(f"Failed to create index {collection_name}.{index_name}: {index_error}")
+    logger.info(f"Index registry applied: {created} ensured, {len(failed)} failed")
+    return {"ensured": created, "failed": failed}
+
+
+async def index_report(db=None) -> dict:
+    """Compare the registry against the database.
+
+    Returns, per collection, the declared indexes that are missing, existing
+    indexes that are not declared, and existing indexes with no recorded use
+    since the server last started (from $indexStats).
+    """
+    db = db if db is not None else get_database()
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        existing_keys = {_key_of(dict(info['key'])): name for name, info in existing.items()}
+        declared_keys = {_key_of(model.document['key']): model.document['name'] for model in models}
+
+        missing = [name for key, name in declared_keys.items() if key not in existing_keys]
+        undeclared = [
+            name for key, name in existing_keys.items()
+            if key not in declared_keys and name != '_id_'
+        ]
+
+        unused = []
+        try:
+            async for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats['name'] != '_id_' and stats.get('accesses', {}).get('ops', 0) == 0:
+                    unused.append(stats['name'])
+        except OperationFailure as e:
+            logger.warning(f"$indexStats unavailable for {collection_name}: {e}")
+
+        report[collection_name] = {
+            "missing": missing,
+            "undeclared": undeclared,
+            "unused": sorted(unused),
+        }
+    return report
+
+
+async def main(apply: bool = False):
+    print("=" * 50)
+    print("TROA INDEX REPORT")
+    print("=" * 50)
+
+    try:
+        if apply:
+            result = await ensure_indexes()
+            print(f"\nEnsured {result['ensured']} indexes")
+            for name in result['failed']:
+                print(f"  ❌ Failed: {name}")
+
+        report = await index_report()
+        problems = 0
+        for collection_name, entry in report.items():
+            print(f"\n{collection_name}:")
+            if not any(entry.values()):
+                print("  ✅ OK")
+                continue
+            for name in entry['missing']:
+                print(f"  ❌ Missing: {name}")
+                problems += 1
+            for name in entry['undeclared']:
+                print(f"  ⚠️  Not in registry: {name}")
+            for name in entry['unused']:
+                print(f"  ⚠️  Unused since server start: {name}")
+
+        if problems:
+            print(f"\n{problems} declared index(es) missing - run with --apply to create them")
+        else:
+            print("\n✅ All declared indexes present")
+        return problems
+    finally:
+        mongo.close()
+
+
+if __name__ == "__main__":
+    missing_count = asyncio.run(main(apply="--apply" in sys.argv[1:]))
+    sys.exit(1 if missing_count else 0)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import RedirectResponse
 import httpx
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_database
 from datetime import datetime, timedelta
 import logging
 
@@ -15,10 +15,8 @@ INSTAGRAM_APP_ID = os.getenv('INSTAGRAM_APP_ID')
 INSTAGRAM_APP_SECRET = os.getenv('INSTAGRAM_APP_SECRET')
 INSTAGRAM_REDIRECT_URI = os.getenv('INSTAGRAM_REDIRECT_URI', '')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (shared process-wide client)
+db = get_database()
 
 @instagram_router.get('/auth')
 async def instagram_auth(request: Request):
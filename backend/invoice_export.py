@@ -0,0 +1,182 @@
+"""
+Month-end batch export of invoice PDFs as a streamed ZIP.
+
+GET /api/invoices/export/pdf renders every invoice of one type for a month
+(optionally only those with a given payment status) and streams them back
+as a single ZIP, instead of one download per invoice:
+
+- PDFs come from invoice_pdf_cache, so invoices that were already
+  downloaded are not rendered again; the rest are rendered in pdf_pool,
+  EXPORT_CONCURRENCY (default two per PDF worker) at a time
+- each PDF is added to the archive and sent as soon as it is ready, in
+  invoice-number order. zipfile writes to an unseekable buffer (sizes go in
+  data descriptors after each entry), so memory holds the PDFs in flight
+  plus one archive entry, never the whole archive
+- an invoice that fails to render does not abort the export; it is listed
+  with its error in manifest.csv, the last entry of the archive
+
+Progress is recorded in the invoice_exports collection every
+EXPORT_PROGRESS_EVERY invoices, so GET /api/invoices/export/{export_id}
+reports {total, done, failed, status} from any worker while the download
+is running. Clients pick the export_id themselves and pass it as a query
+parameter, so they can poll before the response arrives; the id is the
+record's _id, so reusing one is rejected with 409.
+"""
+import io
+import os
+import csv
+import asyncio
+import logging
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from database import get_database
+from pdf_renderer import invoice_pdf_cache, pdf_pool
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', str(pdf_pool.max_workers * 2)))
+EXPORT_PROGRESS_EVERY = int(os.getenv('EXPORT_PROGRESS_EVERY', '10'))
+MAX_EXPORT_INVOICES = int(os.getenv('MAX_EXPORT_INVOICES', '2000'))
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for zipfile; drain() returns what was written since the last call"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def month_range(year: int, month: int):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def pdf_filename(invoice: dict) -> str:
+    return f"TROA_Invoice_{invoice['invoice_number']}.pdf"
+
+
+async def start_export(export_id: str, user: dict, params: dict, total: int):
+    """Record a new export; raises 409 if export_id is already taken"""
+    try:
+        await get_database().invoice_exports.insert_one({
+            # Client-chosen ids are made unique by using them as _id
+            "_id": export_id,
+            "id": export_id,
+            "user_email": user["email"],
+            "params": params,
+            "total": total,
+            "done": 0,
+            "failed": 0,
+            "status": "running",
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+        })
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="An export with this id already exists")
+
+
+async def _record_progress(export_id: str, fields: dict):
+    try:
+        await get_database().invoice_exports.update_one({"_id": export_id}, {"$set": fields})
+    except Exception as e:
+        logger.error(f"Failed to record progress of export {export_id}: {e}")
+
+
+async def _bookings_by_id(invoices: List[dict]) -> Dict[str, dict]:
+    """Bookings referenced by the invoices' line items, fetched in one query"""
+    booking_ids = {
+        item["booking_id"]
+        for invoice in invoices
+        for item in invoice.get("line_items", [])
+        if item.get("booking_id")
+    }
+    if not booking_ids:
+        return {}
+    bookings = await get_database().bookings.find(
+        {"id": {"$in": list(booking_ids)}}, {"_id": 0}
+    ).to_list(None)
+    return {booking["id"]: booking for booking in bookings}
+
+
+async def stream_invoice_zip(export_id: str, invoices: List[dict]) -> AsyncIterator[bytes]:
+    """Render the invoices' PDFs and yield them as a ZIP archive, piece by piece"""
+    bookings = await _bookings_by_id(invoices)
+
+    def render(invoice: dict) -> asyncio.Task:
+        invoice_bookings = [
+            bookings[item["booking_id"]]
+            for item in invoice.get("line_items", [])
+            if item.get("booking_id") in bookings
+        ]
+        # Same de-duplication as download_invoice_pdf, so versions match its cache entries
+        invoice_bookings = list({booking["id"]: booking for booking in invoice_bookings}.values())
+        return asyncio.create_task(invoice_pdf_cache.pdf_bytes(invoice, invoice_bookings))
+
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+    manifest = io.StringIO()
+    manifest_writer = csv.writer(manifest)
+    manifest_writer.writerow(["invoice_number", "villa_number", "payment_status", "total_amount", "file", "error"])
+
+    pending = iter(invoices)
+    in_flight: List[tuple] = []
+    done = failed = 0
+    finished = False
+    try:
+        for invoice in pending:
+            in_flight.append((invoice, render(invoice)))
+            if len(in_flight) >= EXPORT_CONCURRENCY:
+                break
+
+        while in_flight:
+            invoice, task = in_flight.pop(0)
+            next_invoice = next(pending, None)
+            if next_invoice is not None:
+                in_flight.append((next_invoice, render(next_invoice)))
+
+            row = [invoice["invoice_number"], invoice.get("villa_number", ""),
+                   invoice.get("payment_status", ""), invoice.get("total_amount", 0)]
+            try:
+                pdf_bytes = await task
+            except Exception as e:
+                failed += 1
+                logger.error(f"Export {export_id}: failed to render invoice {invoice['invoice_number']}: {e}")
+                manifest_writer.writerow(row + ["", str(e) or type(e).__name__])
+            else:
+                archive.writestr(pdf_filename(invoice), pdf_bytes)
+                manifest_writer.writerow(row + [pdf_filename(invoice), ""])
+                yield sink.drain()
+            done += 1
+            if done % EXPORT_PROGRESS_EVERY == 0:
+                await _record_progress(export_id, {"done": done, "failed": failed})
+
+        archive.writestr("manifest.csv", manifest.getvalue())
+        archive.close()
+        yield sink.drain()
+        finished = True
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+        status = "completed" if finished else "aborted"
+        await _record_progress(export_id, {
+            "done": done, "failed": failed, "status": status, "finished_at": datetime.utcnow()
+        })
+        logger.info(f"Invoice export {export_id} {status}: {done - failed} PDFs, {failed} failed")
@@ -0,0 +1,295 @@
+"""
+Durable notification outbox.
+
+Request handlers record their side effects (emails, push notifications) as
+documents in the 'notification_outbox' collection instead of awaiting
+SendGrid / webpush before responding. Background workers started from
+server.startup_event drain the collection:
+
+- each provider has its own pool of workers, which caps how many calls to
+  that provider run at once
+- failed deliveries are retried with exponential backoff
+- after OUTBOX_MAX_ATTEMPTS failures a job is dead-lettered (status 'dead')
+  and left in the collection for inspection
+- jobs claimed by a worker that died are picked up again once their lease
+  expires, so nothing is lost on restart
+
+Configuration:
+    OUTBOX_EMAIL_WORKERS        concurrent email sends per process (default 4)
+    OUTBOX_PUSH_WORKERS         concurrent push sends per process (default 8)
+    OUTBOX_MAX_ATTEMPTS         attempts before dead-lettering (default 6)
+    OUTBOX_BACKOFF_SECONDS      first retry delay, doubled each attempt (default 30)
+    OUTBOX_POLL_SECONDS         idle poll interval (default 2)
+"""
+import os
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_EMAIL = 'email'
+PROVIDER_PUSH = 'push'
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_SENT = 'sent'
+STATUS_SKIPPED = 'skipped'
+STATUS_DEAD = 'dead'
+
+# Placeholder for admin_emails; resolved with get_admin_manager_emails() when
+# the job runs so the lookup stays off the request path
+ADMIN_MANAGER_EMAILS = '$admin_manager_emails'
+
+# How long a worker owns a claimed job before another worker may retry it
+LEASE_SECONDS = 300
+MAX_BACKOFF_SECONDS = 3600
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class PermanentDeliveryError(Exception):
+    """A job that can never succeed (unknown provider/action); dead-lettered without retrying"""
+
+
+def _is_failed_email_result(result) -> bool:
+    """email_service methods return {'status': 'error'} instead of raising.
+    Multi-recipient sends return a list; only retry when nothing was sent so
+    recipients that already got the email are not spammed."""
+    if isinstance(result, dict):
+        return result.get('status') == 'error'
+    if isinstance(result, list) and result:
+        return all(isinstance(r, dict) and r.get('status') == 'error' for r in result)
+    return False
+
+
+class NotificationOutbox:
+    """Writes notification jobs and runs the workers that deliver them"""
+
+    collection_name = 'notification_outbox'
+
+    def __init__(self):
+        self.worker_counts = {
+            PROVIDER_EMAIL: _env_int('OUTBOX_EMAIL_WORKERS', 4),
+            PROVIDER_PUSH: _env_int('OUTBOX_PUSH_WORKERS', 8),
+        }
+        self.max_attempts = _env_int('OUTBOX_MAX_ATTEMPTS', 6)
+        self.backoff_seconds = _env_int('OUTBOX_BACKOFF_SECONDS', 30)
+        self.poll_seconds = _env_int('OUTBOX_POLL_SECONDS', 2)
+        self._tasks: List[asyncio.Task] = []
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._stopping = False
+        self.counters = {
+            provider: {"enqueued": 0, "sent": 0, "skipped": 0, "retried": 0, "dead": 0}
+            for provider in self.worker_counts
+        }
+
+    @property
+    def collection(self):
+        return get_database()[self.collection_name]
+
+    # ---- producers ----
+
+    async def _enqueue(self, provider: str, action: str, kwargs: dict) -> Optional[str]:
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "provider": provider,
+            "action": action,
+            "kwargs": kwargs,
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "last_error": None,
+        }
+        try:
+            await self.collection.insert_one(job)
+        except Exception as e:
+            # Same contract as the old inline sends: a notification failure
+            # must never fail the request that triggered it
+            logger.error(f"Failed to enqueue {provider} notification {action}: {e}")
+            return None
+        self.counters[provider]["enqueued"] += 1
+        wakeup = self._wakeups.get(provider)
+        if wakeup is not None:
+            wakeup.set()
+        return job["id"]
+
+    async def email(self, method: str, **kwargs) -> Optional[str]:
+        """Queue an email_service.<method>(**kwargs) call"""
+        return await self._enqueue(PROVIDER_EMAIL, method, kwargs)
+
+    async def push(self, function: str, **kwargs) -> Optional[str]:
+        """Queue a push_notifications.<function>(**kwargs) call"""
+        return await self._enqueue(PROVIDER_PUSH, function, kwargs)
+
+    # ---- delivery ----
+
+    async def _deliver(self, job: dict):
+        """Run one job. Returns the final status; raises to request a retry."""
+        kwargs = dict(job.get("kwargs") or {})
+        action = job["action"]
+
+        if job["provider"] == PROVIDER_EMAIL:
+            from email_service import email_service, get_admin_manager_emails
+            if not action.startswith('send_') or not hasattr(email_service, action):
+                raise PermanentDeliveryError(f"Unknown email action: {action}")
+            if not email_service.api_key:
+                return STATUS_SKIPPED
+            if kwargs.get('admin_emails') == ADMIN_MANAGER_EMAILS:
+                kwargs['admin_emails'] = await get_admin_manager_emails()
+            result = await getattr(email_service, action)(**kwargs)
+            if _is_failed_email_result(result):
+                raise RuntimeError(f"Email send failed: {result}")
+            return STATUS_SENT
+
+        if job["provider"] == PROVIDER_PUSH:
+            import push_notifications
+            if not action.startswith('send_notification_to_') or not hasattr(push_notifications, action):
+                raise PermanentDeliveryError(f"Unknown push action: {action}")
+            # Push helpers log and swallow delivery errors (and return False
+            # when a user simply has no subscription), so only exceptions
+            # raised here are retried
+            await getattr(push_notifications, action)(**kwargs)
+            return STATUS_SENT
+
+        raise PermanentDeliveryError(f"Unknown provider: {job['provider']}")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_seconds * (2 ** (attempts - 1)), MAX_BACKOFF_SECONDS)
+        # Jitter so a provider outage does not produce synchronized retries
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _claim(self, provider: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "provider": provider,
+                "$or": [
+                    {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+                    {"status": STATUS_PROCESSING, "locked_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": STATUS_PROCESSING,
+                    "locked_until": now + timedelta(seconds=LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _process(self, job: dict):
+        provider = job["provider"]
+        try:
+            status = await self._deliver(job)
+        except Exception as e:
+            now = datetime.utcnow()
+            if isinstance(e, PermanentDeliveryError) or job["attempts"] >= self.max_attempts:
+                await self.collection.update_one(
+                    {"id": job["id"]},
+                    {"$set": {"status": STATUS_DEAD, "last_error": str(e), "updated_at": now, "dead_at": now},
+                     "$unset": {"locked_until": ""}}
+                )
+                self.counters[provider]["dead"] += 1
+                logger.error(f"Notification {job['action']} ({job['id']}) dead-lettered after {job['attempts']} attempts: {e}")
+            else:
+                delay = self._backoff(job["attempts"])
+                await self.collection.update_one(
+                    {"id": job["id"]},
+                    {"$set": {
+                        "status": STATUS_PENDING,
+                        "last_error": str(e),
+                        "next_attempt_at": now + timedelta(seconds=delay),
+                        "updated_at": now,
+                    }, "$unset": {"locked_until": ""}}
+                )
+                self.counters[provider]["retried"] += 1
+                logger.warning(f"Notification {job['action']} ({job['id']}) attempt {job['attempts']} failed, retrying in {delay:.0f}s: {e}")
+            return
+
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": status, "updated_at": now, "completed_at": now},
+             "$unset": {"locked_until": ""}}
+        )
+        self.counters[provider][status] += 1
+
+    async def _worker(self, provider: str):
+        wakeup = self._wakeups[provider]
+        while not self._stopping:
+            try:
+                job = await self._claim(provider)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker ({provider}) failed to claim a job: {e}")
+                job = None
+
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(job)
+
+    def start(self):
+        """Start the delivery workers (idempotent)"""
+        if self._tasks:
+            return
+        self._stopping = False
+        for provider, count in self.worker_counts.items():
+            self._wakeups[provider] = asyncio.Event()
+            for _ in range(max(count, 1)):
+                self._tasks.append(asyncio.create_task(self._worker(provider)))
+        logger.info(f"Notification outbox started with workers: {self.worker_counts}")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> dict:
+        backlog = {}
+        try:
+            async for row in self.collection.aggregate([
+                {"$match": {"status": {"$in": [STATUS_PENDING, STATUS_PROCESSING, STATUS_DEAD]}}},
+                {"$group": {"_id": {"provider": "$provider", "status": "$status"}, "count": {"$sum": 1}}},
+            ]):
+                backlog.setdefault(row["_id"]["provider"], {})[row["_id"]["status"]] = row["count"]
+        except Exception as e:
+            logger.error(f"Failed to read outbox backlog: {e}")
+        return {
+            "workers": self.worker_counts,
+            "running": len(self._tasks),
+            "counters": self.counters,
+            "backlog": backlog,
+        }
+
+
+# Process-wide outbox instance
+outbox = NotificationOutbox()
@@ -0,0 +1,139 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes 100-300ms per hash/verify at the default cost factor. Calling it
+directly inside an async handler stalls every other request and WebSocket on
+the worker for that long, so hashing runs in a dedicated thread pool (bcrypt
+releases the GIL while it works).
+
+Configuration:
+    PASSWORD_HASH_WORKERS     threads hashing concurrently (default 4)
+    PASSWORD_HASH_MAX_QUEUE   requests allowed to wait for a thread before
+                              new ones are rejected with 503 (default 200)
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded executor and tracks queue depth"""
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 200):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="bcrypt"
+                    )
+        return self._executor
+
+    def _run(self, job: dict, func, submitted_at: float, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            if job["state"] == "abandoned":
+                # The caller was cancelled and has already given up the slot
+                return None
+            job["state"] = "running"
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_ms += (started_at - submitted_at) * 1000
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_run_ms += (time.perf_counter() - started_at) * 1000
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        job = {"state": "queued"}
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self._run, job, func, time.perf_counter(), *args)
+        finally:
+            # A caller cancelled while waiting for a thread releases its queue
+            # slot here; once _run has started, the slot is its to release
+            with self._lock:
+                if job["state"] == "queued":
+                    job["state"] = "abandoned"
+                    self.queued -= 1
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password with a fresh salt and return it as a string"""
+        hashed = await self._submit(_hashpw, password)
+        return hashed.decode('utf-8')
+
+    async def verify_password(self, password: str, password_hash: str) -> bool:
+        """Check a password against a stored bcrypt hash"""
+        if not password_hash:
+            return False
+        return await self._submit(_checkpw, password, password_hash)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "peak_queue_depth": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_ms / self.completed, 2) if self.completed else 0.0,
+                "avg_run_ms": round(self.total_run_ms / self.completed, 2) if self.completed else 0.0,
+            }
+
+
+def _hashpw(password: str) -> bytes:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+
+def _checkpw(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed hash stored for this user
+        return False
+
+
+# Process-wide hasher instance
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', '4')),
+    max_queue=int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '200'))
+)
@@ -3,7 +3,7 @@ import razorpay
 import os
 import logging
 from pydantic import BaseModel
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_database
 from datetime import datetime
 import uuid
 
@@ -18,10 +18,8 @@ RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 # Initialize Razorpay client
 razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (shared process-wide client)
+db = get_database()
 
 # Payment amounts (in paise - 1 INR = 100 paise)
 PAYMENT_AMOUNTS = {
@@ -0,0 +1,173 @@
+"""
+PDF rendering off the event loop, and the rendered-invoice cache.
+
+reportlab holds the GIL for the whole render, so the generators in
+pdf_service run in pdf_pool (PDF_WORKERS processes, default 2) instead of
+on the event loop.
+
+Invoice PDFs are also kept in the invoice_pdfs GridFS bucket, so repeated
+downloads of the same invoice are streamed from there instead of being
+rendered again. A cached PDF is keyed by invoice id and a content version:
+a hash of the invoice and the bookings printed on it, leaving out fields
+that change without changing the PDF (reminder timestamps, Razorpay order
+ids). Any edit therefore produces a new version and a cache miss, so a
+stale PDF is never served; the version doubles as the ETag. Writes that
+change an invoice also call invoice_pdf_cache.invalidate() so outdated
+renders are removed right away rather than on the next download. Batch
+exports (invoice_export.py) go through the same cache with pdf_bytes().
+"""
+import io
+import os
+import json
+import hashlib
+import logging
+from functools import partial
+from typing import List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from database import get_database
+from gridfs_streaming import content_disposition, gridfs_response, iter_gridfs
+from pdf_service import generate_booking_report_pdf, generate_invoice_pdf
+from process_pool import ProcessPool
+
+logger = logging.getLogger(__name__)
+
+INVOICE_PDF_BUCKET = "invoice_pdfs"
+INVOICE_PDF_CACHE_CONTROL = "private, no-cache"
+
+# Invoice fields that are updated without changing what the PDF shows
+VOLATILE_INVOICE_FIELDS = {"updated_at", "last_reminder_sent", "razorpay_order_id"}
+
+# Process-wide pool for PDF rendering
+pdf_pool = ProcessPool(
+    "pdf",
+    max_workers=int(os.getenv('PDF_WORKERS', '2')),
+    max_queue=int(os.getenv('PDF_MAX_QUEUE', '20'))
+)
+
+
+async def render_booking_report_pdf(amenity_name: str, month: int, year: int,
+                                    bookings: List[dict], generated_by: str) -> bytes:
+    return await pdf_pool.run(partial(
+        generate_booking_report_pdf,
+        amenity_name=amenity_name,
+        month=month,
+        year=year,
+        bookings=bookings,
+        generated_by=generated_by
+    ))
+
+
+async def render_invoice_pdf(invoice: dict, bookings: List[dict]) -> bytes:
+    return await pdf_pool.run(generate_invoice_pdf, invoice, bookings)
+
+
+def invoice_pdf_version(invoice: dict, bookings: List[dict]) -> str:
+    """Hash of everything an invoice PDF is rendered from"""
+    content = {
+        "invoice": {key: value for key, value in invoice.items() if key not in VOLATILE_INVOICE_FIELDS},
+        "bookings": sorted(bookings, key=lambda booking: booking.get("id", "")),
+    }
+    encoded = json.dumps(content, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class InvoicePdfCache:
+    """Rendered invoice PDFs in GridFS, keyed by invoice id and content version"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _bucket(self) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(get_database(), bucket_name=INVOICE_PDF_BUCKET)
+
+    def _files(self):
+        return get_database()[f"{INVOICE_PDF_BUCKET}.files"]
+
+    async def _delete(self, query: dict):
+        bucket = self._bucket()
+        async for file_doc in self._files().find(query, {"_id": 1}):
+            try:
+                await bucket.delete(file_doc["_id"])
+            except Exception as e:
+                logger.error(f"Failed to delete cached invoice PDF {file_doc['_id']}: {e}")
+
+    async def _find(self, invoice: dict, version: str) -> Optional[dict]:
+        return await self._files().find_one(
+            {"metadata.invoice_id": invoice["id"], "metadata.version": version},
+            {"_id": 1, "length": 1}
+        )
+
+    async def _render(self, invoice: dict, bookings: List[dict], version: str) -> bytes:
+        self.misses += 1
+        pdf_bytes = await render_invoice_pdf(invoice, bookings)
+        try:
+            # Older versions of this invoice can never be served again
+            await self._delete({"metadata.invoice_id": invoice["id"]})
+            await self._bucket().upload_from_stream(
+                f"invoice-{invoice['id']}-{version}.pdf",
+                io.BytesIO(pdf_bytes),
+                metadata={"invoice_id": invoice["id"], "version": version, "size": len(pdf_bytes)}
+            )
+        except Exception as e:
+            # The PDF is still returned; the next request renders again
+            logger.error(f"Failed to cache PDF for invoice {invoice['id']}: {e}")
+        return pdf_bytes
+
+    async def pdf_bytes(self, invoice: dict, bookings: List[dict]) -> bytes:
+        """The invoice's PDF, from the cache or freshly rendered"""
+        version = invoice_pdf_version(invoice, bookings)
+        cached = await self._find(invoice, version)
+        if cached:
+            self.hits += 1
+            return b"".join([
+                chunk async for chunk in iter_gridfs(self._bucket(), cached["_id"], 0, cached["length"] - 1)
+            ])
+        return await self._render(invoice, bookings, version)
+
+    async def response(self, invoice: dict, bookings: List[dict], request: Request,
+                       filename: str) -> Response:
+        """The invoice's PDF as a download, rendering and caching it on a miss"""
+        version = invoice_pdf_version(invoice, bookings)
+        headers = {"Content-Disposition": content_disposition(filename, "attachment")}
+
+        cached = await self._find(invoice, version)
+        if cached:
+            self.hits += 1
+            return await gridfs_response(
+                self._bucket(), cached["_id"], cached["length"], "application/pdf", version,
+                request, INVOICE_PDF_CACHE_CONTROL, extra_headers=headers
+            )
+
+        pdf_bytes = await self._render(invoice, bookings, version)
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={**headers, "ETag": f'"{version}"', "Cache-Control": INVOICE_PDF_CACHE_CONTROL}
+        )
+
+    async def invalidate(self, *invoice_ids: str):
+        """Drop cached PDFs of invoices that were just changed"""
+        try:
+            await self._delete({"metadata.invoice_id": {"$in": list(invoice_ids)}})
+            self.invalidations += len(invoice_ids)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached invoice PDFs {invoice_ids}: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache instance
+invoice_pdf_cache = InvoicePdfCache()
@@ -1,6 +1,9 @@
 """
 PDF Generation Service for TROA
 Generates booking reports and invoices with TROA letterhead
+
+The generators are synchronous and CPU-bound; handlers call them through
+pdf_renderer, which runs them in a worker process pool.
 """
 
 import io
@@ -151,7 +154,7 @@ def get_month_name(month, year):
     return datetime(year, month, 1).strftime("%B %Y")
 
 
-async def generate_booking_report_pdf(
+def generate_booking_report_pdf(
     amenity_name: str,
     month: int,
     year: int,
@@ -282,7 +285,7 @@ async def generate_booking_report_pdf(
     return buffer.getvalue()
 
 
-async def generate_invoice_pdf(invoice: dict, bookings: list) -> bytes:
+def generate_invoice_pdf(invoice: dict, bookings: list) -> bytes:
     """
     Generate PDF invoice with TROA letterhead
     Handles both clubhouse subscription and maintenance invoices
@@ -0,0 +1,96 @@
+"""
+CPU-bound work in worker processes.
+
+Image resizing and PDF rendering hold the GIL for hundreds of milliseconds,
+so running them on the event loop (or in a thread) stalls every other
+request on the worker. ProcessPool runs such functions in a small
+ProcessPoolExecutor instead, with the same bounded-queue behaviour as
+password_hasher: once max_queue jobs are waiting, new ones are rejected
+with 503 rather than piling up.
+
+Worker processes are started with 'spawn' (the parent has Motor's threads
+running, which fork does not copy safely). Functions submitted must be
+module-level and importable without side effects - keep them in modules
+that only import what the computation needs (see image_variants.py).
+"""
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessPool:
+    """Bounded ProcessPoolExecutor with queue depth and timing stats"""
+
+    def __init__(self, name: str, max_workers: int = 2, max_queue: int = 50):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    async def run(self, func, *args):
+        """Run func(*args) in a worker process and return its result"""
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started_at = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.total_ms += (time.perf_counter() - started_at) * 1000
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_ms / finished, 2) if finished else 0.0,
+            }
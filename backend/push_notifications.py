@@ -8,16 +8,16 @@ from typing import Optional, List
 import os
 import logging
 import json
+import time
+import asyncio
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from database import get_database
 
 logger = logging.getLogger(__name__)
 
 push_router = APIRouter(prefix="/push", tags=["Push Notifications"])
 
-# Store subscriptions in memory (in production, use database)
-# This will be migrated to MongoDB
-push_subscriptions = {}
-
 # Create a temporary file for VAPID private key (pywebpush needs file path)
 _vapid_key_file = None
 
@@ -68,16 +68,10 @@ async def subscribe_to_push(data: PushSubscription, request: Request):
         from auth import require_auth
         await require_auth(request)  # Verify authentication
         
-        # Store subscription
-        push_subscriptions[data.user_email] = data.subscription
-        
         logger.info(f"Push subscription added for {data.user_email}")
         
-        # In production, save to MongoDB
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        # Subscriptions live only in MongoDB so every worker sees them
+        db = get_database()
         
         await db.push_subscriptions.update_one(
             {"user_email": data.user_email},
@@ -105,15 +99,8 @@ async def unsubscribe_from_push(data: UnsubscribeRequest, request: Request):
         from auth import require_auth
         await require_auth(request)  # Verify authentication
         
-        # Remove from memory
-        if data.user_email in push_subscriptions:
-            del push_subscriptions[data.user_email]
-        
         # Remove from MongoDB
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        db = get_database()
         
         await db.push_subscriptions.update_one(
             {"user_email": data.user_email},
@@ -138,17 +125,13 @@ async def send_push_notification(payload: PushNotificationPayload, request: Requ
         # Get VAPID keys
         vapid_key_file = get_vapid_key_file()
         vapid_public_key = os.environ.get('VAPID_PUBLIC_KEY')
-        vapid_email = os.environ.get('VAPID_EMAIL', 'mailto:troa.systems@gmail.com')
         
         if not vapid_key_file or not vapid_public_key:
             logger.warning("VAPID keys not configured, push notifications disabled")
             return {"message": "Push notifications not configured", "sent": 0}
         
         # Get subscriptions from MongoDB
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        db = get_database()
         
         query = {"active": True}
         if payload.user_emails:
@@ -159,52 +142,22 @@ async def send_push_notification(payload: PushNotificationPayload, request: Requ
         if not subscriptions:
             return {"message": "No active subscriptions found", "sent": 0}
         
-        # Send notifications using pywebpush
-        try:
-            from pywebpush import webpush, WebPushException
-            
-            notification_payload = json.dumps({
-                "title": payload.title,
-                "body": payload.body,
-                "icon": payload.icon,
-                "badge": payload.badge,
-                "data": {"url": payload.url},
-                "tag": payload.tag
-            })
-            
-            sent_count = 0
-            failed_count = 0
-            
-            for sub in subscriptions:
-                try:
-                    webpush(
-                        subscription_info=sub['subscription'],
-                        data=notification_payload,
-                        vapid_private_key=vapid_key_file,
-                        vapid_claims={
-                            "sub": vapid_email
-                        }
-                    )
-                    sent_count += 1
-                except WebPushException as e:
-                    logger.error(f"Failed to send push to {sub['user_email']}: {e}")
-                    # If subscription is invalid, mark as inactive
-                    if e.response and e.response.status_code in [404, 410]:
-                        await db.push_subscriptions.update_one(
-                            {"user_email": sub['user_email']},
-                            {"$set": {"active": False}}
-                        )
-                    failed_count += 1
-            
-            return {
-                "message": "Push notifications sent",
-                "sent": sent_count,
-                "failed": failed_count
-            }
-        except ImportError:
-            logger.warning("pywebpush not installed, skipping push notifications")
-            return {"message": "pywebpush not installed", "sent": 0}
-            
+        notification_payload = json.dumps({
+            "title": payload.title,
+            "body": payload.body,
+            "icon": payload.icon,
+            "badge": payload.badge,
+            "data": {"url": payload.url},
+            "tag": payload.tag
+        })
+        
+        result = await fan_out(subscriptions, notification_payload, label="admin broadcast")
+        
+        return {
+            "message": "Push notifications sent",
+            "sent": result["sent"],
+            "failed": result["failed"]
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -218,10 +171,7 @@ async def get_push_status(request: Request):
         from auth import require_auth
         user = await require_auth(request)
         
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        db = get_database()
         
         subscription = await db.push_subscriptions.find_one(
             {"user_email": user['email'], "active": True},
@@ -239,57 +189,146 @@ async def get_push_status(request: Request):
         raise HTTPException(status_code=500, detail="Failed to get push status")
 
 
-# Helper function to send push notification from other services
-async def send_notification_to_user(user_email: str, title: str, body: str, url: str = "/"):
-    """Helper function to send push notification to a specific user"""
+# ============ PUSH FAN-OUT ============
+# webpush() is a blocking HTTP call, so every send runs in a bounded thread
+# pool instead of on the event loop. PUSH_FANOUT_WORKERS caps how many
+# pushes are in flight at once per process.
+
+PUSH_FANOUT_WORKERS = int(os.environ.get('PUSH_FANOUT_WORKERS', '16'))
+_push_executor = ThreadPoolExecutor(max_workers=PUSH_FANOUT_WORKERS, thread_name_prefix="webpush")
+
+# HTTP statuses from the push service meaning the subscription is gone for good
+EXPIRED_SUBSCRIPTION_STATUSES = (404, 410)
+
+push_fanout_stats = {
+    "batches": 0,
+    "sent": 0,
+    "failed": 0,
+    "expired": 0,
+    "suppressed_online": 0,
+    "last_batch": None,
+}
+
+
+def _build_payload(title: str, body: str, url: str) -> str:
+    return json.dumps({
+        "title": title,
+        "body": body,
+        "icon": "/icons/icon-192x192.png",
+        "badge": "/icons/icon-72x72.png",
+        "data": {"url": url},
+        "tag": "troa-notification"
+    })
+
+
+def _send_webpush(subscription_info: dict, payload: str, vapid_key_file: str, vapid_email: str) -> Optional[int]:
+    """Blocking send (runs in the push thread pool).
+    Returns None on success, otherwise the push service HTTP status (0 if unknown)."""
+    from pywebpush import webpush, WebPushException
     try:
-        vapid_key_file = get_vapid_key_file()
-        vapid_public_key = os.environ.get('VAPID_PUBLIC_KEY')
-        vapid_email = os.environ.get('VAPID_EMAIL', 'mailto:troa.systems@gmail.com')
-        
-        if not vapid_key_file or not vapid_public_key:
-            logger.debug("VAPID keys not configured")
-            return False
-        
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
-        
-        subscription = await db.push_subscriptions.find_one(
-            {"user_email": user_email, "active": True},
-            {"_id": 0}
+        webpush(
+            subscription_info=subscription_info,
+            data=payload,
+            vapid_private_key=vapid_key_file,
+            vapid_claims={"sub": vapid_email}
         )
-        
-        if not subscription:
-            return False
-        
+        return None
+    except WebPushException as e:
+        return e.response.status_code if e.response is not None else 0
+    except Exception:
+        return 0
+
+
+async def fan_out(subscriptions: List[dict], payload: str, label: str = "push") -> dict:
+    """Send one payload to many subscriptions concurrently.
+    
+    Subscriptions rejected with 404/410 are marked inactive in a single
+    update. Returns counts and the batch timing.
+    """
+    result = {"sent": 0, "failed": 0, "expired": 0, "elapsed_ms": 0.0}
+    if not subscriptions:
+        return result
+    
+    vapid_key_file = get_vapid_key_file()
+    vapid_public_key = os.environ.get('VAPID_PUBLIC_KEY')
+    vapid_email = os.environ.get('VAPID_EMAIL', 'mailto:troa.systems@gmail.com')
+    if not vapid_key_file or not vapid_public_key:
+        logger.debug("VAPID keys not configured")
+        return result
+    
+    try:
+        import pywebpush  # noqa: F401
+    except ImportError:
+        logger.debug("pywebpush not installed")
+        return result
+    
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    statuses = await asyncio.gather(*[
+        loop.run_in_executor(
+            _push_executor, _send_webpush,
+            sub['subscription'], payload, vapid_key_file, vapid_email
+        )
+        for sub in subscriptions
+    ])
+    
+    expired_emails = []
+    for sub, status in zip(subscriptions, statuses):
+        if status is None:
+            result["sent"] += 1
+            continue
+        result["failed"] += 1
+        if status in EXPIRED_SUBSCRIPTION_STATUSES:
+            expired_emails.append(sub['user_email'])
+        else:
+            logger.error(f"Failed to send push to {sub['user_email']} (status {status})")
+    
+    if expired_emails:
+        result["expired"] = len(expired_emails)
         try:
-            from pywebpush import webpush, WebPushException
-            
-            notification_payload = json.dumps({
-                "title": title,
-                "body": body,
-                "icon": "/icons/icon-192x192.png",
-                "badge": "/icons/icon-72x72.png",
-                "data": {"url": url},
-                "tag": "troa-notification"
-            })
-            
-            webpush(
-                subscription_info=subscription['subscription'],
-                data=notification_payload,
-                vapid_private_key=vapid_key_file,
-                vapid_claims={"sub": vapid_email}
+            db = get_database()
+            await db.push_subscriptions.update_many(
+                {"user_email": {"$in": expired_emails}},
+                {"$set": {"active": False}}
             )
-            logger.info(f"Push notification sent to {user_email}")
-            return True
-        except ImportError:
-            logger.debug("pywebpush not installed")
-            return False
         except Exception as e:
-            logger.error(f"Failed to send push notification: {e}")
-            return False
+            logger.error(f"Failed to deactivate expired push subscriptions: {e}")
+    
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    push_fanout_stats["batches"] += 1
+    push_fanout_stats["sent"] += result["sent"]
+    push_fanout_stats["failed"] += result["failed"]
+    push_fanout_stats["expired"] += result["expired"]
+    push_fanout_stats["last_batch"] = {"label": label, "size": len(subscriptions), **result}
+    
+    logger.info(
+        f"Push batch '{label}': {len(subscriptions)} subscriptions, {result['sent']} sent, "
+        f"{result['failed']} failed ({result['expired']} expired) in {result['elapsed_ms']}ms"
+    )
+    return result
+
+
+async def send_notification_to_emails(user_emails: List[str], title: str, body: str, url: str = "/", label: str = "push") -> dict:
+    """Load the active subscriptions for a set of users in one query and fan out"""
+    if not user_emails:
+        return {"sent": 0, "failed": 0, "expired": 0, "elapsed_ms": 0.0}
+    
+    db = get_database()
+    subscriptions = await db.push_subscriptions.find(
+        {"user_email": {"$in": list(user_emails)}, "active": True},
+        {"_id": 0, "user_email": 1, "subscription": 1}
+    ).to_list(None)
+    
+    return await fan_out(subscriptions, _build_payload(title, body, url), label=label)
+
+
+# Helper function to send push notification from other services
+async def send_notification_to_user(user_email: str, title: str, body: str, url: str = "/"):
+    """Helper function to send push notification to a specific user"""
+    try:
+        result = await send_notification_to_emails([user_email], title, body, url, label="user")
+        return result["sent"] > 0
     except Exception as e:
         logger.error(f"Error in send_notification_to_user: {e}")
         return False
@@ -298,10 +337,7 @@ async def send_notification_to_user(user_email: str, title: str, body: str, url:
 async def send_notification_to_admins(title: str, body: str, url: str = "/admin"):
     """Helper function to send push notification to all admins (admin role only, not managers)"""
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Get admin emails only (not managers)
         admins = await db.users.find(
@@ -311,8 +347,7 @@ async def send_notification_to_admins(title: str, body: str, url: str = "/admin"
         
         admin_emails = [admin['email'] for admin in admins]
         
-        for email in admin_emails:
-            await send_notification_to_user(email, title, body, url)
+        await send_notification_to_emails(admin_emails, title, body, url, label="admins")
     except Exception as e:
         logger.error(f"Error sending notifications to admins: {e}")
 
@@ -320,22 +355,22 @@ async def send_notification_to_admins(title: str, body: str, url: str = "/admin"
 async def send_notification_to_group_members(group_id: str, title: str, body: str, exclude_email: str = None, url: str = "/chat"):
     """Helper function to send push notification to all members of a chat group"""
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[os.environ['DB_NAME']]
+        db = get_database()
         
         # Get group members
         group = await db.chat_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
         if not group:
             return
         
-        member_emails = group.get('members', [])
+        # Skip the sender
+        member_emails = [email for email in group.get('members', []) if email != exclude_email]
+        
+        # Members connected to this group's WebSocket already received the
+        # message in real time, so don't push to them as well
+        from websocket_manager import chat_manager
+        offline_emails = [email for email in member_emails if not chat_manager.is_user_online(group_id, email)]
+        push_fanout_stats["suppressed_online"] += len(member_emails) - len(offline_emails)
         
-        for email in member_emails:
-            # Skip the sender
-            if email == exclude_email:
-                continue
-            await send_notification_to_user(email, title, body, url)
+        await send_notification_to_emails(offline_emails, title, body, url, label=f"group {group_id}")
     except Exception as e:
         logger.error(f"Error sending notifications to group members: {e}")
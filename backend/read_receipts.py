@@ -0,0 +1,123 @@
+"""
+Batched chat read watermarks.
+
+Read status is tracked per user per group in 'chat_user_reads.last_read_at'
+(a message is read by a member once their watermark reaches its created_at),
+not per message. Opening a group (get_group_messages) and the WebSocket
+'mark_read' frame both advance the current user's watermark. Instead of
+writing on every request or frame, advances are buffered per (group, user),
+keeping only the latest timestamp, and flushed in a single bulk_write every
+READ_RECEIPT_FLUSH_MS (default 250), off the response path. Watermarks are
+written with $max so they never move backwards.
+
+Pending watermarks are flushed on shutdown from server.shutdown_db_client.
+"""
+import os
+import asyncio
+import logging
+from typing import Dict, Tuple
+
+from pymongo import UpdateOne
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+class ReadReceiptBatcher:
+    """Buffers read watermark advances and writes them with one bulk_write per flush"""
+
+    def __init__(self, flush_ms: int = 250):
+        self.flush_seconds = flush_ms / 1000
+        self._pending: Dict[Tuple[str, str], str] = {}
+        # The batch a running flush is writing
+        self._writing: Dict[Tuple[str, str], str] = {}
+        self._flush_task = None
+        self.flushes = 0
+        self.advances = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def advance(self, group_id: str, user_email: str, read_at: str):
+        """Queue moving user_email's watermark for the group to read_at (non-blocking)"""
+        if not read_at:
+            return
+        key = (group_id, user_email)
+        if key in self._pending:
+            self.coalesced += 1
+            read_at = max(read_at, self._pending[key])
+        self._pending[key] = read_at
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def pending_watermark(self, group_id: str, user_email: str) -> str:
+        """Watermark queued or being written for the user ('' if none)"""
+        key = (group_id, user_email)
+        return max(self._pending.get(key, ''), self._writing.get(key, ''))
+
+    def pending_watermarks(self, user_email: str) -> Dict[str, str]:
+        """group_id -> watermark queued or being written for the user"""
+        watermarks = {}
+        for batch in (self._writing, self._pending):
+            for (group_id, email), read_at in batch.items():
+                if email == user_email:
+                    watermarks[group_id] = max(read_at, watermarks.get(group_id, ''))
+        return watermarks
+
+    async def _flush_later(self):
+        # Advances made while a write is in flight go into the fresh
+        # _pending and find this task still running, so keep flushing
+        # until nothing is left
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+            if not self._pending:
+                return
+
+    async def flush(self):
+        """Write every buffered watermark in a single bulk_write"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._writing = batch
+        operations = [
+            UpdateOne(
+                {"user_email": user_email, "group_id": group_id},
+                {"$max": {"last_read_at": read_at}},
+                upsert=True
+            )
+            for (group_id, user_email), read_at in batch.items()
+        ]
+        try:
+            await get_database().chat_user_reads.bulk_write(operations, ordered=False)
+            self.flushes += 1
+            self.advances += len(operations)
+        except Exception as e:
+            # Best effort: the next read by the same user advances past it anyway
+            self.errors += 1
+            logger.error(f"Failed to write {len(operations)} read watermark(s): {e}")
+        finally:
+            self._writing = {}
+
+    async def stop(self):
+        # The scheduled flush is at most flush_ms away; let it finish rather
+        # than cancelling it halfway through a write
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "flush_ms": int(self.flush_seconds * 1000),
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "watermarks_written": self.advances,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+
+# Process-wide batcher instance
+read_receipts = ReadReceiptBatcher(
+    flush_ms=int(os.getenv('READ_RECEIPT_FLUSH_MS', '250'))
+)
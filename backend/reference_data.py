@@ -0,0 +1,134 @@
+"""
+In-process cache of reference data: amenities, committee members and
+gallery images.
+
+These are a few dozen documents that change only when an admin edits
+them, yet /amenities and /committee read them from MongoDB on every
+request and the staff booking views looked up each booking's amenity
+with its own find_one. All three collections are now held in memory:
+loaded at startup, invalidated by the create/update/delete handlers in
+server.py (the next read reloads that collection), and reloaded every
+REFERENCE_DATA_REFRESH_SECONDS (default 300) so edits made through
+other worker processes are picked up.
+
+Documents are stored as the endpoints return them: '_id' removed, and
+'id' filled in from '_id' for legacy documents that lack one. Callers
+must treat them as read-only.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+AMENITIES = "amenities"
+COMMITTEE = "committee"
+GALLERY = "gallery"
+
+# Cache name -> MongoDB collection
+COLLECTIONS = {
+    AMENITIES: "amenities",
+    COMMITTEE: "committee_members",
+    GALLERY: "gallery_images",
+}
+
+
+class ReferenceDataCache:
+    """Whole-collection cache of small, rarely changing collections"""
+
+    def __init__(self, refresh_seconds: int = 300):
+        self.refresh_seconds = refresh_seconds
+        self._documents: Dict[str, List[dict]] = {}
+        self._by_id: Dict[str, Dict[str, dict]] = {}
+        self._loaded_at: Dict[str, Optional[float]] = {name: None for name in COLLECTIONS}
+        self._load_locks = {name: asyncio.Lock() for name in COLLECTIONS}
+        self._generations = {name: 0 for name in COLLECTIONS}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.invalidations = 0
+
+    def _is_stale(self, name: str) -> bool:
+        loaded_at = self._loaded_at[name]
+        return loaded_at is None or time.monotonic() - loaded_at > self.refresh_seconds
+
+    async def _load(self, name: str):
+        generation = self._generations[name]
+        documents = []
+        async for document in get_database()[COLLECTIONS[name]].find().limit(1000):
+            if not document.get('id'):
+                document['id'] = str(document['_id'])
+            document.pop('_id', None)
+            documents.append(document)
+        self._documents[name] = documents
+        self._by_id[name] = {document['id']: document for document in documents}
+        # Invalidated while loading: the write may be missing, load again next time
+        if self._generations[name] == generation:
+            self._loaded_at[name] = time.monotonic()
+        self.reloads += 1
+
+    async def warm(self):
+        """(Re)load every collection from MongoDB"""
+        for name in COLLECTIONS:
+            async with self._load_locks[name]:
+                await self._load(name)
+        logger.info(
+            "Reference data loaded: " +
+            ", ".join(f"{len(self._documents[name])} {name}" for name in COLLECTIONS)
+        )
+
+    async def _ensure_fresh(self, name: str):
+        if not self._is_stale(name):
+            self.hits += 1
+            return
+        self.misses += 1
+        async with self._load_locks[name]:
+            # Another request may have reloaded while we waited
+            if self._is_stale(name):
+                await self._load(name)
+
+    async def all(self, name: str) -> List[dict]:
+        """Every document of a cached collection"""
+        await self._ensure_fresh(name)
+        return self._documents[name]
+
+    async def by_id(self, name: str) -> Dict[str, dict]:
+        """A cached collection keyed by 'id'"""
+        await self._ensure_fresh(name)
+        return self._by_id[name]
+
+    async def get(self, name: str, document_id: str) -> Optional[dict]:
+        return (await self.by_id(name)).get(document_id)
+
+    def invalidate(self, name: str):
+        """Drop a collection after it was written; the next read reloads it"""
+        self._loaded_at[name] = None
+        self._generations[name] += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        now = time.monotonic()
+        return {
+            "documents": {name: len(self._documents.get(name, [])) for name in COLLECTIONS},
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "reloads": self.reloads,
+            "invalidations": self.invalidations,
+            "age_seconds": {
+                name: round(now - loaded_at, 1) if loaded_at else None
+                for name, loaded_at in self._loaded_at.items()
+            },
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+# Process-wide cache instance
+reference_data = ReferenceDataCache(
+    refresh_seconds=int(os.getenv('REFERENCE_DATA_REFRESH_SECONDS', '300'))
+)
@@ -1,10 +1,10 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import re
 import uuid
 import asyncio
 from pathlib import Path
@@ -24,25 +24,37 @@ from models import (
     Villa, VillaCreate, VillaUpdate,
     VALID_ROLES, STAFF_ROLES, INVOICE_TYPE_CLUBHOUSE, INVOICE_TYPE_MAINTENANCE
 )
-from auth import auth_router, require_admin, require_manager_or_admin, require_auth, require_clubhouse_staff, require_accountant, require_staff
+from auth import auth_router, require_admin, require_manager_or_admin, require_auth, require_clubhouse_staff, require_accountant, require_staff, session_cache, invalidate_user_sessions
 from basic_auth import basic_auth_middleware
 from instagram import instagram_router
-from gridfs_upload import gridfs_router  # GridFS-based upload for production
+from gridfs_upload import gridfs_router, image_cache  # GridFS-based upload for production
 from payment import payment_router
-from pdf_service import generate_booking_report_pdf, generate_invoice_pdf
+from pdf_renderer import render_booking_report_pdf, pdf_pool, invoice_pdf_cache
+from invoice_export import stream_invoice_zip, start_export, month_range, MAX_EXPORT_INVOICES
 from chatbot import chatbot_router
 from events import events_router
-from villas import villas_router
-from email_service import email_service, get_admin_manager_emails
-from push_notifications import send_notification_to_user, send_notification_to_admins
+from villas import villas_router, normalize_villa_emails
+from villa_resolver import villa_resolver
+from password_hasher import password_hasher
+from email_service import email_service
+from notification_outbox import outbox, ADMIN_MANAGER_EMAILS
+from push_notifications import push_fanout_stats
+from read_receipts import read_receipts
+from websocket_manager import chat_manager
+from chat_backplane import backplane
+from typing_indicators import typing_tracker
+from image_variants import image_pool
+from database import mongo, get_database
+from indexes import ensure_indexes
+from slot_reservations import booking_slots, validate_booking_date, reserve_slots, release_slots, migrate_slot_reservations
+from availability import availability_cache, DAY_START, SLOTS_PER_DAY, SLOT_MINUTES
+from reference_data import reference_data, AMENITIES, COMMITTEE, GALLERY
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (shared process-wide client, see database.py)
+db = get_database()
 
 # Create the main app without a prefix
 # redirect_slashes=False prevents 307 redirects when trailing slash is missing
@@ -66,6 +78,7 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
     NO_CACHE_ENDPOINTS = [
         '/api/auth',
         '/api/bookings',
+        '/api/availability',
         '/api/payment',
         '/api/chat',
         '/api/feedback',
@@ -73,6 +86,8 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
         '/api/push',
         '/api/users',
         '/api/events',
+        '/api/metrics',
+        '/api/invoices/export',
     ]
     
     async def dispatch(self, request: Request, call_next):
@@ -101,6 +116,12 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(CacheControlMiddleware)
 
+# Stop oversized uploads while they are being received (limits are
+# registered by the upload routes, see upload_pipeline.py). Added before
+# CORS so the 413 still carries CORS headers.
+from upload_pipeline import UploadLimitMiddleware
+app.add_middleware(UploadLimitMiddleware)
+
 # Health check endpoint at root level (no /api prefix) for Kubernetes
 @app.get("/health")
 async def health_check():
@@ -128,19 +149,36 @@ logger = logging.getLogger(__name__)
 async def root():
     return {"message": "TROA API - The Retreat Owners Association"}
 
+# Runtime metrics (admin only)
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Runtime metrics for connection pools and in-process caches"""
+    await require_admin(request)
+    return {
+        "mongo_pool": mongo.pool_stats(),
+        "session_cache": session_cache.stats(),
+        "villa_resolver": villa_resolver.stats(),
+        "password_hasher": password_hasher.stats(),
+        "notification_outbox": await outbox.stats(),
+        "push_fanout": push_fanout_stats,
+        "read_receipts": read_receipts.stats(),
+        "websocket": chat_manager.stats(),
+        "chat_backplane": backplane.stats(),
+        "typing": typing_tracker.stats(),
+        "image_pool": image_pool.stats(),
+        "image_cache": image_cache.stats(),
+        "pdf_pool": pdf_pool.stats(),
+        "invoice_pdf_cache": invoice_pdf_cache.stats(),
+        "availability": availability_cache.stats(),
+        "reference_data": reference_data.stats(),
+    }
+
 # Committee Members Routes
 @api_router.get("/committee", response_model=List[CommitteeMember])
 async def get_committee_members():
     try:
-        members = await db.committee_members.find().to_list(100)
-        result = []
-        for member in members:
-            # Use existing 'id' field or fallback to string of MongoDB '_id'
-            if 'id' not in member or not member['id']:
-                member['id'] = str(member['_id'])
-            member.pop('_id', None)
-            result.append(CommitteeMember(**member))
-        return result
+        members = await reference_data.all(COMMITTEE)
+        return [CommitteeMember(**member) for member in members]
     except Exception as e:
         logger.error(f"Error fetching committee members: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch committee members")
@@ -154,6 +192,7 @@ async def create_committee_member(member: CommitteeMemberCreate, request: Reques
         member_dict = member.dict()
         member_obj = CommitteeMember(**member_dict)
         await db.committee_members.insert_one(member_obj.dict())
+        reference_data.invalidate(COMMITTEE)
         return member_obj
     except HTTPException:
         raise
@@ -193,6 +232,8 @@ async def update_committee_member(member_id: str, member: CommitteeMemberCreate,
             return_document=True
         )
         
+        reference_data.invalidate(COMMITTEE)
+        
         result.pop('_id', None)
         return CommitteeMember(**result)
     except HTTPException:
@@ -220,6 +261,7 @@ async def delete_committee_member(member_id: str, request: Request):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Committee member not found")
+        reference_data.invalidate(COMMITTEE)
         
         return {"message": "Committee member deleted successfully"}
     except HTTPException:
@@ -232,15 +274,8 @@ async def delete_committee_member(member_id: str, request: Request):
 @api_router.get("/amenities", response_model=List[Amenity])
 async def get_amenities():
     try:
-        amenities = await db.amenities.find().to_list(100)
-        result = []
-        for amenity in amenities:
-            # Use existing 'id' field or fallback to string of MongoDB '_id'
-            if 'id' not in amenity or not amenity['id']:
-                amenity['id'] = str(amenity['_id'])
-            amenity.pop('_id', None)
-            result.append(Amenity(**amenity))
-        return result
+        amenities = await reference_data.all(AMENITIES)
+        return [Amenity(**amenity) for amenity in amenities]
     except Exception as e:
         logger.error(f"Error fetching amenities: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch amenities")
@@ -254,6 +289,7 @@ async def create_amenity(amenity: AmenityCreate, request: Request):
         amenity_dict = amenity.dict()
         amenity_obj = Amenity(**amenity_dict)
         await db.amenities.insert_one(amenity_obj.dict())
+        reference_data.invalidate(AMENITIES)
         return amenity_obj
     except HTTPException:
         raise
@@ -293,6 +329,8 @@ async def update_amenity(amenity_id: str, amenity: AmenityCreate, request: Reque
             return_document=True
         )
         
+        reference_data.invalidate(AMENITIES)
+        
         result.pop('_id', None)
         return Amenity(**result)
     except HTTPException:
@@ -320,6 +358,7 @@ async def delete_amenity(amenity_id: str, request: Request):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Amenity not found")
+        reference_data.invalidate(AMENITIES)
         
         return {"message": "Amenity deleted successfully"}
     except HTTPException:
@@ -332,7 +371,7 @@ async def delete_amenity(amenity_id: str, request: Request):
 @api_router.get("/gallery", response_model=List[GalleryImage])
 async def get_gallery_images():
     try:
-        images = await db.gallery_images.find().to_list(100)
+        images = await reference_data.all(GALLERY)
         return [GalleryImage(**image) for image in images]
     except Exception as e:
         logger.error(f"Error fetching gallery images: {e}")
@@ -344,6 +383,7 @@ async def create_gallery_image(image: GalleryImageCreate):
         image_dict = image.dict()
         image_obj = GalleryImage(**image_dict)
         await db.gallery_images.insert_one(image_obj.dict())
+        reference_data.invalidate(GALLERY)
         return image_obj
     except Exception as e:
         logger.error(f"Error creating gallery image: {e}")
@@ -359,28 +399,23 @@ async def create_membership_application(application: MembershipApplicationCreate
         logger.info(f"New membership application from {app_obj.email}")
         
         # Send email notification to admins
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_membership_application_notification(
-                applicant_name=app_obj.name,
-                applicant_email=app_obj.email,
-                applicant_phone=app_obj.phone,
-                villa_no=app_obj.villa_no,
-                message=app_obj.message if hasattr(app_obj, 'message') else None,
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send membership notification email: {email_error}")
+        await outbox.email(
+            'send_membership_application_notification',
+            applicant_name=app_obj.name,
+            applicant_email=app_obj.email,
+            applicant_phone=app_obj.phone,
+            villa_no=app_obj.villa_no,
+            message=app_obj.message if hasattr(app_obj, 'message') else None,
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
         
         # Send push notification to admins
-        try:
-            await send_notification_to_admins(
-                title="New Membership Application",
-                body=f"{app_obj.name} (Villa {app_obj.villa_no}) applied for membership",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send membership push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_admins',
+            title="New Membership Application",
+            body=f"{app_obj.name} (Villa {app_obj.villa_no}) applied for membership",
+            url="/admin"
+        )
         
         return app_obj
     except Exception as e:
@@ -541,9 +576,7 @@ async def update_user(user_id: str, update: UserUpdate, request: Request):
         if update.new_password is not None:
             if len(update.new_password) < 6:
                 raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
-            import bcrypt
-            password_hash = bcrypt.hashpw(update.new_password.encode('utf-8'), bcrypt.gensalt())
-            update_data["password_hash"] = password_hash.decode('utf-8')
+            update_data["password_hash"] = await password_hasher.hash_password(update.new_password)
         
         # Handle email_verified toggle if provided
         if update.email_verified is not None:
@@ -560,6 +593,10 @@ async def update_user(user_id: str, update: UserUpdate, request: Request):
             return_document=True
         )
         
+        # Role changes must not be masked by cached sessions
+        if update.role is not None and update.role != user_to_update.get('role'):
+            invalidate_user_sessions(user_to_update.get('email'))
+        
         # Remove _id and password_hash for serialization
         result.pop('_id', None)
         result.pop('password_hash', None)
@@ -622,29 +659,24 @@ async def submit_feedback(feedback: FeedbackCreate, request: Request):
         logger.info(f"Feedback submitted by {user['email']}")
         
         # Send email notification to admins
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_feedback_notification(
-                user_name=user['name'],
-                user_email=user['email'],
-                rating=feedback.rating,
-                works_well=feedback.works_well,
-                needs_improvement=feedback.needs_improvement,
-                feature_suggestions=feedback.feature_suggestions,
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send feedback notification email: {email_error}")
+        await outbox.email(
+            'send_feedback_notification',
+            user_name=user['name'],
+            user_email=user['email'],
+            rating=feedback.rating,
+            works_well=feedback.works_well,
+            needs_improvement=feedback.needs_improvement,
+            feature_suggestions=feedback.feature_suggestions,
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
         
         # Send push notification to admins
-        try:
-            await send_notification_to_admins(
-                title="New Feedback Received",
-                body=f"{user['name']} submitted feedback with {feedback.rating}⭐ rating",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send feedback push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_admins',
+            title="New Feedback Received",
+            body=f"{user['name']} submitted feedback with {feedback.rating}⭐ rating",
+            url="/admin"
+        )
         
         return feedback_obj
     except HTTPException:
@@ -782,32 +814,16 @@ async def create_booking(booking: AmenityBookingCreate, request: Request):
                     total_guest_charges += GUEST_CHARGE
             processed_guests = legacy_guests
         
+        # Date must be YYYY-MM-DD and start HH:MM on a slot boundary (400 otherwise)
+        validate_booking_date(booking.booking_date)
+        slots = booking_slots(booking.start_time, booking.duration_minutes)
+        
         # Calculate end time
         from datetime import datetime, timedelta
         start_dt = datetime.strptime(booking.start_time, "%H:%M")
         end_dt = start_dt + timedelta(minutes=booking.duration_minutes)
         end_time = end_dt.strftime("%H:%M")
         
-        # Check for conflicts
-        existing_bookings = await db.bookings.find({
-            "amenity_id": booking.amenity_id,
-            "booking_date": booking.booking_date,
-            "status": "confirmed"
-        }, {"_id": 0}).to_list(100)
-        
-        for existing in existing_bookings:
-            existing_start = datetime.strptime(existing['start_time'], "%H:%M")
-            existing_end = datetime.strptime(existing['end_time'], "%H:%M")
-            new_start = start_dt
-            new_end = end_dt
-            
-            # Check for time overlap
-            if (new_start < existing_end and new_end > existing_start):
-                raise HTTPException(
-                    status_code=409, 
-                    detail=f"Time slot conflicts with existing booking ({existing['start_time']}-{existing['end_time']})"
-                )
-        
         # Create audit log entry
         audit_entry = {
             'timestamp': datetime.utcnow().isoformat(),
@@ -836,60 +852,58 @@ async def create_booking(booking: AmenityBookingCreate, request: Request):
             audit_log=[audit_entry]
         )
         
-        await db.bookings.insert_one(booking_obj.dict())
+        # Claim the booking's slots; 409 if any of them is taken
+        await reserve_slots(booking_obj.dict())
+        try:
+            await db.bookings.insert_one(booking_obj.dict())
+        except Exception:
+            await release_slots(booking_obj.id)
+            raise
+        availability_cache.mark(booking.amenity_id, booking.booking_date, slots, booked=True)
         logger.info(f"Booking created by {user['email']} for {booking.amenity_name} with {len(processed_guests)} guests, charges: ₹{total_guest_charges}")
         
         # Send booking confirmation email to user
-        try:
-            await email_service.send_booking_confirmation(
-                recipient_email=user['email'],
-                user_name=user['name'],
-                amenity_name=booking.amenity_name,
-                booking_date=booking.booking_date,
-                start_time=booking.start_time,
-                end_time=end_time,
-                booking_id=booking_obj.id,
-                additional_guests=booking.additional_guests
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send booking confirmation email: {email_error}")
+        await outbox.email(
+            'send_booking_confirmation',
+            recipient_email=user['email'],
+            user_name=user['name'],
+            amenity_name=booking.amenity_name,
+            booking_date=booking.booking_date,
+            start_time=booking.start_time,
+            end_time=end_time,
+            booking_id=booking_obj.id,
+            additional_guests=booking.additional_guests
+        )
         
         # Send notification to admins/managers
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_booking_notification_to_admins(
-                action='created',
-                user_name=user['name'],
-                user_email=user['email'],
-                amenity_name=booking.amenity_name,
-                booking_date=booking.booking_date,
-                start_time=booking.start_time,
-                end_time=end_time,
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send admin booking notification: {email_error}")
+        await outbox.email(
+            'send_booking_notification_to_admins',
+            action='created',
+            user_name=user['name'],
+            user_email=user['email'],
+            amenity_name=booking.amenity_name,
+            booking_date=booking.booking_date,
+            start_time=booking.start_time,
+            end_time=end_time,
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
         
         # Send push notification to user
-        try:
-            await send_notification_to_user(
-                user_email=user['email'],
-                title="Booking Confirmed 🎉",
-                body=f"Your {booking.amenity_name} booking on {booking.booking_date} at {booking.start_time} is confirmed!",
-                url="/my-bookings"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send booking push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_user',
+            user_email=user['email'],
+            title="Booking Confirmed 🎉",
+            body=f"Your {booking.amenity_name} booking on {booking.booking_date} at {booking.start_time} is confirmed!",
+            url="/my-bookings"
+        )
         
         # Send push notification to admins
-        try:
-            await send_notification_to_admins(
-                title="New Booking",
-                body=f"{user['name']} booked {booking.amenity_name} on {booking.booking_date}",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send admin push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_admins',
+            title="New Booking",
+            body=f"{user['name']} booked {booking.amenity_name} on {booking.booking_date}",
+            url="/admin"
+        )
         
         return booking_obj
     except HTTPException:
@@ -918,6 +932,41 @@ async def get_bookings(request: Request, amenity_id: Optional[str] = None, date:
         logger.error(f"Error fetching bookings: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch bookings")
 
+@api_router.get("/availability")
+async def get_availability(request: Request, start: Optional[str] = None, days: int = 7,
+                           amenity_id: Optional[List[str]] = Query(None)):
+    """Booked-slot bitmaps per amenity and day - authenticated users
+    
+    Each day is an integer whose bit i is set when the half-hour slot
+    starting at 06:00 + 30*i minutes is booked. Defaults to the coming
+    week of every amenity.
+    """
+    try:
+        await require_auth(request)
+        
+        if not 1 <= days <= 31:
+            raise HTTPException(status_code=400, detail="days must be between 1 and 31")
+        try:
+            start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else datetime.now().date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start must be a date in YYYY-MM-DD format")
+        
+        dates = [(start_date + timedelta(days=offset)).isoformat() for offset in range(days)]
+        amenity_ids = amenity_id or list(await reference_data.by_id(AMENITIES))
+        
+        return {
+            "day_start": DAY_START,
+            "slot_minutes": SLOT_MINUTES,
+            "slots_per_day": SLOTS_PER_DAY,
+            "dates": dates,
+            "booked": await availability_cache.get(amenity_ids, dates),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching availability: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch availability")
+
 @api_router.get("/bookings/my", response_model=List[AmenityBooking])
 async def get_my_bookings(request: Request):
     """Get current user's bookings"""
@@ -970,45 +1019,40 @@ async def cancel_booking(booking_id: str, request: Request):
                 "$push": {"audit_log": audit_entry}
             }
         )
+        released = await release_slots(booking_id)
+        availability_cache.mark(booking['amenity_id'], booking['booking_date'], released, booked=False)
         
         # Send cancellation email to user
-        try:
-            await email_service.send_booking_cancellation(
-                recipient_email=user['email'],
-                user_name=user['name'],
-                amenity_name=booking['amenity_name'],
-                booking_date=booking['booking_date'],
-                start_time=booking['start_time'],
-                end_time=booking['end_time']
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send cancellation email: {email_error}")
+        await outbox.email(
+            'send_booking_cancellation',
+            recipient_email=user['email'],
+            user_name=user['name'],
+            amenity_name=booking['amenity_name'],
+            booking_date=booking['booking_date'],
+            start_time=booking['start_time'],
+            end_time=booking['end_time']
+        )
         
         # Send notification to admins/managers
-        try:
-            admin_emails = await get_admin_manager_emails()
-            await email_service.send_booking_notification_to_admins(
-                action='cancelled',
-                user_name=user['name'],
-                user_email=user['email'],
-                amenity_name=booking['amenity_name'],
-                booking_date=booking['booking_date'],
-                start_time=booking['start_time'],
-                end_time=booking['end_time'],
-                admin_emails=admin_emails
-            )
-        except Exception as email_error:
-            logger.error(f"Failed to send admin cancellation notification: {email_error}")
+        await outbox.email(
+            'send_booking_notification_to_admins',
+            action='cancelled',
+            user_name=user['name'],
+            user_email=user['email'],
+            amenity_name=booking['amenity_name'],
+            booking_date=booking['booking_date'],
+            start_time=booking['start_time'],
+            end_time=booking['end_time'],
+            admin_emails=ADMIN_MANAGER_EMAILS
+        )
         
         # Send push notification to admins about cancellation
-        try:
-            await send_notification_to_admins(
-                title="Booking Cancelled",
-                body=f"{user['name']} cancelled {booking['amenity_name']} booking on {booking['booking_date']}",
-                url="/admin"
-            )
-        except Exception as push_error:
-            logger.error(f"Failed to send admin push notification: {push_error}")
+        await outbox.push(
+            'send_notification_to_admins',
+            title="Booking Cancelled",
+            body=f"{user['name']} cancelled {booking['amenity_name']} booking on {booking['booking_date']}",
+            url="/admin"
+        )
         
         return {"message": "Booking cancelled successfully"}
     except HTTPException:
@@ -1034,8 +1078,9 @@ async def get_todays_bookings_for_staff(request: Request):
         }, {"_id": 0}).sort("start_time", 1).to_list(100)
         
         # Enrich with amenity details
+        amenities = await reference_data.by_id(AMENITIES)
         for booking in bookings:
-            amenity = await db.amenities.find_one({"id": booking['amenity_id']}, {"_id": 0, "name": 1, "image": 1})
+            amenity = amenities.get(booking['amenity_id'])
             if amenity:
                 booking['amenity_image'] = amenity.get('image')
         
@@ -1058,8 +1103,9 @@ async def get_bookings_by_date_for_staff(date: str, request: Request):
         }, {"_id": 0}).sort("start_time", 1).to_list(100)
         
         # Enrich with amenity details
+        amenities = await reference_data.by_id(AMENITIES)
         for booking in bookings:
-            amenity = await db.amenities.find_one({"id": booking['amenity_id']}, {"_id": 0, "name": 1, "image": 1})
+            amenity = amenities.get(booking['amenity_id'])
             if amenity:
                 booking['amenity_image'] = amenity.get('image')
         
@@ -1206,7 +1252,7 @@ async def get_booking_audit_log(booking_id: str, request: Request):
 
 # ============ PDF REPORT ROUTES ============
 
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
 @api_router.get("/staff/reports/bookings")
 async def download_booking_report(
@@ -1224,7 +1270,7 @@ async def download_booking_report(
             raise HTTPException(status_code=400, detail="Invalid month")
         
         # Get amenity
-        amenity = await db.amenities.find_one({"id": amenity_id}, {"_id": 0})
+        amenity = await reference_data.get(AMENITIES, amenity_id)
         if not amenity:
             raise HTTPException(status_code=404, detail="Amenity not found")
         
@@ -1242,7 +1288,7 @@ async def download_booking_report(
         }, {"_id": 0}).sort("booking_date", 1).to_list(1000)
         
         # Generate PDF
-        pdf_bytes = await generate_booking_report_pdf(
+        pdf_bytes = await render_booking_report_pdf(
             amenity_name=amenity['name'],
             month=month,
             year=year,
@@ -1317,7 +1363,7 @@ async def create_invoice(invoice_data: InvoiceCreate, request: Request):
             raise HTTPException(status_code=404, detail="User not found")
         
         # Get amenity
-        amenity = await db.amenities.find_one({"id": invoice_data.amenity_id}, {"_id": 0})
+        amenity = await reference_data.get(AMENITIES, invoice_data.amenity_id)
         if not amenity:
             raise HTTPException(status_code=404, detail="Amenity not found")
         
@@ -1448,7 +1494,8 @@ async def create_invoice(invoice_data: InvoiceCreate, request: Request):
         # Send email notification
         try:
             month_name = datetime(invoice_data.year, invoice_data.month, 1).strftime("%B %Y")
-            await email_service.send_invoice_raised(
+            await outbox.email(
+                'send_invoice_raised',
                 recipient_email=invoice_data.user_email,
                 user_name=target_user.get('name', ''),
                 invoice_number=invoice.invoice_number,
@@ -1546,7 +1593,8 @@ async def create_maintenance_invoice(invoice_data: MaintenanceInvoiceCreate, req
                 villa_user = await db.users.find_one({"email": email}, {"_id": 0, "name": 1})
                 user_name = villa_user.get('name', '') if villa_user else ''
                 
-                await email_service.send_maintenance_invoice_raised(
+                await outbox.email(
+                    'send_maintenance_invoice_raised',
                     recipient_email=email,
                     user_name=user_name,
                     invoice_number=invoice.invoice_number,
@@ -1585,11 +1633,7 @@ async def get_invoices(request: Request, status: Optional[str] = None, invoice_t
         # If view='my', always show only user's personal invoices (villa-based)
         if view == 'my':
             # Get villas associated with this user's email
-            user_villas = await db.villas.find(
-                {"emails": {"$elemMatch": {"$regex": f"^{user_email}$", "$options": "i"}}},
-                {"_id": 0, "villa_number": 1}
-            ).to_list(100)
-            villa_numbers = [v['villa_number'] for v in user_villas]
+            villa_numbers = await villa_resolver.villas_for_email(user_email)
             
             # User sees invoices where they are directly assigned OR their villa is assigned
             if villa_numbers:
@@ -1630,11 +1674,7 @@ async def get_invoices(request: Request, status: Optional[str] = None, invoice_t
                 query['invoice_type'] = INVOICE_TYPE_CLUBHOUSE
             else:
                 # Regular users see invoices where their email is in the villa's email list OR directly assigned
-                user_villas = await db.villas.find(
-                    {"emails": {"$elemMatch": {"$regex": f"^{user_email}$", "$options": "i"}}},
-                    {"_id": 0, "villa_number": 1}
-                ).to_list(100)
-                villa_numbers = [v['villa_number'] for v in user_villas]
+                villa_numbers = await villa_resolver.villas_for_email(user_email)
                 
                 if villa_numbers:
                     query['$or'] = [
@@ -1670,11 +1710,7 @@ async def get_pending_invoice_count(request: Request):
         user_email = user.get('email')
         
         # Get villas associated with this user's email
-        user_villas = await db.villas.find(
-            {"emails": {"$elemMatch": {"$regex": f"^{user_email}$", "$options": "i"}}},
-            {"_id": 0, "villa_number": 1}
-        ).to_list(100)
-        villa_numbers = [v['villa_number'] for v in user_villas]
+        villa_numbers = await villa_resolver.villas_for_email(user_email)
         
         # Count invoices where user is directly assigned OR their villa is assigned
         query = {"payment_status": "pending"}
@@ -1715,6 +1751,89 @@ async def get_pending_invoice_approvals(request: Request):
         raise HTTPException(status_code=500, detail="Failed to fetch pending approvals")
 
 
+@api_router.get("/invoices/export/pdf")
+async def export_invoice_pdfs(request: Request, year: int, month: int, invoice_type: str,
+                              status: Optional[str] = None, export_id: Optional[str] = None):
+    """Download all invoices of a type for a month as a ZIP of PDFs - Staff only
+
+    Clubhouse invoices are matched by their billing month, maintenance
+    invoices by the month they were raised in. Progress can be polled at
+    /invoices/export/{export_id} while the ZIP streams.
+    """
+    try:
+        user = await require_staff(request)
+        user_role = user.get('role')
+        
+        if invoice_type not in (INVOICE_TYPE_CLUBHOUSE, INVOICE_TYPE_MAINTENANCE):
+            raise HTTPException(status_code=400, detail="Invalid invoice type")
+        if not 1 <= month <= 12:
+            raise HTTPException(status_code=400, detail="Invalid month")
+        if (user_role == 'accountant' and invoice_type != INVOICE_TYPE_MAINTENANCE) or \
+                (user_role == 'clubhouse_staff' and invoice_type != INVOICE_TYPE_CLUBHOUSE):
+            raise HTTPException(status_code=403, detail="Access denied")
+        if export_id is None:
+            export_id = str(uuid.uuid4())
+        elif not re.fullmatch(r'[A-Za-z0-9-]{8,64}', export_id):
+            raise HTTPException(status_code=400, detail="Invalid export id")
+        
+        query = {"invoice_type": invoice_type}
+        if invoice_type == INVOICE_TYPE_CLUBHOUSE:
+            query.update({"month": month, "year": year})
+        else:
+            start, end = month_range(year, month)
+            query["created_at"] = {"$gte": start, "$lt": end}
+        if status:
+            query["payment_status"] = status
+        
+        invoices = await db.invoices.find(query, {"_id": 0}).sort("invoice_number", 1).to_list(MAX_EXPORT_INVOICES + 1)
+        if not invoices:
+            raise HTTPException(status_code=404, detail="No invoices found for this month")
+        if len(invoices) > MAX_EXPORT_INVOICES:
+            raise HTTPException(status_code=400, detail=f"Too many invoices to export at once (max {MAX_EXPORT_INVOICES})")
+        
+        await start_export(export_id, user, {
+            "year": year, "month": month, "invoice_type": invoice_type, "status": status
+        }, len(invoices))
+        logger.info(f"Invoice export {export_id} of {len(invoices)} invoices started by {user['email']}")
+        
+        kind = "Maintenance" if invoice_type == INVOICE_TYPE_MAINTENANCE else "Clubhouse"
+        filename = f"TROA_{kind}_Invoices_{year}_{month:02d}{'_' + status if status else ''}.zip"
+        return StreamingResponse(
+            stream_invoice_zip(export_id, invoices),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Export-Id": export_id,
+                "X-Export-Total": str(len(invoices)),
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting invoice PDFs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to export invoices")
+
+
+@api_router.get("/invoices/export/{export_id}")
+async def get_invoice_export_progress(export_id: str, request: Request):
+    """Progress of a running or finished invoice export - Staff only"""
+    try:
+        user = await require_staff(request)
+        
+        export = await db.invoice_exports.find_one({"_id": export_id}, {"_id": 0})
+        if not export:
+            raise HTTPException(status_code=404, detail="Export not found")
+        if export['user_email'] != user['email'] and user.get('role') not in ['admin', 'manager']:
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        return export
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching export progress: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch export progress")
+
+
 @api_router.get("/invoices/{invoice_id}")
 async def get_invoice(invoice_id: str, request: Request):
     """Get invoice details"""
@@ -1762,15 +1881,7 @@ async def download_invoice_pdf(invoice_id: str, request: Request):
         # Check if user's email is in the villa's email list
         is_villa_member = False
         if invoice.get('villa_number'):
-            villa = await db.villas.find_one(
-                {"villa_number": invoice['villa_number']},
-                {"_id": 0, "emails": 1}
-            )
-            if villa and villa.get('emails'):
-                is_villa_member = any(
-                    email.lower() == user_email.lower() 
-                    for email in villa.get('emails', [])
-                )
+            is_villa_member = await villa_resolver.is_villa_member(user_email, invoice['villa_number'])
         
         # Access rules:
         # - Admin/Manager: Can access all
@@ -1793,17 +1904,9 @@ async def download_invoice_pdf(invoice_id: str, request: Request):
         booking_ids = [item.get('booking_id') for item in invoice.get('line_items', []) if item.get('booking_id')]
         bookings = await db.bookings.find({"id": {"$in": list(set(booking_ids))}}, {"_id": 0}).to_list(100)
         
-        pdf_bytes = await generate_invoice_pdf(invoice, bookings)
-        
         filename = f"TROA_Invoice_{invoice['invoice_number']}.pdf"
         
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return await invoice_pdf_cache.response(invoice, bookings, request, filename)
     except HTTPException:
         raise
     except Exception as e:
@@ -1862,6 +1965,7 @@ async def update_invoice(invoice_id: str, update: InvoiceUpdate, request: Reques
             {"id": invoice_id},
             {"$set": update_fields}
         )
+        await invoice_pdf_cache.invalidate(invoice_id)
         
         logger.info(f"Invoice {invoice_id} updated by {user['email']}")
         
@@ -1980,13 +2084,15 @@ async def verify_invoice_payment(invoice_id: str, request: Request):
                 }
             }
         )
+        await invoice_pdf_cache.invalidate(invoice_id)
         
         logger.info(f"Invoice {invoice_id} paid via Razorpay: {payment_id}")
         
         # Send payment receipt email
         try:
             month_name = datetime(invoice['year'], invoice['month'], 1).strftime("%B %Y")
-            await email_service.send_invoice_payment_receipt(
+            await outbox.email(
+                'send_invoice_payment_receipt',
                 recipient_email=user['email'],
                 user_name=user['name'],
                 invoice_number=invoice['invoice_number'],
@@ -2024,6 +2130,7 @@ async def cancel_invoice(invoice_id: str, request: Request):
             {"id": invoice_id},
             {"$set": {"payment_status": "cancelled", "updated_at": datetime.utcnow()}}
         )
+        await invoice_pdf_cache.invalidate(invoice_id)
         
         logger.info(f"Invoice {invoice_id} cancelled by {user['email']}")
         
@@ -2053,12 +2160,7 @@ async def submit_offline_invoice_payment(invoice_id: str, request: Request):
         user_villa_numbers = []
         if user.get('villa_number'):
             user_villa_numbers.append(user['villa_number'])
-        user_villa = await db.villas.find_one(
-            {"emails": user['email']},
-            {"_id": 0, "villa_number": 1}
-        )
-        if user_villa:
-            user_villa_numbers.append(user_villa['villa_number'])
+        user_villa_numbers.extend(await villa_resolver.villas_for_email(user['email']))
         
         has_access = (
             invoice.get('user_email') == user['email'] or
@@ -2102,14 +2204,12 @@ async def submit_offline_invoice_payment(invoice_id: str, request: Request):
         logger.info(f"Offline payment submitted for invoice {invoice_id} by {user['email']}")
         
         # Notify admins
-        try:
-            await send_notification_to_admins(
-                title="Invoice Offline Payment",
-                body=f"Offline payment submitted for Invoice #{invoice.get('invoice_number', invoice_id)}",
-                url="/admin"
-            )
-        except Exception as notif_error:
-            logger.error(f"Failed to send admin notification: {notif_error}")
+        await outbox.push(
+            'send_notification_to_admins',
+            title="Invoice Offline Payment",
+            body=f"Offline payment submitted for Invoice #{invoice.get('invoice_number', invoice_id)}",
+            url="/admin"
+        )
         
         return {
             "message": "Offline payment submitted successfully. Pending admin approval.",
@@ -2168,13 +2268,15 @@ async def approve_offline_invoice_payment(invoice_id: str, request: Request):
                 }
             }
         )
+        await invoice_pdf_cache.invalidate(invoice_id)
         
         logger.info(f"Offline payment approved for invoice {invoice_id} by {admin['email']}")
         
         # Send notification to user
         try:
             if invoice.get('user_email'):
-                await send_notification_to_user(
+                await outbox.push(
+                    'send_notification_to_user',
                     user_email=invoice['user_email'],
                     title="Payment Approved! ✅",
                     body=f"Your offline payment for Invoice #{invoice.get('invoice_number', '')} has been approved.",
@@ -2188,7 +2290,8 @@ async def approve_offline_invoice_payment(invoice_id: str, request: Request):
             if invoice.get('user_email'):
                 if invoice.get('invoice_type') == INVOICE_TYPE_MAINTENANCE:
                     # Maintenance invoice receipt
-                    await email_service.send_invoice_payment_receipt(
+                    await outbox.email(
+                        'send_invoice_payment_receipt',
                         recipient_email=invoice['user_email'],
                         user_name=invoice.get('user_name', ''),
                         invoice_number=invoice['invoice_number'],
@@ -2201,7 +2304,8 @@ async def approve_offline_invoice_payment(invoice_id: str, request: Request):
                 else:
                     # Clubhouse invoice receipt
                     month_name = datetime(invoice['year'], invoice['month'], 1).strftime("%B %Y") if invoice.get('month') and invoice.get('year') else "N/A"
-                    await email_service.send_invoice_payment_receipt(
+                    await outbox.email(
+                        'send_invoice_payment_receipt',
                         recipient_email=invoice['user_email'],
                         user_name=invoice.get('user_name', ''),
                         invoice_number=invoice['invoice_number'],
@@ -2278,7 +2382,8 @@ async def reject_offline_invoice_payment(invoice_id: str, request: Request):
         # Send notification to user
         try:
             if invoice.get('user_email'):
-                await send_notification_to_user(
+                await outbox.push(
+                    'send_notification_to_user',
                     user_email=invoice['user_email'],
                     title="Payment Rejected ❌",
                     body=f"Your offline payment for Invoice #{invoice.get('invoice_number', '')} was rejected. {rejection_reason}",
@@ -2334,11 +2439,7 @@ async def create_multi_invoice_payment_order(request: Request):
             raise HTTPException(status_code=400, detail="No invoices selected")
         
         # Get user's villas
-        user_villas = await db.villas.find(
-            {"emails": {"$elemMatch": {"$regex": f"^{user_email}$", "$options": "i"}}},
-            {"_id": 0, "villa_number": 1}
-        ).to_list(100)
-        villa_numbers = [v['villa_number'] for v in user_villas]
+        villa_numbers = await villa_resolver.villas_for_email(user_email)
         
         # Fetch and validate all invoices
         invoices = await db.invoices.find(
@@ -2495,6 +2596,7 @@ async def verify_multi_invoice_payment(request: Request):
                 }
             )
             paid_invoices.append(invoice.get('invoice_number'))
+        await invoice_pdf_cache.invalidate(*[invoice['id'] for invoice in invoices])
         
         logger.info(f"Multi-invoice payment verified for user {user['email']}: {', '.join(paid_invoices)}")
         
@@ -2526,7 +2628,7 @@ from push_notifications import push_router
 app.include_router(push_router, prefix="/api")
 
 # Community Chat router
-from community_chat import chat_router, init_mc_group
+from community_chat import chat_router, init_mc_group, migrate_read_by_to_watermarks, migrate_chat_attachments_to_gridfs, deliver_chat_event, expire_typing
 app.include_router(chat_router, prefix="/api")
 
 # Bulk upload router
@@ -2567,7 +2669,14 @@ app.add_middleware(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    await outbox.stop()
+    await typing_tracker.stop_sweeper()
+    await backplane.stop()
+    await read_receipts.stop()
+    mongo.close()
+    password_hasher.shutdown()
+    image_pool.shutdown()
+    pdf_pool.shutdown()
 
 
 # Background task for invoice reminders
@@ -2650,14 +2759,9 @@ async def send_invoice_reminders():
                         
                         # Add villa emails if villa_number is present
                         if villa_number:
-                            villa = await db.villas.find_one(
-                                {"villa_number": villa_number},
-                                {"_id": 0, "emails": 1}
-                            )
-                            if villa and villa.get('emails'):
-                                for email in villa['emails']:
-                                    if email and email not in emails_to_notify:
-                                        emails_to_notify.append(email)
+                            for email in await villa_resolver.emails_for_villa(villa_number):
+                                if email and email not in emails_to_notify:
+                                    emails_to_notify.append(email)
                         
                         # Send reminders to all relevant emails
                         for email in emails_to_notify:
@@ -2698,11 +2802,79 @@ async def send_invoice_reminders():
 
 @app.on_event("startup")
 async def startup_event():
+    # Open the shared MongoDB connection pool
+    try:
+        await mongo.connect()
+    except Exception as e:
+        logging.error(f"Error connecting to MongoDB: {e}")
+    
+    # Create any missing indexes (idempotent)
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logging.error(f"Error ensuring indexes: {e}")
+    
+    # Normalize villa email lists for indexed membership lookups (idempotent)
+    try:
+        await normalize_villa_emails()
+    except Exception as e:
+        logging.error(f"Error normalizing villa emails: {e}")
+    
+    # Reserve slots for upcoming bookings made before slot reservations (idempotent)
+    try:
+        await migrate_slot_reservations()
+    except Exception as e:
+        logging.error(f"Error migrating slot reservations: {e}")
+    
+    # Load amenities, committee members and gallery images
+    try:
+        await reference_data.warm()
+    except Exception as e:
+        logging.error(f"Error loading reference data: {e}")
+    
+    # Load the coming week's availability bitmaps
+    try:
+        await availability_cache.warm(list(await reference_data.by_id(AMENITIES)))
+    except Exception as e:
+        logging.error(f"Error warming availability cache: {e}")
+    
+    # Warm the email -> villa resolver
+    try:
+        await villa_resolver.warm()
+    except Exception as e:
+        logging.error(f"Error warming villa resolver: {e}")
+    
     # Initialize MC Group
     try:
         await init_mc_group()
     except Exception as e:
         logging.error(f"Error initializing MC Group: {e}")
     
+    # Move legacy per-message read_by arrays into read watermarks (idempotent)
+    try:
+        await migrate_read_by_to_watermarks()
+    except Exception as e:
+        logging.error(f"Error migrating chat read receipts: {e}")
+    
+    # Move legacy base64 chat attachments into GridFS (idempotent)
+    try:
+        await migrate_chat_attachments_to_gridfs()
+    except Exception as e:
+        logging.error(f"Error migrating chat attachments: {e}")
+    
+    # Deliver chat events to this worker's sockets (and announce presence
+    # through the backplane so other workers see it)
+    try:
+        await backplane.start(deliver_chat_event)
+        chat_manager.set_publisher(backplane.publish)
+    except Exception as e:
+        logging.error(f"Error starting chat backplane: {e}")
+    
+    # Expire typing indicators whose user stopped sending start_typing
+    typing_tracker.start_sweeper(expire_typing)
+    
     # Start invoice reminder background task
     asyncio.create_task(send_invoice_reminders())
+    
+    # Start notification outbox workers
+    outbox.start()
@@ -0,0 +1,198 @@
+"""
+Atomic amenity slot reservations.
+
+Every confirmed booking holds one slot_reservations document per
+30-minute slot it covers: {amenity_id, booking_date, slot: "HH:MM",
+booking_id}. A unique index on (amenity_id, booking_date, slot) makes the
+database the arbiter of conflicts - claiming a slot is a single indexed
+insert, and of two concurrent requests for the same slot exactly one
+wins. This replaces loading every booking of the day and comparing
+times in Python, which let two requests both pass the check.
+
+A booking claims its slots with one ordered insert_many. If any slot is
+taken, whatever the booking had already inserted is deleted again before
+the 409 is raised, so a failed booking never leaves slots behind.
+cancel_booking releases the slots after marking the booking cancelled.
+
+A reservation can outlive its booking if the process dies between the
+two writes. When a claim collides with a reservation whose booking is
+cancelled, or that has no booking at all after STALE_RESERVATION_SECONDS,
+the stale reservation is removed and the claim retried once.
+
+Reservations carry expires_at (the day after the booking) so the TTL
+index clears past days. migrate_slot_reservations() backfills
+reservations for upcoming bookings made before this existed.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 30
+
+# Bookable hours; availability.py maps exactly these slots to bitmap bits
+DAY_START = "06:00"
+DAY_END = "22:00"
+
+STALE_RESERVATION_SECONDS = int(os.getenv('STALE_RESERVATION_SECONDS', '60'))
+
+DUPLICATE_KEY = 11000
+
+
+def booking_slots(start_time: str, duration_minutes: int) -> List[str]:
+    """
+    The "HH:MM" slots covered by a booking; raises 400 unless it starts on
+    a slot boundary and lies within DAY_START-DAY_END
+    """
+    try:
+        start = datetime.strptime(start_time, "%H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Start time must be in HH:MM format")
+    if start.minute % SLOT_MINUTES:
+        raise HTTPException(status_code=400, detail="Bookings must start on the hour or half hour")
+    end = start + timedelta(minutes=duration_minutes)
+    if start < datetime.strptime(DAY_START, "%H:%M") or end > datetime.strptime(DAY_END, "%H:%M"):
+        raise HTTPException(status_code=400, detail=f"Bookings must be between {DAY_START} and {DAY_END}")
+    return [
+        (start + timedelta(minutes=offset)).strftime("%H:%M")
+        for offset in range(0, duration_minutes, SLOT_MINUTES)
+    ]
+
+
+def validate_booking_date(booking_date: str):
+    """Raises 400 unless booking_date is a YYYY-MM-DD date"""
+    try:
+        # strptime also takes "2030-6-1", which would not match stored dates
+        valid = datetime.strptime(booking_date, "%Y-%m-%d").strftime("%Y-%m-%d") == booking_date
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Booking date must be in YYYY-MM-DD format")
+
+
+def _reservation_documents(booking: dict) -> List[dict]:
+    now = datetime.utcnow()
+    expires_at = datetime.strptime(booking['booking_date'], "%Y-%m-%d") + timedelta(days=1)
+    return [
+        {
+            "amenity_id": booking['amenity_id'],
+            "booking_date": booking['booking_date'],
+            "slot": slot,
+            "booking_id": booking['id'],
+            "created_at": now,
+            "expires_at": expires_at,
+        }
+        for slot in booking_slots(booking['start_time'], booking['duration_minutes'])
+    ]
+
+
+async def _conflicting_reservation(booking: dict, error: BulkWriteError) -> Optional[dict]:
+    """The reservation that a failed claim collided with"""
+    duplicate = next(
+        (write_error for write_error in error.details.get('writeErrors', [])
+         if write_error.get('code') == DUPLICATE_KEY),
+        None
+    )
+    if duplicate is None:
+        return None
+    slot = duplicate['op']['slot']
+    return await get_database().slot_reservations.find_one(
+        {"amenity_id": booking['amenity_id'], "booking_date": booking['booking_date'], "slot": slot},
+        {"_id": 0}
+    )
+
+
+async def _release_if_stale(reservation: dict) -> bool:
+    """Remove a reservation left behind by a cancelled or never-created booking"""
+    db = get_database()
+    holder = await db.bookings.find_one({"id": reservation['booking_id']}, {"_id": 0, "status": 1})
+    if holder is None:
+        age = (datetime.utcnow() - reservation['created_at']).total_seconds()
+        if age < STALE_RESERVATION_SECONDS:
+            # Its booking may still be being written
+            return False
+    elif holder.get('status') == 'confirmed':
+        return False
+    await release_slots(reservation['booking_id'])
+    logger.warning(f"Released stale slot reservations of booking {reservation['booking_id']}")
+    return True
+
+
+async def reserve_slots(booking: dict):
+    """
+    Claim every slot of a booking (a dict with id, amenity_id,
+    booking_date, start_time, duration_minutes), or none of them.
+    Raises 409 naming the conflicting booking if a slot is taken.
+    """
+    db = get_database()
+    documents = _reservation_documents(booking)
+    for attempt in range(2):
+        try:
+            await db.slot_reservations.insert_many([dict(document) for document in documents], ordered=True)
+            return
+        except BulkWriteError as e:
+            # Roll back the slots this booking did get
+            await release_slots(booking['id'])
+            conflict = await _conflicting_reservation(booking, e)
+            if conflict is None:
+                raise
+            if attempt == 0 and await _release_if_stale(conflict):
+                continue
+            holder = await db.bookings.find_one(
+                {"id": conflict['booking_id']}, {"_id": 0, "start_time": 1, "end_time": 1}
+            )
+            if holder:
+                detail = f"Time slot conflicts with existing booking ({holder['start_time']}-{holder['end_time']})"
+            else:
+                detail = f"Time slot {conflict['slot']} is already being booked"
+            raise HTTPException(status_code=409, detail=detail)
+
+
+async def release_slots(booking_id: str) -> List[str]:
+    """Drop a booking's reservations; returns the slots that were released"""
+    reservations = get_database().slot_reservations
+    released = await reservations.find({"booking_id": booking_id}, {"_id": 0, "slot": 1}).to_list(None)
+    if released:
+        await reservations.delete_many({"booking_id": booking_id})
+    return [reservation['slot'] for reservation in released]
+
+
+async def migrate_slot_reservations() -> int:
+    """
+    Create reservations for confirmed bookings from today on that have
+    none (bookings made before reservations existed). Idempotent; bookings
+    that already overlap each other keep whichever holds the slot first.
+    Returns the number of reservations created.
+    """
+    db = get_database()
+    today = datetime.now().strftime("%Y-%m-%d")
+    reserved = set(await db.slot_reservations.distinct("booking_id", {"booking_date": {"$gte": today}}))
+    created = 0
+    conflicts = 0
+    async for booking in db.bookings.find(
+        {"status": "confirmed", "booking_date": {"$gte": today}},
+        {"_id": 0, "id": 1, "amenity_id": 1, "booking_date": 1, "start_time": 1, "duration_minutes": 1}
+    ):
+        if booking['id'] in reserved:
+            continue
+        try:
+            documents = _reservation_documents(booking)
+        except (HTTPException, KeyError, ValueError):
+            logger.warning(f"Booking {booking.get('id')} has no valid slots, not reserved")
+            continue
+        try:
+            await db.slot_reservations.insert_many(documents, ordered=False)
+            created += len(documents)
+        except BulkWriteError as e:
+            created += e.details.get('nInserted', 0)
+            conflicts += len(e.details.get('writeErrors', []))
+    if created or conflicts:
+        logger.info(f"Backfilled {created} slot reservations ({conflicts} slots already held by overlapping bookings)")
+    return created
@@ -0,0 +1,169 @@
+"""
+Server-side typing indicators.
+
+Clients send 'start_typing' over the chat WebSocket while the user types
+(repeated every couple of seconds as a heartbeat) and 'stop_typing' when
+they pause or send. The tracker debounces these per (group, user):
+
+- a typing_start is published at most once per TYPING_COALESCE_SECONDS
+  (default 3); starts in between only refresh the entry
+- a stop_typing for a user who is not typing is dropped
+- a sweeper task publishes typing_stop for users whose last start is older
+  than TYPING_TIMEOUT_SECONDS (default 5), so a closed tab or lost stop
+  frame no longer leaves "is typing..." on everyone's screen
+
+Entries started on this worker are "local" and expired by its sweeper.
+Typing events from other workers arrive through the chat backplane and are
+recorded as remote entries (see observe/forget); their own worker publishes
+the stop, so remote entries only expire silently as a safety net.
+
+The REST GET /chat/groups/{id}/typing fallback reads typing_users() from
+here without touching the database.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called by the sweeper with (group_id, user_email) for every expired local entry
+ExpireHandler = Callable[[str, str], Awaitable[None]]
+
+
+class TypingTracker:
+    """Per-group typing state with start coalescing and expiry"""
+
+    def __init__(self, timeout_seconds: float = 5, coalesce_seconds: float = 3,
+                 sweep_seconds: float = 1):
+        self.timeout_seconds = timeout_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self.sweep_seconds = sweep_seconds
+        # {group_id: {user_email: {name, seen_at, sent_at, local}}}
+        self._typing: Dict[str, Dict[str, dict]] = {}
+        self._on_expire: Optional[ExpireHandler] = None
+        self._sweeper = None
+        self.starts_published = 0
+        self.starts_coalesced = 0
+        self.stops_published = 0
+        self.stops_dropped = 0
+        self.expired = 0
+
+    def start(self, group_id: str, user_email: str, user_name: str) -> bool:
+        """Record that the user is typing; True if a typing_start should be published"""
+        now = time.monotonic()
+        entry = self._typing.get(group_id, {}).get(user_email)
+        if entry and entry['local'] and now - entry['sent_at'] < self.coalesce_seconds:
+            entry['seen_at'] = now
+            self.starts_coalesced += 1
+            return False
+        self._typing.setdefault(group_id, {})[user_email] = {
+            'name': user_name,
+            'seen_at': now,
+            'sent_at': now,
+            'local': True,
+        }
+        self.starts_published += 1
+        return True
+
+    def stop(self, group_id: str, user_email: str) -> bool:
+        """Clear the user's typing state; True if a typing_stop should be published"""
+        if self._pop(group_id, user_email) is None:
+            self.stops_dropped += 1
+            return False
+        self.stops_published += 1
+        return True
+
+    def observe(self, group_id: str, user_email: str, user_name: Optional[str]):
+        """Record a typing_start delivered by the backplane"""
+        group = self._typing.setdefault(group_id, {})
+        entry = group.get(user_email)
+        if entry and entry['local']:
+            # Published by this worker; start() already recorded it
+            return
+        now = time.monotonic()
+        group[user_email] = {'name': user_name, 'seen_at': now, 'sent_at': now, 'local': False}
+
+    def forget(self, group_id: str, user_email: str):
+        """Record a typing_stop delivered by the backplane"""
+        self._pop(group_id, user_email)
+
+    def _pop(self, group_id: str, user_email: str) -> Optional[dict]:
+        group = self._typing.get(group_id)
+        if not group:
+            return None
+        entry = group.pop(user_email, None)
+        if not group:
+            del self._typing[group_id]
+        return entry
+
+    def _expires_after(self, entry: dict) -> float:
+        # A remote typer's worker only re-publishes every coalesce_seconds
+        if entry['local']:
+            return self.timeout_seconds
+        return self.timeout_seconds + self.coalesce_seconds
+
+    def typing_users(self, group_id: str, exclude_email: Optional[str] = None) -> List[dict]:
+        """Users currently typing in the group, as [{'email', 'name'}]"""
+        now = time.monotonic()
+        return [
+            {'email': email, 'name': entry['name']}
+            for email, entry in self._typing.get(group_id, {}).items()
+            if email != exclude_email and now - entry['seen_at'] <= self._expires_after(entry)
+        ]
+
+    def start_sweeper(self, on_expire: ExpireHandler):
+        """Start the background task that expires stale entries"""
+        self._on_expire = on_expire
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Typing indicator sweep failed: {e}")
+
+    async def sweep(self):
+        """Drop expired entries and publish typing_stop for the local ones"""
+        now = time.monotonic()
+        expired = [
+            (group_id, email, entry['local'])
+            for group_id, group in self._typing.items()
+            for email, entry in group.items()
+            if now - entry['seen_at'] > self._expires_after(entry)
+        ]
+        for group_id, email, local in expired:
+            self._pop(group_id, email)
+            self.expired += 1
+            if local and self._on_expire is not None:
+                await self._on_expire(group_id, email)
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        return {
+            "timeout_seconds": self.timeout_seconds,
+            "coalesce_seconds": self.coalesce_seconds,
+            "typing": sum(len(group) for group in self._typing.values()),
+            "starts_published": self.starts_published,
+            "starts_coalesced": self.starts_coalesced,
+            "stops_published": self.stops_published,
+            "stops_dropped": self.stops_dropped,
+            "expired": self.expired,
+        }
+
+
+# Process-wide tracker instance
+typing_tracker = TypingTracker(
+    timeout_seconds=float(os.getenv('TYPING_TIMEOUT_SECONDS', '5')),
+    coalesce_seconds=float(os.getenv('TYPING_COALESCE_SECONDS', '3')),
+    sweep_seconds=float(os.getenv('TYPING_SWEEP_SECONDS', '1')),
+)
@@ -0,0 +1,161 @@
+"""
+Streaming, size-limited upload ingestion.
+
+Uploads used to be read whole with `await file.read()` and only then
+checked against the size limit, so an oversized upload was fully buffered
+before being rejected. Two pieces replace that:
+
+- UploadLimitMiddleware caps the request body of upload routes registered
+  with limit_request_body(). A Content-Length over the cap is rejected with
+  413 before any of the body is read; chunked bodies are counted as they
+  arrive and cut off as soon as they pass it, and the middleware answers
+  413 itself unless the route had already started its response.
+- ingest_to_gridfs() copies an UploadFile into a GridFS bucket
+  UPLOAD_CHUNK_SIZE bytes at a time (default 256KB), hashing as it goes
+  and aborting - deleting the chunks already written - once the file
+  passes its own limit. Memory per upload stays at one chunk whatever the
+  file size.
+"""
+import os
+import re
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Pattern, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(256 * 1024)))
+
+# Multipart boundaries and form fields on top of the files themselves
+MULTIPART_OVERHEAD = 64 * 1024
+
+# (path pattern, max request body bytes), see limit_request_body
+REQUEST_BODY_LIMITS: List[Tuple[Pattern, int]] = []
+
+
+def limit_request_body(path_pattern: str, max_bytes: int):
+    """Cap the request body size of requests whose path matches path_pattern"""
+    REQUEST_BODY_LIMITS.append((re.compile(path_pattern), max_bytes))
+
+
+def format_size(num_bytes: int) -> str:
+    return f"{round(num_bytes / (1024 * 1024), 1):g}MB"
+
+
+def _too_large_detail(max_bytes: int) -> str:
+    return f"Upload exceeds maximum size of {format_size(max_bytes)}"
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware enforcing REQUEST_BODY_LIMITS while the body is received"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+        max_bytes = next(
+            (limit for pattern, limit in REQUEST_BODY_LIMITS if pattern.match(scope["path"])),
+            None
+        )
+        if max_bytes is None:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            logger.warning(f"Rejected upload to {scope['path']}: Content-Length {int(content_length)}")
+            return await self._reject(scope, receive, send, max_bytes)
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            # Once past the limit the rest of the body is not read; the app
+            # sees the client disconnect (and fails parsing the form)
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    logger.warning(f"Rejected upload to {scope['path']} after {received} bytes")
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if too_large and not response_started:
+                # Whatever the app answers to the cut-off body (FastAPI
+                # sends 400 for a form it could not parse) is replaced by 413
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except Exception:
+            if not too_large or response_started:
+                raise
+        if too_large and not response_started:
+            await self._reject(scope, receive, send, max_bytes)
+
+    @staticmethod
+    async def _reject(scope, receive, send, max_bytes: int):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": _too_large_detail(max_bytes)},
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
+
+
+@dataclass
+class IngestedFile:
+    file_id: object
+    size: int
+    md5: str
+
+
+async def ingest_to_gridfs(file: UploadFile, bucket, filename: str, max_bytes: int,
+                           metadata: Optional[dict] = None) -> IngestedFile:
+    """
+    Stream an UploadFile into GridFS chunk by chunk.
+    Raises 413 (after removing anything written) if the file exceeds max_bytes.
+    The MD5 of the content is stored in metadata.etag along with metadata.size.
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File {file.filename} exceeds maximum size of {format_size(max_bytes)}"
+    )
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    metadata = dict(metadata or {})
+    grid_in = bucket.open_upload_stream(filename, metadata=metadata)
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large
+            md5.update(chunk)
+            await grid_in.write(chunk)
+        await grid_in.set("metadata", {**metadata, "etag": md5.hexdigest(), "size": size})
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+    return IngestedFile(file_id=grid_in._id, size=size, md5=md5.hexdigest())
@@ -0,0 +1,139 @@
+"""
+Shared email <-> villa membership resolver.
+
+"Which villas does this email belong to?" is asked by login, invoice listing,
+the pending-invoice badge, invoice downloads, multi-invoice payment and the
+reminder task. The villas collection is small, so the whole membership map is
+held in memory: warmed at startup, updated incrementally by the villa
+endpoints and bulk upload, and fully reloaded every
+VILLA_RESOLVER_REFRESH_SECONDS (default 300) so changes made by other worker
+processes are picked up.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Set
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_email(email: str) -> str:
+    return (email or '').lower().strip()
+
+
+class VillaResolver:
+    """In-memory map of email -> villa numbers (and villa -> emails)"""
+
+    def __init__(self, refresh_seconds: int = 300):
+        self.refresh_seconds = refresh_seconds
+        self._email_to_villas: Dict[str, Set[str]] = {}
+        self._villa_to_emails: Dict[str, List[str]] = {}
+        self._loaded_at = None
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    async def _load(self):
+        db = get_database()
+        villa_to_emails = {}
+        async for villa in db.villas.find({}, {"_id": 0, "villa_number": 1, "emails": 1}):
+            villa_to_emails[villa["villa_number"]] = [
+                normalize_email(e) for e in villa.get("emails") or [] if normalize_email(e)
+            ]
+
+        email_to_villas: Dict[str, Set[str]] = {}
+        for villa_number, emails in villa_to_emails.items():
+            for email in emails:
+                email_to_villas.setdefault(email, set()).add(villa_number)
+
+        self._villa_to_emails = villa_to_emails
+        self._email_to_villas = email_to_villas
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logger.info(f"Villa resolver loaded {len(villa_to_emails)} villas, {len(email_to_villas)} emails")
+
+    async def warm(self):
+        """(Re)load every villa's email list from MongoDB"""
+        async with self._load_lock:
+            await self._load()
+
+    async def _ensure_fresh(self):
+        if not self._is_stale():
+            self.hits += 1
+            return
+        self.misses += 1
+        async with self._load_lock:
+            # Another request may have reloaded while we waited
+            if self._is_stale():
+                await self._load()
+
+    async def villas_for_email(self, email: str) -> List[str]:
+        """Villa numbers the email is associated with (sorted)"""
+        await self._ensure_fresh()
+        return sorted(self._email_to_villas.get(normalize_email(email), ()))
+
+    async def emails_for_villa(self, villa_number: str) -> List[str]:
+        """Email addresses associated with a villa"""
+        await self._ensure_fresh()
+        return list(self._villa_to_emails.get(villa_number, []))
+
+    async def is_villa_member(self, email: str, villa_number: str) -> bool:
+        await self._ensure_fresh()
+        return villa_number in self._email_to_villas.get(normalize_email(email), ())
+
+    # ---- incremental updates from villa writers ----
+
+    def set_villa(self, villa_number: str, emails: Iterable[str]):
+        """Replace a villa's membership after it was created or its emails changed"""
+        self.remove_villa(villa_number)
+        normalized = list(dict.fromkeys(normalize_email(e) for e in emails if normalize_email(e)))
+        self._villa_to_emails[villa_number] = normalized
+        for email in normalized:
+            self._email_to_villas.setdefault(email, set()).add(villa_number)
+
+    def remove_villa(self, villa_number: str):
+        for email in self._villa_to_emails.pop(villa_number, []):
+            villas = self._email_to_villas.get(email)
+            if villas is not None:
+                villas.discard(villa_number)
+                if not villas:
+                    del self._email_to_villas[email]
+
+    def add_email(self, villa_number: str, email: str):
+        emails = self._villa_to_emails.get(villa_number, [])
+        self.set_villa(villa_number, emails + [email])
+
+    def remove_email(self, villa_number: str, email: str):
+        email = normalize_email(email)
+        emails = self._villa_to_emails.get(villa_number, [])
+        self.set_villa(villa_number, [e for e in emails if e != email])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "villas": len(self._villa_to_emails),
+            "emails": len(self._email_to_villas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+# Process-wide resolver instance
+villa_resolver = VillaResolver(
+    refresh_seconds=int(os.getenv('VILLA_RESOLVER_REFRESH_SECONDS', '300'))
+)
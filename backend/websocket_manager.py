@@ -3,147 +3,298 @@ WebSocket Manager for TROA Community Chat
 Handles real-time messaging, typing indicators, and read receipts
 """
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set, Optional
+from typing import Awaitable, Callable, Dict, List, Set, Optional
+import os
 import json
+import time
 import logging
+from collections import deque
 from datetime import datetime, timezone
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+class ClientConnection:
+    """One WebSocket plus its bounded outbound queue and writer task.
+    
+    A connection is authenticated once and may be subscribed to any number
+    of groups. Broadcasts put pre-serialized frames on the queue without
+    waiting for the client; the writer task sends them in order. A client
+    that falls more than the queue size behind (or stalls a single send past
+    the timeout) is disconnected instead of delaying everyone else.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_email: str, user_name: str,
+                 user_picture: Optional[str], queue_size: int):
+        self.websocket = websocket
+        self.user_email = user_email
+        self.user_name = user_name
+        self.user_picture = user_picture
+        self.groups: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+
 class ConnectionManager:
-    """Manages WebSocket connections for chat groups"""
-    
-    def __init__(self):
-        # Structure: {group_id: {user_email: WebSocket}}
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {}
-        # Track user info for each connection
-        self.user_info: Dict[str, Dict[str, dict]] = {}  # {group_id: {user_email: {name, picture}}}
-        # Lock for thread-safe operations
-        self._lock = asyncio.Lock()
-    
-    async def connect(self, websocket: WebSocket, group_id: str, user_email: str, user_name: str, user_picture: Optional[str] = None):
-        """Accept a new WebSocket connection"""
+    """Manages WebSocket connections for chat groups
+    
+    Configuration:
+        WS_SEND_QUEUE_SIZE        frames buffered per connection before it is
+                                  dropped as a slow consumer (default 256)
+        WS_SEND_TIMEOUT_SECONDS   longest a single send may take (default 10)
+    """
+    
+    # Delivery latencies kept for the percentile metrics
+    LATENCY_SAMPLES = 2048
+    
+    def __init__(self, queue_size: int = 256, send_timeout: float = 10.0):
+        # Routing index: {group_id: {user_email: {ClientConnection, ...}}}
+        self.group_connections: Dict[str, Dict[str, Set[ClientConnection]]] = {}
+        # Every open connection per user, whatever it is subscribed to
+        self.user_connections: Dict[str, Set[ClientConnection]] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        # Enqueue -> sent latency (ms) of recent frames
+        self._latencies: deque = deque(maxlen=self.LATENCY_SAMPLES)
+        self.frames_sent = 0
+        self.send_errors = 0
+        self.slow_consumers_dropped = 0
+        self._drop_tasks: Set[asyncio.Task] = set()
+        # Presence (user_joined / user_left) is announced through this so
+        # other workers' sockets see it too; see set_publisher()
+        self._publisher: Optional[Callable[..., Awaitable[None]]] = None
+    
+    def set_publisher(self, publish: Callable[..., Awaitable[None]]):
+        """Route presence announcements through the chat backplane"""
+        self._publisher = publish
+    
+    async def _announce(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
+        publish = self._publisher or self.broadcast_to_group
+        try:
+            await publish(group_id, message, exclude_user=exclude_user)
+        except Exception as e:
+            logger.error(f"Failed to announce {message.get('type')} in group {group_id}: {e}")
+    
+    # ---- connection lifecycle ----
+    
+    async def open(self, websocket: WebSocket, user_email: str, user_name: str,
+                   user_picture: Optional[str] = None) -> ClientConnection:
+        """Accept an authenticated WebSocket (not yet subscribed to any group)"""
         await websocket.accept()
-        
-        async with self._lock:
-            if group_id not in self.active_connections:
-                self.active_connections[group_id] = {}
-                self.user_info[group_id] = {}
-            
-            # Close existing connection for same user in same group (if any)
-            if user_email in self.active_connections[group_id]:
-                try:
-                    await self.active_connections[group_id][user_email].close()
-                except Exception:
-                    pass
-            
-            self.active_connections[group_id][user_email] = websocket
-            self.user_info[group_id][user_email] = {
-                "name": user_name,
-                "picture": user_picture
-            }
-        
-        logger.info(f"WebSocket connected: {user_email} to group {group_id}")
-        
-        # Notify others that user joined
-        await self.broadcast_to_group(group_id, {
-            "type": "user_joined",
-            "user_email": user_email,
-            "user_name": user_name,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }, exclude_user=user_email)
-    
-    async def disconnect(self, group_id: str, user_email: str):
-        """Remove a WebSocket connection"""
-        async with self._lock:
-            if group_id in self.active_connections:
-                if user_email in self.active_connections[group_id]:
-                    del self.active_connections[group_id][user_email]
-                    
-                if user_email in self.user_info.get(group_id, {}):
-                    del self.user_info[group_id][user_email]
-                
-                # Clean up empty groups
-                if not self.active_connections[group_id]:
-                    del self.active_connections[group_id]
-                    if group_id in self.user_info:
-                        del self.user_info[group_id]
-        
-        logger.info(f"WebSocket disconnected: {user_email} from group {group_id}")
-        
-        # Notify others that user left
-        await self.broadcast_to_group(group_id, {
-            "type": "user_left",
-            "user_email": user_email,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        connection = ClientConnection(websocket, user_email, user_name, user_picture, self.queue_size)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.user_connections.setdefault(user_email, set()).add(connection)
+        logger.info(f"WebSocket connected: {user_email}")
+        return connection
     
-    async def broadcast_to_group(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
-        """Broadcast a message to all users in a group"""
-        if group_id not in self.active_connections:
+    async def subscribe(self, connection: ClientConnection, group_id: str):
+        """Start routing a group's broadcasts to the connection"""
+        if connection.closed or group_id in connection.groups:
             return
+        connection.groups.add(group_id)
+        members = self.group_connections.setdefault(group_id, {})
+        first = connection.user_email not in members
+        members.setdefault(connection.user_email, set()).add(connection)
         
-        disconnected = []
-        message_json = json.dumps(message)
+        # Notify others that user joined (only for the user's first socket in the group)
+        if first:
+            await self._announce(group_id, {
+                "type": "user_joined",
+                "user_email": connection.user_email,
+                "user_name": connection.user_name,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }, exclude_user=connection.user_email)
+    
+    async def unsubscribe(self, connection: ClientConnection, group_id: str):
+        """Stop routing a group's broadcasts to the connection"""
+        if group_id not in connection.groups:
+            return
+        connection.groups.discard(group_id)
+        members = self.group_connections.get(group_id, {})
+        sockets = members.get(connection.user_email, set())
+        sockets.discard(connection)
+        last = not sockets
+        if last:
+            members.pop(connection.user_email, None)
+        # Clean up empty groups
+        if not members:
+            self.group_connections.pop(group_id, None)
         
-        for user_email, websocket in self.active_connections[group_id].items():
-            if exclude_user and user_email == exclude_user:
-                continue
+        # Notify others that user left (once their last socket in the group is gone)
+        if last:
+            await self._announce(group_id, {
+                "type": "user_left",
+                "user_email": connection.user_email,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            })
+    
+    async def close(self, connection: ClientConnection, code: int = 1000):
+        """Unsubscribe the connection from every group and close it (idempotent)"""
+        already_closed = connection.closed
+        connection.closed = True
+        for group_id in list(connection.groups):
+            await self.unsubscribe(connection, group_id)
+        sockets = self.user_connections.get(connection.user_email)
+        if sockets is not None and connection in sockets:
+            sockets.discard(connection)
+            if not sockets:
+                del self.user_connections[connection.user_email]
+            logger.info(f"WebSocket disconnected: {connection.user_email}")
+        if already_closed:
+            return
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+    
+    async def connect(self, websocket: WebSocket, group_id: str, user_email: str, user_name: str,
+                      user_picture: Optional[str] = None) -> ClientConnection:
+        """Accept a WebSocket that serves a single group"""
+        connection = await self.open(websocket, user_email, user_name, user_picture)
+        await self.subscribe(connection, group_id)
+        return connection
+    
+    # ---- sending ----
+    
+    async def _writer(self, connection: ClientConnection):
+        """Drain one connection's queue onto its socket"""
+        while True:
+            enqueued_at, frame = await connection.queue.get()
             try:
-                await websocket.send_text(message_json)
+                await asyncio.wait_for(connection.websocket.send_text(frame), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error sending to {user_email}: {e}")
-                disconnected.append(user_email)
-        
-        # Clean up disconnected users
-        for user_email in disconnected:
-            await self.disconnect(group_id, user_email)
+                self.send_errors += 1
+                logger.error(f"Error sending to {connection.user_email}: {e!r}")
+                await self.close(connection)
+                return
+            self.frames_sent += 1
+            self._latencies.append((time.perf_counter() - enqueued_at) * 1000)
     
-    async def send_to_user(self, group_id: str, user_email: str, message: dict):
-        """Send a message to a specific user in a group"""
-        if group_id not in self.active_connections:
-            return False
-        if user_email not in self.active_connections[group_id]:
+    def _enqueue(self, connection: ClientConnection, frame: str) -> bool:
+        if connection.closed:
             return False
-        
         try:
-            await self.active_connections[group_id][user_email].send_text(json.dumps(message))
+            connection.queue.put_nowait((time.perf_counter(), frame))
             return True
-        except Exception as e:
-            logger.error(f"Error sending to {user_email}: {e}")
-            await self.disconnect(group_id, user_email)
+        except asyncio.QueueFull:
+            self.slow_consumers_dropped += 1
+            logger.warning(
+                f"Dropping slow WebSocket consumer {connection.user_email} "
+                f"({connection.queue.qsize()} frames queued)"
+            )
+            # 1013 = try again later; the client reconnects and refetches
+            task = asyncio.create_task(self.close(connection, code=1013))
+            self._drop_tasks.add(task)
+            task.add_done_callback(self._drop_tasks.discard)
             return False
     
+    async def broadcast_to_group(self, group_id: str, message: dict, exclude_user: Optional[str] = None):
+        """Queue a message for every connection subscribed to a group (does not wait for delivery)"""
+        members = self.group_connections.get(group_id)
+        if not members:
+            return
+        
+        # Tag frames with their group so multiplexed clients can route them
+        message_json = json.dumps({**message, "group_id": group_id}, default=str)
+        for user_email, sockets in list(members.items()):
+            if exclude_user and user_email == exclude_user:
+                continue
+            for connection in list(sockets):
+                self._enqueue(connection, message_json)
+    
+    async def send(self, connection: ClientConnection, group_id: Optional[str], message: dict) -> bool:
+        """Queue a message for one connection (tagged with group_id when given)"""
+        if group_id is not None:
+            message = {**message, "group_id": group_id}
+        return self._enqueue(connection, json.dumps(message, default=str))
+    
+    async def send_to_user(self, group_id: str, user_email: str, message: dict) -> bool:
+        """Queue a message for a user's connections subscribed to a group"""
+        sockets = self.group_connections.get(group_id, {}).get(user_email)
+        if not sockets:
+            return False
+        message_json = json.dumps({**message, "group_id": group_id}, default=str)
+        return any([self._enqueue(connection, message_json) for connection in list(sockets)])
+    
+    async def send_to_email(self, user_email: str, message: dict) -> bool:
+        """Queue a message for every connection the user has open"""
+        sockets = self.user_connections.get(user_email)
+        if not sockets:
+            return False
+        message_json = json.dumps(message, default=str)
+        return any([self._enqueue(connection, message_json) for connection in list(sockets)])
+    
+    # ---- presence ----
+    
     def get_online_users(self, group_id: str) -> List[dict]:
         """Get list of online users in a group"""
-        if group_id not in self.active_connections:
-            return []
-        
         online_users = []
-        for user_email in self.active_connections[group_id].keys():
-            user_data = self.user_info.get(group_id, {}).get(user_email, {})
+        for user_email, sockets in self.group_connections.get(group_id, {}).items():
+            connection = next(iter(sockets))
             online_users.append({
                 "email": user_email,
-                "name": user_data.get("name", "Unknown"),
-                "picture": user_data.get("picture")
+                "name": connection.user_name or "Unknown",
+                "picture": connection.user_picture
             })
         return online_users
     
     def is_user_online(self, group_id: str, user_email: str) -> bool:
         """Check if a user is online in a group"""
-        return (group_id in self.active_connections and 
-                user_email in self.active_connections[group_id])
+        return user_email in self.group_connections.get(group_id, {})
+    
+    def online_emails(self) -> List[str]:
+        """Users with at least one open connection on this worker"""
+        return list(self.user_connections.keys())
     
     def get_connection_count(self, group_id: str) -> int:
         """Get number of connections in a group"""
-        if group_id not in self.active_connections:
-            return 0
-        return len(self.active_connections[group_id])
+        return sum(len(sockets) for sockets in self.group_connections.get(group_id, {}).values())
+    
+    def stats(self) -> dict:
+        depths = [
+            connection.queue.qsize()
+            for sockets in self.user_connections.values()
+            for connection in sockets
+        ]
+        latencies = sorted(self._latencies)
+        
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+        
+        return {
+            "groups": len(self.group_connections),
+            "users": len(self.user_connections),
+            "connections": len(depths),
+            "subscriptions": sum(
+                len(sockets) for members in self.group_connections.values() for sockets in members.values()
+            ),
+            "queue_size": self.queue_size,
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "frames_sent": self.frames_sent,
+            "send_errors": self.send_errors,
+            "slow_consumers_dropped": self.slow_consumers_dropped,
+            "delivery_latency_ms": {
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+                "samples": len(latencies),
+            },
+        }
 
 
 # Global WebSocket manager instance
-chat_manager = ConnectionManager()
+chat_manager = ConnectionManager(
+    queue_size=int(os.getenv('WS_SEND_QUEUE_SIZE', '256')),
+    send_timeout=float(os.getenv('WS_SEND_TIMEOUT_SECONDS', '10'))
+)
 
 
 # Message types for WebSocket communication
@@ -160,6 +311,9 @@ class WSMessageType:
     USER_JOINED = "user_joined"
     USER_LEFT = "user_left"
     ONLINE_USERS = "online_users"
+    UNREAD_COUNTS = "unread_counts"
+    SUBSCRIBED = "subscribed"
+    UNSUBSCRIBED = "unsubscribed"
     ERROR = "error"
     
     # Incoming (client -> server)
@@ -171,3 +325,6 @@ class WSMessageType:
     ADD_REACTION = "add_reaction"
     REMOVE_REACTION = "remove_reaction"
     GET_ONLINE_USERS = "get_online_users"
+    GET_UNREAD_COUNTS = "get_unread_counts"
+    SUBSCRIBE = "subscribe"
+    UNSUBSCRIBE = "unsubscribe"
@@ -272,11 +272,16 @@ class ChatAPITester:
             
             if response.status_code == 200:
                 data = response.json()
+                content = requests.get(f"{self.base_url}/chat/attachments/{self.created_attachment_id}/content",
+                                       headers=self.auth_headers,
+                                       timeout=10)
                 if ('id' in data and 
                     'filename' in data and
-                    'data' in data):
+                    'url' in data and
+                    content.status_code == 200 and
+                    len(content.content) == data.get('size')):
                     self.test_results['get_attachment'] = True
-                    self.log_success(f"/chat/attachments/{self.created_attachment_id}", "GET", f"- Retrieved attachment: {data['filename']}")
+                    self.log_success(f"/chat/attachments/{self.created_attachment_id}", "GET", f"- Retrieved attachment: {data['filename']} ({len(content.content)} bytes)")
                 else:
                     self.test_results['get_attachment'] = False
                     self.log_error(f"/chat/attachments/{self.created_attachment_id}", "GET", "Invalid response structure")
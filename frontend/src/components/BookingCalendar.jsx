@@ -8,28 +8,63 @@ const getAPI = () => `${getBackendUrl()}/api`;
 
 const GUEST_CHARGE = 50; // ₹50 per session for external guests and coaches
 
+// Availability bitmaps: bit i is the half-hour slot starting 06:00 + 30*i minutes
+const DAY_START_MINUTES = 6 * 60;
+const SLOT_MINUTES = 30;
+const SLOTS_PER_DAY = 32;
+// Bookings must end by 22:00, the end of the last bitmap slot
+const DAY_END_MINUTES = DAY_START_MINUTES + SLOTS_PER_DAY * SLOT_MINUTES;
+
+const formatMinutes = (minutes) =>
+  `${Math.floor(minutes / 60).toString().padStart(2, '0')}:${(minutes % 60).toString().padStart(2, '0')}`;
+
+const isBooked = (mask, minutes) => {
+  const index = (minutes - DAY_START_MINUTES) / SLOT_MINUTES;
+  return index >= 0 && index < SLOTS_PER_DAY && ((mask >>> index) & 1) === 1;
+};
+
+// Contiguous booked slots as [{ start, end }] "HH:MM" ranges
+const bookedRanges = (mask) => {
+  const ranges = [];
+  for (let index = 0; index < SLOTS_PER_DAY; index++) {
+    if (((mask >>> index) & 1) === 0) continue;
+    const start = DAY_START_MINUTES + index * SLOT_MINUTES;
+    const last = ranges[ranges.length - 1];
+    if (last && last.endMinutes === start) {
+      last.endMinutes = start + SLOT_MINUTES;
+    } else {
+      ranges.push({ startMinutes: start, endMinutes: start + SLOT_MINUTES });
+    }
+  }
+  return ranges.map(({ startMinutes, endMinutes }) => ({
+    start: formatMinutes(startMinutes),
+    end: formatMinutes(endMinutes)
+  }));
+};
+
 const BookingCalendar = ({ amenity, onClose, onBookingCreated }) => {
   const [selectedDate, setSelectedDate] = useState(new Date().toISOString().split('T')[0]);
   const [selectedTime, setSelectedTime] = useState('');
   const [duration, setDuration] = useState(30);
   const [guests, setGuests] = useState([]);
-  const [existingBookings, setExistingBookings] = useState([]);
+  const [bookedMask, setBookedMask] = useState(0);
   const [loading, setLoading] = useState(false);
 
   useEffect(() => {
     if (selectedDate) {
-      fetchBookings();
+      fetchAvailability();
     }
   }, [selectedDate, amenity.id]);
 
-  const fetchBookings = async () => {
+  const fetchAvailability = async () => {
     try {
       const token = localStorage.getItem('session_token');
       
-      const response = await axios.get(`${getAPI()}/bookings`, {
+      const response = await axios.get(`${getAPI()}/availability`, {
         params: {
           amenity_id: amenity.id,
-          date: selectedDate
+          start: selectedDate,
+          days: 1
         },
         withCredentials: true,
         headers: {
@@ -37,9 +72,9 @@ const BookingCalendar = ({ amenity, onClose, onBookingCreated }) => {
         }
       });
       
-      setExistingBookings(response.data);
+      setBookedMask(response.data.booked?.[amenity.id]?.[selectedDate] || 0);
     } catch (error) {
-      console.error('Error fetching bookings:', error);
+      console.error('Error fetching availability:', error);
     }
   };
 
@@ -59,6 +94,10 @@ const BookingCalendar = ({ amenity, onClose, onBookingCreated }) => {
     const slotStart = hours * 60 + minutes;
     const slotEnd = slotStart + duration;
 
+    if (slotEnd > DAY_END_MINUTES) {
+      return false;
+    }
+
     // Check if slot is at least 1 hour in the future
     const now = new Date();
     const selectedDateObj = new Date(selectedDate);
@@ -73,14 +112,12 @@ const BookingCalendar = ({ amenity, onClose, onBookingCreated }) => {
       }
     }
 
-    return !existingBookings.some(booking => {
-      const [bStartH, bStartM] = booking.start_time.split(':').map(Number);
-      const [bEndH, bEndM] = booking.end_time.split(':').map(Number);
-      const bookingStart = bStartH * 60 + bStartM;
-      const bookingEnd = bEndH * 60 + bEndM;
-
-      return (slotStart < bookingEnd && slotEnd > bookingStart);
-    });
+    for (let minutes = slotStart; minutes < slotEnd; minutes += SLOT_MINUTES) {
+      if (isBooked(bookedMask, minutes)) {
+        return false;
+      }
+    }
+    return true;
   };
 
   const isSlotTooSoon = (time) => {
@@ -423,16 +460,16 @@ const BookingCalendar = ({ amenity, onClose, onBookingCreated }) => {
           )}
 
           {/* Existing Bookings Info */}
-          {existingBookings.length > 0 && (
+          {bookedMask !== 0 && (
             <div className="bg-blue-50 border border-blue-200 rounded-lg p-4">
               <div className="flex items-start space-x-2">
                 <AlertCircle className="w-5 h-5 text-blue-600 flex-shrink-0 mt-0.5" />
                 <div>
                   <h4 className="font-semibold text-blue-900">Existing Bookings for {selectedDate}</h4>
                   <ul className="mt-2 space-y-1 text-sm text-blue-800">
-                    {existingBookings.map((booking) => (
-                      <li key={booking.id}>
-                        {booking.start_time} - {booking.end_time} by {booking.booked_by_name}
+                    {bookedRanges(bookedMask).map((range) => (
+                      <li key={range.start}>
+                        {range.start} - {range.end}
                       </li>
                     ))}
                   </ul>
@@ -400,7 +400,7 @@ const EventsManagement = () => {
                   <div className="flex flex-col md:flex-row md:items-center justify-between gap-4">
                     <div className="flex items-center space-x-4">
                       <img
-                        src={getImageUrl(event.image)}
+                        src={getImageUrl(event.image, 160)}
                         alt={event.name}
                         className="w-16 h-16 object-cover rounded-lg"
                       />
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
-import { FileText, Plus, Download, Edit2, X, Search, Calendar, User, CheckCircle, XCircle, Clock, Trash2, History, Home, Tag, Upload, FileSpreadsheet, Hourglass, Check, Ban } from 'lucide-react';
+import { FileText, Plus, Download, Edit2, X, Search, Calendar, User, CheckCircle, XCircle, Clock, Trash2, History, Home, Tag, Upload, FileSpreadsheet, FileArchive, Hourglass, Check, Ban } from 'lucide-react';
 import { toast } from '../hooks/use-toast';
 import { getBackendUrl } from '../utils/api';
 import { useAuth } from '../context/AuthContext';
@@ -64,6 +64,17 @@ const InvoiceManagement = () => {
   const [rejectionReason, setRejectionReason] = useState('');
   const [processing, setProcessing] = useState(false);
 
+  // Month-end PDF export modal
+  const [showExportModal, setShowExportModal] = useState(false);
+  const [exportForm, setExportForm] = useState({
+    month: new Date().getMonth() + 1,
+    year: new Date().getFullYear(),
+    invoice_type: isAccountant ? 'maintenance' : 'clubhouse_subscription',
+    status: ''
+  });
+  const [exporting, setExporting] = useState(false);
+  const [exportProgress, setExportProgress] = useState(null);
+
   // Can create clubhouse invoices
   const canCreateClubhouse = isAdmin || isManager || isClubhouseStaff;
   // Can create maintenance invoices
@@ -334,6 +345,74 @@ const InvoiceManagement = () => {
     }
   };
 
+  const exportInvoicePdfs = async () => {
+    const token = localStorage.getItem('session_token');
+    const headers = { ...(token ? { 'X-Session-Token': `Bearer ${token}` } : {}) };
+    // Chosen here so progress can be polled while the ZIP is still downloading
+    const exportId = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+    setExporting(true);
+    setExportProgress(null);
+    const progressTimer = setInterval(async () => {
+      try {
+        const response = await axios.get(`${getAPI()}/invoices/export/${exportId}`, {
+          withCredentials: true,
+          headers
+        });
+        setExportProgress(response.data);
+      } catch (error) {
+        // Export not started yet
+      }
+    }, 2000);
+
+    try {
+      const response = await axios.get(`${getAPI()}/invoices/export/pdf`, {
+        params: {
+          month: exportForm.month,
+          year: exportForm.year,
+          invoice_type: exportForm.invoice_type,
+          ...(exportForm.status ? { status: exportForm.status } : {}),
+          export_id: exportId
+        },
+        responseType: 'blob',
+        withCredentials: true,
+        headers
+      });
+
+      const kind = exportForm.invoice_type === 'maintenance' ? 'Maintenance' : 'Clubhouse';
+      const url = window.URL.createObjectURL(new Blob([response.data], { type: 'application/zip' }));
+      const link = document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', `TROA_${kind}_Invoices_${exportForm.year}_${String(exportForm.month).padStart(2, '0')}.zip`);
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+
+      toast({
+        title: 'Export Complete',
+        description: `${response.headers['x-export-total'] || ''} invoices exported. See manifest.csv in the ZIP for any that failed.`
+      });
+      setShowExportModal(false);
+    } catch (error) {
+      // Error bodies arrive as a Blob because of responseType
+      let detail = 'Failed to export invoices';
+      try {
+        detail = JSON.parse(await error.response.data.text()).detail || detail;
+      } catch (parseError) {
+        // Keep the generic message
+      }
+      toast({
+        title: 'Error',
+        description: detail,
+        variant: 'destructive'
+      });
+    } finally {
+      clearInterval(progressTimer);
+      setExporting(false);
+      setExportProgress(null);
+    }
+  };
+
   const openEditModal = (invoice) => {
     setEditModal(invoice);
     setEditForm({
@@ -642,6 +721,13 @@ const InvoiceManagement = () => {
               </button>
             </>
           )}
+          <button
+            onClick={() => setShowExportModal(true)}
+            className="flex-1 flex items-center justify-center space-x-2 bg-gradient-to-r from-slate-600 to-gray-700 rounded-lg p-2 text-white text-sm font-medium hover:opacity-90 transition-opacity"
+          >
+            <FileArchive className="w-4 h-4" />
+            <span>Export PDFs</span>
+          </button>
         </div>
       </div>
 
@@ -1309,6 +1395,137 @@ const InvoiceManagement = () => {
         </div>
       )}
 
+      {/* Month-end PDF Export Modal */}
+      {showExportModal && (
+        <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50 p-4">
+          <div className="bg-white rounded-2xl shadow-2xl max-w-md w-full max-h-[90vh] overflow-y-auto">
+            <div className="p-6 border-b bg-gradient-to-r from-slate-50 to-gray-100">
+              <div className="flex items-center justify-between">
+                <h3 className="text-xl font-bold text-gray-900 flex items-center">
+                  <FileArchive className="w-5 h-5 mr-2 text-slate-600" />
+                  Export Invoice PDFs
+                </h3>
+                <button
+                  onClick={() => setShowExportModal(false)}
+                  disabled={exporting}
+                  className="p-2 hover:bg-white/50 rounded-lg disabled:opacity-50"
+                >
+                  <X className="w-5 h-5" />
+                </button>
+              </div>
+            </div>
+
+            <div className="p-6 space-y-4">
+              <p className="text-sm text-gray-600">
+                Downloads every invoice for the month as one ZIP of PDFs, with a manifest.csv listing them.
+              </p>
+
+              <div>
+                <label className="block text-sm font-medium text-gray-700 mb-1">Invoice Type</label>
+                <select
+                  value={exportForm.invoice_type}
+                  onChange={(e) => setExportForm({ ...exportForm, invoice_type: e.target.value })}
+                  disabled={exporting}
+                  className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-slate-500"
+                >
+                  {canCreateClubhouse && <option value="clubhouse_subscription">Clubhouse Subscription</option>}
+                  {canCreateMaintenance && <option value="maintenance">Maintenance</option>}
+                </select>
+              </div>
+
+              <div className="grid grid-cols-2 gap-4">
+                <div>
+                  <label className="block text-sm font-medium text-gray-700 mb-1">
+                    <Calendar className="w-4 h-4 inline mr-1" />
+                    Month
+                  </label>
+                  <select
+                    value={exportForm.month}
+                    onChange={(e) => setExportForm({ ...exportForm, month: parseInt(e.target.value) })}
+                    disabled={exporting}
+                    className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-slate-500"
+                  >
+                    {Array.from({ length: 12 }, (_, i) => (
+                      <option key={i + 1} value={i + 1}>
+                        {new Date(2000, i, 1).toLocaleDateString('en-IN', { month: 'long' })}
+                      </option>
+                    ))}
+                  </select>
+                </div>
+                <div>
+                  <label className="block text-sm font-medium text-gray-700 mb-1">Year</label>
+                  <select
+                    value={exportForm.year}
+                    onChange={(e) => setExportForm({ ...exportForm, year: parseInt(e.target.value) })}
+                    disabled={exporting}
+                    className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-slate-500"
+                  >
+                    {[2024, 2025, 2026].map((year) => (
+                      <option key={year} value={year}>{year}</option>
+                    ))}
+                  </select>
+                </div>
+              </div>
+
+              <div>
+                <label className="block text-sm font-medium text-gray-700 mb-1">Status</label>
+                <select
+                  value={exportForm.status}
+                  onChange={(e) => setExportForm({ ...exportForm, status: e.target.value })}
+                  disabled={exporting}
+                  className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-slate-500"
+                >
+                  <option value="">All</option>
+                  <option value="pending">Pending</option>
+                  <option value="paid">Paid</option>
+                  <option value="cancelled">Cancelled</option>
+                </select>
+              </div>
+
+              {exporting && (
+                <div className="space-y-2">
+                  <div className="w-full bg-gray-200 rounded-full h-2">
+                    <div
+                      className="bg-slate-600 h-2 rounded-full transition-all"
+                      style={{ width: `${exportProgress?.total ? Math.round((exportProgress.done / exportProgress.total) * 100) : 0}%` }}
+                    ></div>
+                  </div>
+                  <p className="text-sm text-gray-600 text-center">
+                    {exportProgress
+                      ? `Rendered ${exportProgress.done} of ${exportProgress.total} invoices${exportProgress.failed ? ` (${exportProgress.failed} failed)` : ''}`
+                      : 'Starting export...'}
+                  </p>
+                </div>
+              )}
+
+              <div className="flex space-x-3 pt-2">
+                <button
+                  onClick={() => setShowExportModal(false)}
+                  disabled={exporting}
+                  className="flex-1 px-4 py-2 bg-gray-200 text-gray-700 rounded-lg font-medium hover:bg-gray-300 disabled:opacity-50"
+                >
+                  Cancel
+                </button>
+                <button
+                  onClick={exportInvoicePdfs}
+                  disabled={exporting}
+                  className="flex-1 px-4 py-2 bg-slate-700 text-white rounded-lg font-medium hover:bg-slate-800 disabled:opacity-50 flex items-center justify-center space-x-2"
+                >
+                  {exporting ? (
+                    <div className="animate-spin rounded-full h-4 w-4 border-2 border-white border-t-transparent"></div>
+                  ) : (
+                    <>
+                      <Download className="w-4 h-4" />
+                      <span>Export</span>
+                    </>
+                  )}
+                </button>
+              </div>
+            </div>
+          </div>
+        </div>
+      )}
+
       {/* Bulk Upload Modal */}
       {showBulkUploadModal && (
         <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50 p-4">
@@ -1412,7 +1629,7 @@ const InvoiceManagement = () => {
                       {uploadResult.email_notifications && (
                         <div className="text-sm text-gray-600">
                           <p>
-                            📧 Emails sent: {uploadResult.email_notifications.sent} 
+                            📧 Emails queued: {uploadResult.email_notifications.queued} 
                             {uploadResult.email_notifications.failed > 0 && (
                               <span className="text-red-600"> (Failed: {uploadResult.email_notifications.failed})</span>
                             )}
@@ -6,7 +6,7 @@ import { useAuth } from '../context/AuthContext';
 import { toast } from '../hooks/use-toast';
 import { Toaster } from '../components/ui/toaster';
 import BookingCalendar from '../components/BookingCalendar';
-import { getImageUrl, getBackendUrl } from '../utils/api';
+import { getImageUrl, getImageSrcSet, getBackendUrl } from '../utils/api';
 
 const getAPI = () => `${getBackendUrl()}/api`;
 
@@ -367,7 +367,9 @@ const Amenities = () => {
                     <div className="relative h-64 overflow-hidden">
                       <div className="absolute inset-0 bg-gradient-to-br from-purple-500/20 via-pink-500/20 to-orange-500/20 z-10 group-hover:opacity-0 transition-opacity duration-300"></div>
                       <img
-                        src={getImageUrl(amenity.image)}
+                        src={getImageUrl(amenity.image, 640)}
+                        srcSet={getImageSrcSet(amenity.image)}
+                        sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                         alt={amenity.name}
                         className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-500"
                       />
@@ -5,7 +5,7 @@ import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
 import { toast } from '../hooks/use-toast';
 import { Toaster } from '../components/ui/toaster';
-import { getImageUrl, getBackendUrl } from '../utils/api';
+import { getImageUrl, getImageSrcSet, getBackendUrl } from '../utils/api';
 
 const getAPI = () => `${getBackendUrl()}/api`;
 
@@ -412,7 +412,9 @@ const Committee = () => {
                     <div className="relative h-80 overflow-hidden">
                       <div className="absolute inset-0 bg-gradient-to-br from-purple-500/20 via-pink-500/20 to-orange-500/20 z-10"></div>
                       <img
-                        src={getImageUrl(member.image)}
+                        src={getImageUrl(member.image, 640)}
+                        srcSet={getImageSrcSet(member.image)}
+                        sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                         alt={member.name}
                         className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-500"
                       />
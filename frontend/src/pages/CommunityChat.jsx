@@ -52,6 +52,7 @@ const ALLOWED_DOC_TYPES = ['application/pdf', 'application/msword',
   'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
   'text/plain'];
 const MAX_FILE_SIZE = 5 * 1024 * 1024; // 5MB
+const TYPING_HEARTBEAT_MS = 2000; // Re-send start typing while typing (server expires after 5s)
 
 // Message Status Component
 const MessageStatus = ({ status, isOwnMessage }) => {
@@ -110,6 +111,32 @@ const ConfirmDialog = ({ isOpen, onClose, onConfirm, title, message, confirmText
   );
 };
 
+// Widths of the resized image variants requested for thumbnails and previews
+const THUMBNAIL_WIDTH = 320;
+const PREVIEW_WIDTH = 1280;
+
+// Fetch an attachment's bytes as a Blob (cached in IndexedDB); with a width,
+// an image's resized variant instead of the original
+const fetchAttachmentBlob = async (attachmentId, token, width) => {
+  const cacheKey = width ? `${attachmentId}:w${width}` : attachmentId;
+  const cachedData = await getCachedAttachment(cacheKey);
+  if (cachedData && cachedData.blob) {
+    return cachedData.blob;
+  }
+  
+  const sessionToken = localStorage.getItem('session_token');
+  const response = await axios.get(`${getAPI()}/chat/attachments/${attachmentId}/content`, {
+    responseType: 'blob',
+    params: width ? { w: width } : undefined,
+    headers: { 
+      Authorization: `Bearer ${token}`,
+      ...(sessionToken ? { 'X-Session-Token': `Bearer ${sessionToken}` } : {})
+    }
+  });
+  await cacheAttachment(cacheKey, { blob: response.data });
+  return response.data;
+};
+
 // Image Thumbnail Component - Shows small preview with click to expand (with caching)
 const ImageThumbnail = ({ attachment, isOwnMessage, onPreview, token }) => {
   const [thumbnailData, setThumbnailData] = useState(null);
@@ -124,40 +151,27 @@ const ImageThumbnail = ({ attachment, isOwnMessage, onPreview, token }) => {
     }
     
     // Load thumbnail data with caching
+    let objectUrl = null;
+    let cancelled = false;
     const loadThumbnail = async () => {
       try {
-        // Check cache first
-        const cachedData = await getCachedAttachment(attachment.id);
-        if (cachedData && cachedData.data) {
-          setThumbnailData(cachedData);
-          setLoading(false);
-          return;
-        }
-        
-        // Fetch from server
-        const sessionToken = localStorage.getItem('session_token');
-        const response = await axios.get(`${getAPI()}/chat/attachments/${attachment.id}`, {
-          headers: { 
-            Authorization: `Bearer ${token}`,
-            ...(sessionToken ? { 'X-Session-Token': `Bearer ${sessionToken}` } : {})
-          }
-        });
-        if (response.data && response.data.data) {
-          setThumbnailData(response.data);
-          // Cache the attachment for future use
-          await cacheAttachment(attachment.id, response.data);
-        } else {
-          setError(true);
-        }
+        const blob = await fetchAttachmentBlob(attachment.id, token, THUMBNAIL_WIDTH);
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(blob);
+        setThumbnailData({ url: objectUrl });
       } catch (error) {
         console.error('Error loading thumbnail:', error);
-        setError(true);
+        if (!cancelled) setError(true);
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
     
     loadThumbnail();
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
   }, [attachment.id, token]);
   
   if (loading) {
@@ -190,7 +204,7 @@ const ImageThumbnail = ({ attachment, isOwnMessage, onPreview, token }) => {
       style={{ maxWidth: '150px' }}
     >
       <img 
-        src={`data:${thumbnailData.content_type};base64,${thumbnailData.data}`}
+        src={thumbnailData.url}
         alt={attachment.filename}
         className="w-full h-auto max-h-[100px] object-cover rounded-lg"
       />
@@ -234,6 +248,7 @@ const CommunityChat = () => {
   const [latestMessageTimes, setLatestMessageTimes] = useState({}); // {groupId: timestamp}
   const [isTyping, setIsTyping] = useState(false); // Current user typing status
   const typingTimeoutRef = useRef(null);
+  const typingSentAtRef = useRef(0); // When start typing was last sent (heartbeat)
   const typingPollRef = useRef(null);
   
   // WebSocket state
@@ -245,6 +260,7 @@ const CommunityChat = () => {
   const messagesEndRef = useRef(null);
   const messagesContainerRef = useRef(null);
   const pollIntervalRef = useRef(null);
+  const selectedGroupIdRef = useRef(null);
   const groupIdFromUrl = searchParams.get('group');
   const initialLoadRef = useRef(true);
   const messageRefs = useRef({}); // To store refs for scrolling to replied messages
@@ -261,9 +277,10 @@ const CommunityChat = () => {
   }, [isAuthenticated, token]);
 
   // Poll for unread counts every 10 seconds when on group list
+  // (the WebSocket pushes them while it is connected)
   useEffect(() => {
     let unreadPollInterval;
-    if (isAuthenticated && token && !selectedGroup) {
+    if (isAuthenticated && token && !selectedGroup && !wsConnected) {
       unreadPollInterval = setInterval(() => {
         fetchUnreadCounts();
       }, 10000);
@@ -272,10 +289,51 @@ const CommunityChat = () => {
       if (unreadPollInterval) clearInterval(unreadPollInterval);
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [isAuthenticated, token, selectedGroup]);
+  }, [isAuthenticated, token, selectedGroup, wsConnected]);
+
+  // One WebSocket for the whole chat page; groups are subscribed on it below
+  useEffect(() => {
+    if (!isAuthenticated || !token) return;
+    
+    const unsubscribers = [];
+    
+    unsubscribers.push(chatWebSocket.on('connected', () => {
+      console.log('[Chat] WebSocket connected');
+      setWsConnected(true);
+    }));
+    
+    unsubscribers.push(chatWebSocket.on('disconnected', () => {
+      console.log('[Chat] WebSocket disconnected');
+      setWsConnected(false);
+    }));
+    
+    unsubscribers.push(chatWebSocket.on('fallbackToPolling', () => {
+      setWsConnected(false);
+    }));
+    
+    unsubscribers.push(chatWebSocket.on('unreadCounts', ({ unreadCounts, latestMessageTimes }) => {
+      // Server pushes unread counts over the socket, so no polling is needed while connected
+      const openGroupId = selectedGroupIdRef.current;
+      setUnreadCounts(openGroupId ? { ...(unreadCounts || {}), [openGroupId]: 0 } : (unreadCounts || {}));
+      setLatestMessageTimes(latestMessageTimes || {});
+    }));
+    
+    // Get session token for WebSocket authentication
+    const sessionToken = localStorage.getItem('session_token');
+    chatWebSocket.connect(sessionToken || token);
+    
+    return () => {
+      unsubscribers.forEach(unsubscribe => unsubscribe());
+      chatWebSocket.disconnect();
+      setWsConnected(false);
+    };
+  }, [isAuthenticated, token]);
 
-  // WebSocket connection and message handling
+  // Group subscription and message handling
   useEffect(() => {
+    selectedGroupIdRef.current = selectedGroup?.id || null;
+    const unsubscribers = [];
+    
     if (selectedGroup && isAuthenticated && token) {
       initialLoadRef.current = true;
       setHasMoreMessages(true);
@@ -293,11 +351,7 @@ const CommunityChat = () => {
       const wsToken = sessionToken || token;
       
       // Set up WebSocket event listeners
-      const unsubscribers = [];
-      
       unsubscribers.push(chatWebSocket.on('connected', () => {
-        console.log('[Chat] WebSocket connected');
-        setWsConnected(true);
         setUsePollingFallback(false);
         // Stop polling if running
         if (pollIntervalRef.current) {
@@ -310,14 +364,8 @@ const CommunityChat = () => {
         }
       }));
       
-      unsubscribers.push(chatWebSocket.on('disconnected', () => {
-        console.log('[Chat] WebSocket disconnected');
-        setWsConnected(false);
-      }));
-      
       unsubscribers.push(chatWebSocket.on('fallbackToPolling', () => {
         console.log('[Chat] Falling back to HTTP polling');
-        setWsConnected(false);
         setUsePollingFallback(true);
         startPolling();
       }));
@@ -369,9 +417,10 @@ const CommunityChat = () => {
       
       unsubscribers.push(chatWebSocket.on('readReceipt', ({ userEmail, messageIds }) => {
         console.log('[Chat] Read receipt received via WebSocket');
+        // Readers only send receipts for messages they had not read yet
         setMessages(prev => prev.map(m => {
-          if (messageIds.includes(m.id) && !m.read_by?.includes(userEmail)) {
-            return { ...m, read_by: [...(m.read_by || []), userEmail] };
+          if (messageIds.includes(m.id) && m.sender_email !== userEmail) {
+            return { ...m, read_count: (m.read_count || 0) + 1 };
           }
           return m;
         }));
@@ -404,15 +453,23 @@ const CommunityChat = () => {
         setTypingUsers(prev => prev.filter(u => u.email !== userEmail));
       }));
       
-      // Connect to WebSocket
-      chatWebSocket.connect(selectedGroup.id, wsToken);
+      // Subscribe to the group (reconnects first if the socket gave up)
+      chatWebSocket.connect(wsToken);
+      chatWebSocket.subscribe(selectedGroup.id);
     }
     
     return () => {
-      // Cleanup WebSocket connection
-      chatWebSocket.disconnect();
-      chatWebSocket.removeAllListeners();
-      setWsConnected(false);
+      // Clear typing status when leaving group (while still subscribed)
+      if (selectedGroup && isTyping) {
+        updateTypingStatus(selectedGroup.id, false);
+      }
+      setTypingUsers([]);
+      
+      // Stop receiving this group's events; the socket stays open
+      unsubscribers.forEach(unsubscribe => unsubscribe());
+      if (selectedGroup) {
+        chatWebSocket.unsubscribe(selectedGroup.id);
+      }
       setOnlineUsers([]);
       
       // Cleanup polling
@@ -424,12 +481,6 @@ const CommunityChat = () => {
         clearInterval(typingPollRef.current);
         typingPollRef.current = null;
       }
-      
-      // Clear typing status when leaving group
-      if (selectedGroup && isTyping) {
-        updateTypingStatus(selectedGroup.id, false);
-      }
-      setTypingUsers([]);
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [selectedGroup, isAuthenticated, token]);
@@ -643,10 +694,13 @@ const CommunityChat = () => {
       // Also send read receipts via WebSocket if connected
       if (wsConnected && chatWebSocket.connected && messages.length > 0) {
         const unreadMessageIds = messages
-          .filter(m => m.sender_email !== user?.email && !m.read_by?.includes(user?.email))
+          .filter(m => m.sender_email !== user?.email && !m.read_by_me)
           .map(m => m.id);
         if (unreadMessageIds.length > 0) {
           chatWebSocket.markRead(unreadMessageIds);
+          setMessages(prev => prev.map(m =>
+            unreadMessageIds.includes(m.id) ? { ...m, read_by_me: true } : m
+          ));
         }
       }
     } catch (error) {
@@ -698,8 +752,10 @@ const CommunityChat = () => {
   const handleTyping = () => {
     if (!selectedGroup) return;
     
-    // Send typing status
-    if (!isTyping) {
+    // Send typing status, repeating it while the user keeps typing; the
+    // server coalesces repeats and expires indicators that stop refreshing
+    if (!isTyping || Date.now() - typingSentAtRef.current > TYPING_HEARTBEAT_MS) {
+      typingSentAtRef.current = Date.now();
       updateTypingStatus(selectedGroup.id, true);
     }
     
@@ -949,7 +1005,8 @@ const CommunityChat = () => {
         size: f.size
       })),
       status: 'sending',
-      read_by: [],
+      read_count: 0,
+      read_by_me: true,
       reactions: [],
       reply_to: replyingTo ? {
         message_id: replyingTo.id,
@@ -1195,16 +1252,9 @@ const CommunityChat = () => {
     });
   };
 
-  const fetchAttachment = async (attachmentId) => {
+  const fetchAttachment = async (attachmentId, width) => {
     try {
-      const sessionToken = localStorage.getItem('session_token');
-      const response = await axios.get(`${getAPI()}/chat/attachments/${attachmentId}`, {
-        headers: { 
-          Authorization: `Bearer ${token}`,
-          ...(sessionToken ? { 'X-Session-Token': `Bearer ${sessionToken}` } : {})
-        }
-      });
-      return response.data;
+      return await fetchAttachmentBlob(attachmentId, token, width);
     } catch (error) {
       console.error('Error fetching attachment:', error);
       toast({ title: 'Error', description: 'Failed to load attachment', variant: 'destructive' });
@@ -1213,33 +1263,31 @@ const CommunityChat = () => {
   };
 
   const handleImagePreview = async (attachment) => {
-    const data = await fetchAttachment(attachment.id);
-    if (data && data.data) {
+    const blob = await fetchAttachment(attachment.id, PREVIEW_WIDTH);
+    if (blob) {
       setPreviewImage({
         ...attachment,
-        ...data
+        url: URL.createObjectURL(blob)
       });
     }
   };
 
+  // Release the preview's object URL when it is closed or replaced
+  useEffect(() => {
+    return () => {
+      if (previewImage?.url) URL.revokeObjectURL(previewImage.url);
+    };
+  }, [previewImage]);
+
   const handleDownload = async (attachment) => {
     try {
-      const data = await fetchAttachment(attachment.id);
-      if (data && data.data) {
-        // Create blob from base64
-        const byteCharacters = atob(data.data);
-        const byteNumbers = new Array(byteCharacters.length);
-        for (let i = 0; i < byteCharacters.length; i++) {
-          byteNumbers[i] = byteCharacters.charCodeAt(i);
-        }
-        const byteArray = new Uint8Array(byteNumbers);
-        const blob = new Blob([byteArray], { type: data.content_type });
-        
+      const blob = await fetchAttachment(attachment.id);
+      if (blob) {
         // Create download link
         const url = URL.createObjectURL(blob);
         const link = document.createElement('a');
         link.href = url;
-        link.download = data.filename;
+        link.download = attachment.filename;
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
@@ -1264,11 +1312,9 @@ const CommunityChat = () => {
   // Get message read status
   const getMessageStatus = (message, groupMembers) => {
     if (message.status === 'sending') return 'sending';
-    if (!message.read_by || message.read_by.length === 0) return 'sent';
     // If at least one other member has read it
-    const otherReaders = message.read_by.filter(email => email !== message.sender_email);
-    if (otherReaders.length > 0) return 'read';
-    return 'delivered';
+    if (message.read_count > 0) return 'read';
+    return 'sent';
   };
 
   // Not authenticated view
@@ -1822,7 +1868,7 @@ const CommunityChat = () => {
               {/* Image */}
               <div className="flex items-center justify-center bg-gray-100 p-2" style={{ maxHeight: '480px' }}>
                 <img 
-                  src={`data:${previewImage.content_type};base64,${previewImage.data}`}
+                  src={previewImage.url}
                   alt={previewImage.filename}
                   className="max-w-full max-h-[460px] object-contain rounded"
                 />
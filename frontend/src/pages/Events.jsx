@@ -4,7 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '../hooks/use-toast';
 import { Toaster } from '../components/ui/toaster';
-import { getImageUrl, getBackendUrl } from '../utils/api';
+import { getImageUrl, getImageSrcSet, getBackendUrl } from '../utils/api';
 import {
   Calendar,
   Clock,
@@ -476,7 +476,9 @@ const Events = () => {
                   <div className="relative h-48 overflow-hidden">
                     <div className="absolute inset-0 bg-gradient-to-br from-purple-500/20 via-pink-500/20 to-orange-500/20 z-10 group-hover:opacity-0 transition-opacity duration-300"></div>
                     <img
-                      src={getImageUrl(event.image) || '/placeholder-event.jpg'}
+                      src={getImageUrl(event.image, 640) || '/placeholder-event.jpg'}
+                      srcSet={getImageSrcSet(event.image)}
+                      sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                       alt={event.name}
                       className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-500"
                     />
@@ -887,7 +889,7 @@ const Events = () => {
               <div className="bg-purple-50 rounded-lg p-4">
                 <div className="flex items-center space-x-4">
                   <img
-                    src={getImageUrl(selectedEvent.image)}
+                    src={getImageUrl(selectedEvent.image, 160)}
                     alt={selectedEvent.name}
                     className="w-20 h-20 object-cover rounded-lg"
                   />
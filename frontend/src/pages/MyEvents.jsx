@@ -421,7 +421,7 @@ const MyEvents = () => {
                   {reg.event && (
                     <div className="md:w-48 h-48 md:h-auto flex-shrink-0">
                       <img
-                        src={getImageUrl(reg.event.image)}
+                        src={getImageUrl(reg.event.image, 320)}
                         alt={reg.event_name}
                         className="w-full h-full object-cover"
                       />
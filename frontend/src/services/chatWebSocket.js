@@ -16,6 +16,9 @@ export const WSMessageType = {
   ADD_REACTION: 'add_reaction',
   REMOVE_REACTION: 'remove_reaction',
   GET_ONLINE_USERS: 'get_online_users',
+  GET_UNREAD_COUNTS: 'get_unread_counts',
+  SUBSCRIBE: 'subscribe',
+  UNSUBSCRIBE: 'unsubscribe',
   
   // Incoming (server -> client)
   NEW_MESSAGE: 'new_message',
@@ -29,6 +32,9 @@ export const WSMessageType = {
   USER_JOINED: 'user_joined',
   USER_LEFT: 'user_left',
   ONLINE_USERS: 'online_users',
+  UNREAD_COUNTS: 'unread_counts',
+  SUBSCRIBED: 'subscribed',
+  UNSUBSCRIBED: 'unsubscribed',
   ERROR: 'error'
 };
 
@@ -51,34 +57,34 @@ class ChatWebSocketService {
   /**
    * Get WebSocket URL based on current environment
    */
-  getWebSocketUrl(groupId, token) {
+  getWebSocketUrl(token) {
     const backendUrl = getBackendUrl();
     // Convert HTTP(S) to WS(S)
     const wsProtocol = backendUrl.startsWith('https') ? 'wss' : 'ws';
     const wsHost = backendUrl.replace(/^https?:\/\//, '');
-    return `${wsProtocol}://${wsHost}/api/chat/ws/${groupId}?token=${encodeURIComponent(token)}`;
+    return `${wsProtocol}://${wsHost}/api/chat/ws?token=${encodeURIComponent(token)}`;
   }
 
   /**
-   * Connect to WebSocket for a specific group
+   * Open the user's chat WebSocket (one socket for every group)
    */
-  connect(groupId, token) {
+  connect(token) {
     if (this.isConnecting) {
       console.log('[WS] Already connecting, skipping...');
       return;
     }
-
-    // Disconnect from previous group if any
-    if (this.ws && this.groupId !== groupId) {
-      this.disconnect();
+    if (this.connected && this.token === token) {
+      return;
+    }
+    if (this.ws) {
+      this.close();
     }
 
-    this.groupId = groupId;
     this.token = token;
     this.shouldReconnect = true;
     this.isConnecting = true;
 
-    const url = this.getWebSocketUrl(groupId, token);
+    const url = this.getWebSocketUrl(token);
     console.log('[WS] Connecting to:', url.replace(token, '***'));
 
     try {
@@ -99,7 +105,12 @@ class ChatWebSocketService {
         this.isConnected = true;
         this.isConnecting = false;
         this.reconnectAttempts = 0;
-        this.emit('connected', { groupId });
+        this.emit('connected', {});
+        
+        // Restore the group subscription after (re)connecting
+        if (this.groupId) {
+          this.send(WSMessageType.SUBSCRIBE, { group_id: this.groupId });
+        }
         
         // Start ping interval to keep connection alive
         this.startPingInterval();
@@ -134,16 +145,6 @@ class ChatWebSocketService {
           this.emit('authError', { message: 'Invalid or expired token' });
           return;
         }
-        if (event.code === 4003) {
-          console.log('[WS] Not a member, not reconnecting');
-          this.emit('accessDenied', { message: 'Not a member of this group' });
-          return;
-        }
-        if (event.code === 4004) {
-          console.log('[WS] Group not found, not reconnecting');
-          this.emit('groupNotFound', { message: 'Group not found' });
-          return;
-        }
 
         // Attempt reconnection for other close codes
         if (this.shouldReconnect) {
@@ -163,6 +164,12 @@ class ChatWebSocketService {
   handleMessage(data) {
     const { type } = data;
     
+    // Only the selected group is subscribed; ignore stragglers from a group
+    // that was just unsubscribed
+    if (data.group_id && data.group_id !== this.groupId) {
+      return;
+    }
+    
     switch (type) {
       case WSMessageType.NEW_MESSAGE:
         this.emit('newMessage', data.message);
@@ -183,7 +190,8 @@ class ChatWebSocketService {
         this.emit('readReceipt', { 
           userEmail: data.user_email,
           userName: data.user_name,
-          messageIds: data.message_ids 
+          messageIds: data.message_ids,
+          readAt: data.read_at
         });
         break;
       case WSMessageType.REACTION_ADDED:
@@ -204,7 +212,23 @@ class ChatWebSocketService {
       case WSMessageType.USER_LEFT:
         this.emit('userLeft', { userEmail: data.user_email });
         break;
+      case WSMessageType.UNREAD_COUNTS:
+        this.emit('unreadCounts', {
+          unreadCounts: data.unread_counts,
+          latestMessageTimes: data.latest_message_times
+        });
+        break;
+      case WSMessageType.SUBSCRIBED:
+        this.emit('subscribed', { groupId: data.group_id });
+        break;
+      case WSMessageType.UNSUBSCRIBED:
+        break;
       case WSMessageType.ERROR:
+        if (data.code === 4003) {
+          this.emit('accessDenied', { message: data.error });
+        } else if (data.code === 4004) {
+          this.emit('groupNotFound', { message: data.error });
+        }
         this.emit('serverError', { error: data.error });
         break;
       default:
@@ -222,7 +246,8 @@ class ChatWebSocketService {
     }
 
     try {
-      this.ws.send(JSON.stringify({ type, ...payload }));
+      // Frames are addressed to the selected group unless the payload says otherwise
+      this.ws.send(JSON.stringify({ type, group_id: this.groupId, ...payload }));
       return true;
     } catch (error) {
       console.error('[WS] Error sending message:', error);
@@ -230,6 +255,32 @@ class ChatWebSocketService {
     }
   }
 
+  /**
+   * Route a group's events to this client (replaces the previous group)
+   */
+  subscribe(groupId) {
+    if (this.groupId && this.groupId !== groupId) {
+      this.unsubscribe(this.groupId);
+    }
+    this.groupId = groupId;
+    // Sent on connect if the socket is not open yet
+    if (this.connected) {
+      this.send(WSMessageType.SUBSCRIBE, { group_id: groupId });
+    }
+  }
+
+  /**
+   * Stop receiving a group's events
+   */
+  unsubscribe(groupId) {
+    if (this.connected) {
+      this.send(WSMessageType.UNSUBSCRIBE, { group_id: groupId });
+    }
+    if (this.groupId === groupId) {
+      this.groupId = null;
+    }
+  }
+
   /**
    * Send a chat message
    */
@@ -279,6 +330,13 @@ class ChatWebSocketService {
     return this.send(WSMessageType.GET_ONLINE_USERS);
   }
 
+  /**
+   * Request unread counts for all groups
+   */
+  getUnreadCounts() {
+    return this.send(WSMessageType.GET_UNREAD_COUNTS);
+  }
+
   /**
    * Schedule reconnection attempt
    */
@@ -293,9 +351,9 @@ class ChatWebSocketService {
     console.log(`[WS] Scheduling reconnection attempt ${this.reconnectAttempts + 1} in ${delay}ms`);
     
     setTimeout(() => {
-      if (this.shouldReconnect && this.groupId && this.token) {
+      if (this.shouldReconnect && this.token) {
         this.reconnectAttempts++;
-        this.connect(this.groupId, this.token);
+        this.connect(this.token);
       }
     }, delay);
   }
@@ -319,7 +377,12 @@ class ChatWebSocketService {
     // Send a ping every 30 seconds to keep connection alive
     this.pingInterval = setInterval(() => {
       if (this.isConnected && this.ws?.readyState === WebSocket.OPEN) {
-        this.getOnlineUsers(); // Use as a ping
+        // Use as a ping
+        if (this.groupId) {
+          this.getOnlineUsers();
+        } else {
+          this.getUnreadCounts();
+        }
       }
     }, 30000);
   }
@@ -340,17 +403,26 @@ class ChatWebSocketService {
   disconnect() {
     console.log('[WS] Disconnecting...');
     this.shouldReconnect = false;
+    this.close();
+    this.groupId = null;
+  }
+
+  /**
+   * Close the current socket without clearing the subscription
+   */
+  close() {
     this.stopPingInterval();
     clearTimeout(this.connectionTimeout);
     
     if (this.ws) {
+      // Detach handlers so the old socket's close does not schedule a reconnect
+      this.ws.onclose = null;
       this.ws.close(1000, 'User disconnected');
       this.ws = null;
     }
     
     this.isConnected = false;
     this.isConnecting = false;
-    this.groupId = null;
   }
 
   /**
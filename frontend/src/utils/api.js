@@ -17,8 +17,29 @@ export const BACKEND_URL = getBackendUrl();
 export const getApiBase = () => `${getBackendUrl()}/api`;
 export const API = getApiBase();
 
-// Helper function to get full image URL
-export const getImageUrl = (imagePath) => {
+// Widths the backend stores resized variants of uploaded images at
+// (IMAGE_VARIANT_WIDTHS in backend/image_variants.py)
+export const IMAGE_VARIANT_WIDTHS = [160, 320, 640, 1280];
+
+const isUploadedImage = (url) => url.includes('/api/upload/image/');
+
+// Helper function to get full image URL; with a width, the URL of the
+// smallest stored variant at least that wide
+export const getImageUrl = (imagePath, width) => {
+  const url = resolveImageUrl(imagePath);
+  if (!width || !url || !isUploadedImage(url)) return url;
+  return `${url}${url.includes('?') ? '&' : '?'}w=${width}`;
+};
+
+// srcSet listing the stored variants so the browser picks one for the
+// rendered size (undefined for images not served by the upload API)
+export const getImageSrcSet = (imagePath) => {
+  const url = resolveImageUrl(imagePath);
+  if (!url || !isUploadedImage(url)) return undefined;
+  return IMAGE_VARIANT_WIDTHS.map(width => `${getImageUrl(imagePath, width)} ${width}w`).join(', ');
+};
+
+const resolveImageUrl = (imagePath) => {
   if (!imagePath) return '';
   
   // If it's a full URL, check if it needs hostname replacement
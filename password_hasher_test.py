@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Password Hasher Queue Testing
+Checks that PasswordHasher releases queue slots of hashes whose callers
+were cancelled while waiting for a thread, and still rejects with 503
+once the queue is really full.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).resolve().parent / 'backend'))
+
+from fastapi import HTTPException
+from password_hasher import PasswordHasher
+
+
+class PasswordHasherQueueTester:
+    def __init__(self):
+        self.hasher = PasswordHasher(max_workers=1, max_queue=5)
+
+    async def _wait_until_idle(self):
+        for _ in range(200):
+            stats = self.hasher.stats()
+            if stats['queue_depth'] == 0 and stats['running'] == 0:
+                return
+            await asyncio.sleep(0.05)
+
+    async def _cancel_queued_hashes(self):
+        # One hash occupies the only thread, the rest wait for it
+        tasks = [asyncio.create_task(self.hasher.hash_password(f"password-{i}")) for i in range(5)]
+        await asyncio.sleep(0.01)
+        for task in tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._wait_until_idle()
+
+    def test_cancelled_hashes_release_queue(self):
+        """Test queue_depth returns to 0 after queued hashes are cancelled"""
+        print("\n🧪 Testing cancellation of queued hashes...")
+
+        async def run():
+            for _ in range(3):
+                await self._cancel_queued_hashes()
+            return self.hasher.stats()
+
+        stats = asyncio.run(run())
+        if stats['queue_depth'] == 0 and stats['running'] == 0:
+            print(f"✅ Queue drained after cancellations: {stats}")
+            return True
+        print(f"❌ Queue slots leaked: {stats}")
+        return False
+
+    def test_hashing_after_cancellations(self):
+        """Test hashes are accepted and verified after a burst of cancellations"""
+        print("\n🧪 Testing hashing after cancellations...")
+
+        async def run():
+            await self._cancel_queued_hashes()
+            hashes = await asyncio.gather(*[self.hasher.hash_password("secret") for _ in range(5)])
+            return all([await self.hasher.verify_password("secret", hashed) for hashed in hashes])
+
+        try:
+            verified = asyncio.run(run())
+        except HTTPException as e:
+            print(f"❌ Hash rejected after cancellations: {e.status_code} - {e.detail}")
+            return False
+        if verified:
+            print("✅ Full queue of hashes accepted and verified")
+            return True
+        print("❌ Hashes did not verify")
+        return False
+
+    def test_full_queue_rejected(self):
+        """Test a hash is rejected with 503 once max_queue hashes are waiting"""
+        print("\n🧪 Testing rejection when the queue is full...")
+
+        async def run():
+            # Fill the thread first, then the queue behind it
+            tasks = [asyncio.create_task(self.hasher.hash_password("secret"))]
+            while self.hasher.stats()['running'] == 0 and not tasks[0].done():
+                await asyncio.sleep(0.01)
+            tasks += [asyncio.create_task(self.hasher.hash_password("secret")) for _ in range(5)]
+            await asyncio.sleep(0.01)
+            try:
+                await self.hasher.hash_password("one too many")
+                return None
+            except HTTPException as e:
+                return e.status_code
+            finally:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        status = asyncio.run(run())
+        if status == 503:
+            print("✅ Correctly returns 503 when the queue is full")
+            return True
+        print(f"❌ Expected 503, got {status}")
+        return False
+
+    def run_all_tests(self):
+        print("=" * 70)
+        print("🔐 PASSWORD HASHER QUEUE TESTING")
+        print("=" * 70)
+
+        results = []
+        results.append(("Cancelled Hashes Release Queue", self.test_cancelled_hashes_release_queue()))
+        results.append(("Hashing After Cancellations", self.test_hashing_after_cancellations()))
+        results.append(("Full Queue Rejected", self.test_full_queue_rejected()))
+        self.hasher.shutdown()
+
+        print("\n" + "=" * 70)
+        print("📊 TEST RESULTS SUMMARY")
+        print("=" * 70)
+
+        passed = 0
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            print(f"{status} - {test_name}")
+            if result:
+                passed += 1
+
+        print(f"\n📈 Overall: {passed}/{len(results)} tests passed")
+        return passed == len(results)
+
+
+if __name__ == "__main__":
+    tester = PasswordHasherQueueTester()
+    success = tester.run_all_tests()
+    exit(0 if success else 1)
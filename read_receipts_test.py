@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Read Receipt Batching Testing
+Checks that ReadReceiptBatcher writes every watermark it is given,
+including advances that arrive while a flush is still waiting on a slow
+bulk_write, and that queued watermarks stay visible to unread counts
+until they are written.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).resolve().parent / 'backend'))
+
+import read_receipts
+from read_receipts import ReadReceiptBatcher
+
+
+class SlowUserReads:
+    """chat_user_reads collection whose bulk_write takes write_seconds"""
+
+    def __init__(self, write_seconds: float):
+        self.write_seconds = write_seconds
+        self.writes = []
+        self.writing = asyncio.Event()
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writing.set()
+        await asyncio.sleep(self.write_seconds)
+        self.writes.append({
+            (operation._filter["group_id"], operation._filter["user_email"]): operation._doc["$max"]["last_read_at"]
+            for operation in operations
+        })
+
+
+class FakeDatabase:
+    def __init__(self, write_seconds: float):
+        self.chat_user_reads = SlowUserReads(write_seconds)
+
+
+class ReadReceiptTester:
+    def _batcher(self, write_seconds: float = 0.0):
+        db = FakeDatabase(write_seconds)
+        read_receipts.get_database = lambda: db
+        return ReadReceiptBatcher(flush_ms=20), db.chat_user_reads
+
+    def test_advance_during_slow_write(self):
+        """Test an advance made while bulk_write is in flight is flushed without further advances"""
+        print("\n🧪 Testing advance during a slow bulk_write...")
+
+        async def run():
+            batcher, user_reads = self._batcher(write_seconds=0.2)
+            batcher.advance("g", "a@x", "2030-01-01T10:00:00")
+            await user_reads.writing.wait()
+            batcher.advance("g", "b@x", "2030-01-01T10:05:00")
+            await asyncio.sleep(0.6)
+            return batcher, user_reads
+
+        batcher, user_reads = asyncio.run(run())
+        if batcher.stats()["pending"] == 0 and user_reads.writes == [
+            {("g", "a@x"): "2030-01-01T10:00:00"},
+            {("g", "b@x"): "2030-01-01T10:05:00"},
+        ]:
+            print("✅ Advance made during the write was flushed by a follow-up write")
+            return True
+        print(f"❌ Writes {user_reads.writes}, still pending {batcher._pending}")
+        return False
+
+    def test_advances_coalesced(self):
+        """Test advances of the same user and group become one write of the latest watermark"""
+        print("\n🧪 Testing coalescing...")
+
+        async def run():
+            batcher, user_reads = self._batcher()
+            batcher.advance("g", "a@x", "2030-01-01T10:05:00")
+            batcher.advance("g", "a@x", "2030-01-01T10:00:00")
+            batcher.advance("h", "a@x", "2030-01-01T09:00:00")
+            await asyncio.sleep(0.1)
+            return user_reads
+
+        user_reads = asyncio.run(run())
+        if user_reads.writes == [{("g", "a@x"): "2030-01-01T10:05:00", ("h", "a@x"): "2030-01-01T09:00:00"}]:
+            print("✅ One write with the latest watermark per group")
+            return True
+        print(f"❌ Unexpected writes {user_reads.writes}")
+        return False
+
+    def test_pending_watermark_while_writing(self):
+        """Test a watermark stays visible while it is queued and while it is being written"""
+        print("\n🧪 Testing pending_watermark...")
+
+        async def run():
+            batcher, user_reads = self._batcher(write_seconds=0.2)
+            batcher.advance("g", "a@x", "2030-01-01T10:00:00")
+            queued = batcher.pending_watermark("g", "a@x")
+            await user_reads.writing.wait()
+            writing = batcher.pending_watermark("g", "a@x")
+            by_group = batcher.pending_watermarks("a@x")
+            await asyncio.sleep(0.4)
+            return queued, writing, by_group, batcher.pending_watermark("g", "a@x")
+
+        queued, writing, by_group, written = asyncio.run(run())
+        if (queued == writing == "2030-01-01T10:00:00" and by_group == {"g": "2030-01-01T10:00:00"}
+                and written == ""):
+            print("✅ Watermark visible until it is written")
+            return True
+        print(f"❌ queued={queued!r} writing={writing!r} by_group={by_group!r} written={written!r}")
+        return False
+
+    def run_all_tests(self):
+        print("=" * 70)
+        print("📬 READ RECEIPT BATCHING TESTING")
+        print("=" * 70)
+
+        results = []
+        results.append(("Advance During Slow Write", self.test_advance_during_slow_write()))
+        results.append(("Advances Coalesced", self.test_advances_coalesced()))
+        results.append(("Pending Watermark While Writing", self.test_pending_watermark_while_writing()))
+
+        print("\n" + "=" * 70)
+        print("📊 TEST RESULTS SUMMARY")
+        print("=" * 70)
+
+        passed = 0
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            print(f"{status} - {test_name}")
+            if result:
+                passed += 1
+
+        print(f"\n📈 Overall: {passed}/{len(results)} tests passed")
+        return passed == len(results)
+
+
+if __name__ == "__main__":
+    tester = ReadReceiptTester()
+    success = tester.run_all_tests()
+    exit(0 if success else 1)
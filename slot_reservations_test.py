@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Slot Reservation Testing
+Exercises slot_reservations.py against a small in-memory stand-in for the
+slot_reservations and bookings collections that enforces the unique
+(amenity_id, booking_date, slot) index the way MongoDB does:
+- a conflicting booking gets 409 and keeps none of its slots
+- cancelling a booking releases its slots for the next booking
+- reservations left by cancelled or never-created bookings are reclaimed
+- booking_slots rejects times off the half-hour grid or outside
+  06:00-22:00, and malformed
+  booking dates are rejected before any slot is claimed
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).resolve().parent / 'backend'))
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+import slot_reservations
+from slot_reservations import booking_slots, release_slots, reserve_slots, validate_booking_date
+
+BOOKING_DATE = "2030-06-01"
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if document.get(key) not in condition["$in"]:
+                return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+def _project(document: dict, projection: dict = None) -> dict:
+    fields = [key for key, value in (projection or {}).items() if value and key != "_id"]
+    if not fields:
+        return dict(document)
+    return {key: document[key] for key in fields if key in document}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return list(self.documents)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """Async collection with an optional unique index, as much of it as the tests need"""
+
+    def __init__(self, unique_key=None):
+        self.documents = []
+        self.unique_key = unique_key
+
+    def _key(self, document: dict):
+        return tuple(document.get(field) for field in self.unique_key)
+
+    async def insert_many(self, documents, ordered=True):
+        existing = {self._key(document) for document in self.documents} if self.unique_key else set()
+        inserted = 0
+        for document in documents:
+            if self.unique_key and self._key(document) in existing:
+                # ordered=True: MongoDB stops at the first duplicate
+                raise BulkWriteError({
+                    "writeErrors": [{"index": inserted, "code": 11000, "op": document}],
+                    "nInserted": inserted,
+                })
+            self.documents.append(dict(document))
+            if self.unique_key:
+                existing.add(self._key(document))
+            inserted += 1
+
+    async def insert_one(self, document):
+        await self.insert_many([document])
+
+    async def find_one(self, query, projection=None):
+        return next(
+            (_project(document, projection) for document in self.documents if _matches(document, query)),
+            None
+        )
+
+    def find(self, query, projection=None):
+        return FakeCursor([_project(document, projection) for document in self.documents if _matches(document, query)])
+
+    async def delete_many(self, query):
+        self.documents = [document for document in self.documents if not _matches(document, query)]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.slot_reservations = FakeCollection(unique_key=("amenity_id", "booking_date", "slot"))
+        self.bookings = FakeCollection()
+
+
+class SlotReservationTester:
+    def __init__(self):
+        self.db = FakeDatabase()
+        slot_reservations.get_database = lambda: self.db
+
+    def _reset(self):
+        self.db.slot_reservations.documents.clear()
+        self.db.bookings.documents.clear()
+
+    def _booking(self, booking_id: str, start_time: str, duration_minutes: int, status: str = "confirmed") -> dict:
+        start = datetime.strptime(start_time, "%H:%M")
+        return {
+            "id": booking_id,
+            "amenity_id": "clubhouse",
+            "booking_date": BOOKING_DATE,
+            "start_time": start_time,
+            "end_time": (start + timedelta(minutes=duration_minutes)).strftime("%H:%M"),
+            "duration_minutes": duration_minutes,
+            "status": status,
+        }
+
+    async def _book(self, booking: dict):
+        """What create_booking does: claim the slots, then store the booking"""
+        await reserve_slots(booking)
+        await self.db.bookings.insert_one(booking)
+
+    def _slots_of(self, booking_id: str):
+        return sorted(
+            reservation['slot'] for reservation in self.db.slot_reservations.documents
+            if reservation['booking_id'] == booking_id
+        )
+
+    def test_booking_slots(self):
+        """Test booking_slots covers every half hour and rejects off-grid or out-of-hours bookings"""
+        print("\n🧪 Testing booking_slots...")
+        success = True
+
+        slots = booking_slots("09:00", 90)
+        if slots == ["09:00", "09:30", "10:00"]:
+            print("✅ 90 minutes from 09:00 covers 09:00, 09:30 and 10:00")
+        else:
+            print(f"❌ Unexpected slots: {slots}")
+            success = False
+
+        edges = booking_slots("06:00", 30) + booking_slots("21:00", 60)
+        if edges == ["06:00", "21:00", "21:30"]:
+            print("✅ Bookings from 06:00 and until 22:00 accepted")
+        else:
+            print(f"❌ Unexpected slots at the day's edges: {edges}")
+            success = False
+
+        # Off the grid, or outside 06:00-22:00 where the availability bitmap has no bits
+        for start_time, duration_minutes in [("09:15", 60), ("9am", 60), ("05:30", 60),
+                                             ("22:00", 30), ("21:30", 60), ("00:00", 30)]:
+            try:
+                booking_slots(start_time, duration_minutes)
+                print(f"❌ {start_time} for {duration_minutes} minutes was accepted")
+                success = False
+            except HTTPException as e:
+                if e.status_code == 400:
+                    print(f"✅ {start_time} for {duration_minutes} minutes rejected with 400: {e.detail}")
+                else:
+                    print(f"❌ {start_time}: expected 400, got {e.status_code}")
+                    success = False
+        return success
+
+    def test_booking_date_validation(self):
+        """Test malformed booking dates are rejected with 400"""
+        print("\n🧪 Testing booking date validation...")
+        success = True
+        try:
+            validate_booking_date(BOOKING_DATE)
+            print(f"✅ {BOOKING_DATE} accepted")
+        except HTTPException as e:
+            print(f"❌ {BOOKING_DATE} rejected: {e.detail}")
+            success = False
+        for booking_date in ["2030-6-1", "01-06-2030", "2030-02-30", "", None]:
+            try:
+                validate_booking_date(booking_date)
+                print(f"❌ {booking_date!r} was accepted")
+                success = False
+            except HTTPException as e:
+                if e.status_code == 400:
+                    print(f"✅ {booking_date!r} rejected with 400")
+                else:
+                    print(f"❌ {booking_date!r}: expected 400, got {e.status_code}")
+                    success = False
+        return success
+
+    def test_conflict_leaves_no_partial_reservations(self):
+        """Test a conflicting booking gets 409 and holds none of its slots"""
+        print("\n🧪 Testing slot conflict...")
+        self._reset()
+
+        async def run():
+            await self._book(self._booking("first", "10:00", 60))
+            # 09:00 and 09:30 are free and get inserted before 10:00 collides
+            try:
+                await self._book(self._booking("second", "09:00", 120))
+                return None
+            except HTTPException as e:
+                return e
+
+        error = asyncio.run(run())
+        if error is None or error.status_code != 409:
+            print(f"❌ Expected 409, got {error.status_code if error else 'no error'}")
+            return False
+        print(f"✅ Correctly returns 409: {error.detail}")
+        if "10:00-11:00" not in error.detail:
+            print(f"❌ 409 does not name the conflicting booking: {error.detail}")
+            return False
+
+        leftover = self._slots_of("second")
+        if leftover:
+            print(f"❌ Failed booking kept slots {leftover}")
+            return False
+        if self._slots_of("first") != ["10:00", "10:30"]:
+            print(f"❌ Existing booking lost slots: {self._slots_of('first')}")
+            return False
+        print("✅ No partial reservations left behind")
+        return True
+
+    def test_cancel_frees_slots(self):
+        """Test cancelling a booking lets the next booking take its slots"""
+        print("\n🧪 Testing cancellation frees slots...")
+        self._reset()
+
+        async def run():
+            first = self._booking("first", "18:00", 60)
+            await self._book(first)
+            # What cancel_booking does: mark cancelled, then release
+            first["status"] = "cancelled"
+            released = await release_slots("first")
+            await self._book(self._booking("second", "18:30", 60))
+            return released
+
+        try:
+            released = asyncio.run(run())
+        except HTTPException as e:
+            print(f"❌ Booking after cancellation rejected: {e.status_code} - {e.detail}")
+            return False
+        if sorted(released) != ["18:00", "18:30"]:
+            print(f"❌ Unexpected released slots: {released}")
+            return False
+        if self._slots_of("second") != ["18:30", "19:00"] or self._slots_of("first"):
+            print(f"❌ Unexpected reservations: {self.db.slot_reservations.documents}")
+            return False
+        print("✅ Released slots were booked again")
+        return True
+
+    def test_stale_reservations_reclaimed(self):
+        """Test reservations of cancelled or missing bookings do not block new ones"""
+        print("\n🧪 Testing stale reservation cleanup...")
+        self._reset()
+        success = True
+
+        async def run():
+            # A booking cancelled without its slots being released
+            cancelled = self._booking("cancelled", "07:00", 60, status="cancelled")
+            await reserve_slots(cancelled)
+            await self.db.bookings.insert_one(cancelled)
+            await self._book(self._booking("after-cancelled", "07:00", 30))
+
+            # Reservations whose booking was never written: kept while recent
+            await reserve_slots(self._booking("orphan", "12:00", 30))
+            try:
+                await self._book(self._booking("too-early", "12:00", 30))
+                recent_blocked = False
+            except HTTPException as e:
+                recent_blocked = e.status_code == 409
+            for reservation in self.db.slot_reservations.documents:
+                if reservation['booking_id'] == "orphan":
+                    reservation['created_at'] -= timedelta(seconds=slot_reservations.STALE_RESERVATION_SECONDS + 1)
+            await self._book(self._booking("after-orphan", "12:00", 30))
+            return recent_blocked
+
+        try:
+            recent_blocked = asyncio.run(run())
+        except HTTPException as e:
+            print(f"❌ Stale reservation blocked a booking: {e.status_code} - {e.detail}")
+            return False
+
+        if self._slots_of("after-cancelled") == ["07:00"] and not self._slots_of("cancelled"):
+            print("✅ Reservations of a cancelled booking reclaimed")
+        else:
+            print(f"❌ Unexpected reservations: {self.db.slot_reservations.documents}")
+            success = False
+        if recent_blocked:
+            print("✅ Recent reservation without a booking still holds its slot")
+        else:
+            print("❌ Recent reservation without a booking was taken over")
+            success = False
+        if self._slots_of("after-orphan") == ["12:00"] and not self._slots_of("orphan"):
+            print("✅ Old reservation without a booking reclaimed")
+        else:
+            print(f"❌ Unexpected reservations: {self.db.slot_reservations.documents}")
+            success = False
+        return success
+
+    def run_all_tests(self):
+        print("=" * 70)
+        print("📅 SLOT RESERVATION TESTING")
+        print("=" * 70)
+
+        results = []
+        results.append(("Booking Slots", self.test_booking_slots()))
+        results.append(("Booking Date Validation", self.test_booking_date_validation()))
+        results.append(("Conflict Leaves No Partial Reservations", self.test_conflict_leaves_no_partial_reservations()))
+        results.append(("Cancel Frees Slots", self.test_cancel_frees_slots()))
+        results.append(("Stale Reservations Reclaimed", self.test_stale_reservations_reclaimed()))
+
+        print("\n" + "=" * 70)
+        print("📊 TEST RESULTS SUMMARY")
+        print("=" * 70)
+
+        passed = 0
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            print(f"{status} - {test_name}")
+            if result:
+                passed += 1
+
+        print(f"\n📈 Overall: {passed}/{len(results)} tests passed")
+        return passed == len(results)
+
+
+if __name__ == "__main__":
+    tester = SlotReservationTester()
+    success = tester.run_all_tests()
+    exit(0 if success else 1)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Upload Size Limit Testing using FastAPI TestClient
+Checks that UploadLimitMiddleware answers 413 for request bodies over the
+limit of an upload route, both when Content-Length announces the size and
+when a chunked body only passes the limit while it is being received.
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.append(str(Path(__file__).resolve().parent / 'backend'))
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+from upload_pipeline import UploadLimitMiddleware, limit_request_body
+
+MAX_BYTES = 64 * 1024
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/test-upload")
+    async def test_upload(file: UploadFile = File(...)):
+        content = await file.read()
+        return {"filename": file.filename, "size": len(content)}
+
+    @app.post("/api/test-upload-raw")
+    async def test_upload_raw(request: Request):
+        # Reads the body itself and reports any failure as a bad request
+        try:
+            size = 0
+            async for chunk in request.stream():
+                size += len(chunk)
+            return {"size": size}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid upload")
+
+    limit_request_body(r"^/api/test-upload(-raw)?$", MAX_BYTES)
+    app.add_middleware(UploadLimitMiddleware)
+    return app
+
+
+def multipart_body(size: int, boundary: str = "testboundary") -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="photo.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+
+
+def chunked(body: bytes, chunk_size: int = 8 * 1024):
+    for offset in range(0, len(body), chunk_size):
+        yield body[offset:offset + chunk_size]
+
+
+class UploadLimitTestClient:
+    def __init__(self):
+        self.client = TestClient(create_app())
+        self.headers = {"Content-Type": "multipart/form-data; boundary=testboundary"}
+
+    def _expect_413(self, response) -> bool:
+        if response.status_code != 413:
+            print(f"❌ Expected 413, got {response.status_code} - {response.text}")
+            return False
+        detail = response.json().get('detail', '')
+        if 'exceeds maximum size' not in detail:
+            print(f"❌ Wrong error message: {detail}")
+            return False
+        return True
+
+    def test_upload_within_limit(self):
+        """Test an upload under the limit reaches the route"""
+        print("\n🧪 Testing upload within the limit...")
+        response = self.client.post("/api/test-upload", content=multipart_body(1024), headers=self.headers)
+        if response.status_code == 200 and response.json().get('size') == 1024:
+            print("✅ Upload within the limit accepted")
+            return True
+        print(f"❌ Expected 200, got {response.status_code} - {response.text}")
+        return False
+
+    def test_content_length_over_limit(self):
+        """Test a Content-Length over the limit is rejected with 413"""
+        print("\n🧪 Testing Content-Length over the limit...")
+        response = self.client.post(
+            "/api/test-upload", content=multipart_body(MAX_BYTES * 2), headers=self.headers
+        )
+        if self._expect_413(response):
+            print("✅ Correctly returns 413 for an oversized Content-Length")
+            return True
+        return False
+
+    def test_chunked_body_over_limit(self):
+        """Test a chunked body without Content-Length is rejected with 413"""
+        print("\n🧪 Testing chunked body over the limit...")
+        response = self.client.post(
+            "/api/test-upload", content=chunked(multipart_body(MAX_BYTES * 2)), headers=self.headers
+        )
+        if self._expect_413(response):
+            print("✅ Correctly returns 413 for an oversized chunked body")
+            return True
+        return False
+
+    def test_chunked_body_over_limit_raw_route(self):
+        """Test the 413 does not depend on how the route handles a cut-off body"""
+        print("\n🧪 Testing chunked body over the limit on a route reading the raw body...")
+        response = self.client.post(
+            "/api/test-upload-raw", content=chunked(b"x" * MAX_BYTES * 2), headers=self.headers
+        )
+        if self._expect_413(response):
+            print("✅ Correctly returns 413 instead of the route's own error")
+            return True
+        return False
+
+    def test_chunked_body_within_limit(self):
+        """Test a chunked body under the limit reaches the route"""
+        print("\n🧪 Testing chunked body within the limit...")
+        response = self.client.post(
+            "/api/test-upload", content=chunked(multipart_body(MAX_BYTES // 2)), headers=self.headers
+        )
+        if response.status_code == 200 and response.json().get('size') == MAX_BYTES // 2:
+            print("✅ Chunked upload within the limit accepted")
+            return True
+        print(f"❌ Expected 200, got {response.status_code} - {response.text}")
+        return False
+
+    def run_all_tests(self):
+        print("=" * 70)
+        print("📦 UPLOAD SIZE LIMIT TESTING")
+        print("=" * 70)
+
+        results = []
+        results.append(("Upload Within Limit", self.test_upload_within_limit()))
+        results.append(("Content-Length Over Limit", self.test_content_length_over_limit()))
+        results.append(("Chunked Body Over Limit", self.test_chunked_body_over_limit()))
+        results.append(("Chunked Body Over Limit (Raw Route)", self.test_chunked_body_over_limit_raw_route()))
+        results.append(("Chunked Body Within Limit", self.test_chunked_body_within_limit()))
+
+        print("\n" + "=" * 70)
+        print("📊 TEST RESULTS SUMMARY")
+        print("=" * 70)
+
+        passed = 0
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            print(f"{status} - {test_name}")
+            if result:
+                passed += 1
+
+        print(f"\n📈 Overall: {passed}/{len(results)} tests passed")
+        return passed == len(results)
+
+
+if __name__ == "__main__":
+    tester = UploadLimitTestClient()
+    success = tester.run_all_tests()
+    exit(0 if success else 1)